@@ -17,6 +17,7 @@ import os
 import re
 import sys
 import json
+import sqlite3
 import logging
 from pathlib import Path
 
@@ -33,6 +34,10 @@ from paths import (
     _LOGGING_LOCATION
 )
 from logger.application_logging import ApplicationLogger
+from logger.disk_usage import DiskUsage, UsageTotals
+from integrate.archive_files import is_archive, list_members
+from configuration.duplicate_files import find_duplicates
+from configuration.shot_matcher import ShotMatcher
 
 
 class IntegrateConfigure(object):
@@ -79,6 +84,102 @@ class IntegrateConfigure(object):
     def logging_location(self, value):
         self._logging_location = value
 
+    @property
+    def io_scheduler(self):
+        return self._io_scheduler
+
+    @property
+    def auto_tune(self):
+        return self._auto_tune
+
+    @property
+    def copy_file(self):
+        return self._copy_file
+
+    @property
+    def duplicates(self):
+        return self._duplicates
+
+    @property
+    def catalog(self):
+        return self._catalog
+
+    @property
+    def watch_folders(self):
+        return self._watch_folders
+
+    @property
+    def service(self):
+        return self._service
+
+    @property
+    def client_tree(self):
+        return self._client_tree
+
+    @property
+    def delta_transfer(self):
+        return self._delta_transfer
+
+    @property
+    def retries(self):
+        return self._retries
+
+    @property
+    def staged_publish(self):
+        return self._staged_publish
+
+    @property
+    def conflicts(self):
+        return self._conflicts
+
+    @property
+    def shot_matching(self):
+        return self._shot_matching
+
+    @property
+    def header_probe(self):
+        return self._header_probe
+
+    @property
+    def log_rotation(self):
+        return self._log_rotation
+
+    @property
+    def ui_watchdog(self):
+        return self._ui_watchdog
+
+    @property
+    def thumbnails(self):
+        return self._thumbnails
+
+    @property
+    def shot_matcher(self):
+        """
+        The sequences and shots of the output location indexed for matching,
+        built the first time it is needed after the folders are collected.
+        """
+        if self._shot_matcher is None:
+            self._shot_matcher = ShotMatcher({
+                os.path.basename(sequence): [os.path.basename(shot) for shot in shots]
+                for sequence, shots in self._output_subfolders.items()
+            })
+        return self._shot_matcher
+
+    @property
+    def scrub(self):
+        return self._scrub
+
+    @property
+    def disk_usage_settings(self):
+        return self._disk_usage_settings
+
+    @property
+    def disk_usage(self):
+        """
+        The space used by each sequence, shot and option of the output location.
+        """
+        return self._disk_usage
+
     @property
     def configuration(self):
         return self._configuration
@@ -103,6 +204,28 @@ class IntegrateConfigure(object):
         self._logging_option = True if self.configuration['loggingStatus'] == 'True' else False
         self._output_location = self.configuration['outputLocation']
         self._logging_location = self.configuration['loggingLocation']
+        # newer settings may be missing from older configuration files
+        self._io_scheduler = dict(_DEFAULT_CONFIG['ioScheduler'], **self.configuration.get('ioScheduler', {}))
+        self._auto_tune = dict(_DEFAULT_CONFIG['autoTune'], **self.configuration.get('autoTune', {}))
+        self._copy_file = dict(_DEFAULT_CONFIG['copyFile'], **self.configuration.get('copyFile', {}))
+        self._duplicates = dict(_DEFAULT_CONFIG['duplicates'], **self.configuration.get('duplicates', {}))
+        self._catalog = dict(_DEFAULT_CONFIG['catalog'], **self.configuration.get('catalog', {}))
+        self._watch_folders = dict(_DEFAULT_CONFIG['watchFolders'], **self.configuration.get('watchFolders', {}))
+        self._service = dict(_DEFAULT_CONFIG['service'], **self.configuration.get('service', {}))
+        self._client_tree = dict(_DEFAULT_CONFIG['clientTree'], **self.configuration.get('clientTree', {}))
+        self._delta_transfer = dict(_DEFAULT_CONFIG['deltaTransfer'], **self.configuration.get('deltaTransfer', {}))
+        self._retries = dict(_DEFAULT_CONFIG['retries'], **self.configuration.get('retries', {}))
+        self._staged_publish = dict(_DEFAULT_CONFIG['stagedPublish'], **self.configuration.get('stagedPublish', {}))
+        self._scrub = dict(_DEFAULT_CONFIG['scrub'], **self.configuration.get('scrub', {}))
+        self._disk_usage_settings = dict(_DEFAULT_CONFIG['diskUsage'], **self.configuration.get('diskUsage', {}))
+        self._disk_usage = UsageTotals()
+        self._conflicts = dict(_DEFAULT_CONFIG['conflicts'], **self.configuration.get('conflicts', {}))
+        self._shot_matching = dict(_DEFAULT_CONFIG['shotMatching'], **self.configuration.get('shotMatching', {}))
+        self._header_probe = dict(_DEFAULT_CONFIG['headerProbe'], **self.configuration.get('headerProbe', {}))
+        self._log_rotation = dict(_DEFAULT_CONFIG['logRotation'], **self.configuration.get('logRotation', {}))
+        self._ui_watchdog = dict(_DEFAULT_CONFIG['uiWatchdog'], **self.configuration.get('uiWatchdog', {}))
+        self._thumbnails = dict(_DEFAULT_CONFIG['thumbnails'], **self.configuration.get('thumbnails', {}))
+        self._shot_matcher = None
 
     def get_seq_shot_folders(self):
         """
@@ -112,6 +235,7 @@ class IntegrateConfigure(object):
         Users are still able to write their own Sequence and Shot folders ontop of this too.
         """
         self._output_subfolders = {}
+        self._shot_matcher = None
 
         if not os.path.exists(self.output_location):
             os.makedirs(self.output_location)
@@ -121,7 +245,8 @@ class IntegrateConfigure(object):
         if _top_folder:
             for seq in _top_folder:
                 _shot = os.path.join(self.output_location, seq)
-                if os.path.isfile(_shot):
+                # hidden folders aren't sequences, ie. the staging folder of a staged run
+                if os.path.isfile(_shot) or seq.startswith('.'):
                     continue
                 _shot = os.listdir(os.path.join(self.output_location, seq))
                 if not _shot:
@@ -131,6 +256,56 @@ class IntegrateConfigure(object):
                     for shot in _shot:
                         self._output_subfolders[
                             os.path.join(self.output_location, seq)].append(os.path.join(self.output_location, shot))
+        self.load_disk_usage()
+
+    def match_shots(self, configure_object):
+        """
+        Matching the client files that have just been added against the
+        sequences and shots of the output location, if turned on.
+
+        Args:
+            configure_object (ConfigureFiles): The client files.
+
+        Returns:
+            list: A ShotMatch for each file, empty if matching is turned off.
+        """
+        if not self._shot_matching['enabled'] or not self._output_subfolders:
+            return []
+        return configure_object.match_shots(self.shot_matcher)
+
+    def load_disk_usage(self):
+        """
+        Loading the usage counters of the output location, a single query
+        so it is done whenever the sequences and shots are collected.
+        """
+        if not self._disk_usage_settings['enabled']:
+            return
+        try:
+            with DiskUsage(self.catalog['location']) as usage:
+                self._disk_usage = usage.totals(self.output_location)
+        except sqlite3.Error:
+            self._disk_usage = UsageTotals()
+
+    def reconcile_disk_usage(self, force=False):
+        """
+        Crawling the output location to correct the usage counters, if they
+        haven't been for reconcileHours. Safe to run on a background thread.
+
+        Args:
+            force (bool): Crawl however recently it was last crawled.
+
+        Returns:
+            bool: True if the output location was crawled.
+        """
+        _settings = self._disk_usage_settings
+        if not _settings['enabled']:
+            return False
+        _location = self.output_location
+        with DiskUsage(self.catalog['location']) as usage:
+            if not force and not usage.is_stale(_location, _settings['reconcileHours']):
+                return False
+            self._disk_usage = usage.reconcile(_location, workers=_settings['workers'])
+        return True
 
     def update_all_items(self, main):
         """
@@ -169,6 +344,7 @@ class IntegrateConfigure(object):
             item.sequence.addItem(str(os.path.basename(key)))
             for (key, value) in self.output_subfolders.items()
         }
+        item.set_usage_tips(item.sequence, lambda usage, name: usage.sequence(name))
 
 
 class ConfigureFilesData(object):
@@ -182,7 +358,7 @@ class ConfigureFilesData(object):
         ConfigureFilesData Obj: The object itself.
     """
     _NAME_REGEX = r'(\w+?)|(\w+?)(\d+)|(\w+?)(_\d+)'
-    def __init__(self, file, folder, parent_folder=None):
+    def __init__(self, file, folder, parent_folder=None, archive=None, member=None, size=None):
         super(ConfigureFilesData, self).__init__()
         self._file_path = file
         self._folder_path = folder
@@ -190,6 +366,12 @@ class ConfigureFilesData(object):
         self._folder = os.path.dirname(file)
         self._filename = os.path.basename(file)
         self._file_location = 'plates'
+        self._archive = archive
+        self._member = member
+        self._size = size
+        self._duplicate_of = None
+        self._file_hash = None
+        self._match_confidence = None
 
         self.get_naming_info()
 
@@ -199,7 +381,45 @@ class ConfigureFilesData(object):
 
     @property
     def file_size(self):
+        if self._size is not None:
+            return self._size
         return Path(self.file_path).stat().st_size
+
+    @property
+    def archive(self):
+        return self._archive
+
+    @property
+    def member(self):
+        return self._member
+
+    @property
+    def is_archive_member(self):
+        return self._archive is not None
+
+    @property
+    def duplicate_of(self):
+        return self._duplicate_of
+
+    @duplicate_of.setter
+    def duplicate_of(self, value):
+        self._duplicate_of = value
+
+    @property
+    def file_hash(self):
+        return self._file_hash
+
+    @file_hash.setter
+    def file_hash(self, value):
+        self._file_hash = value
+
+    @property
+    def match_confidence(self):
+        """
+        How sure the match against the existing shots is, None if the
+        sequence and shot were only guessed from the filename.
+        """
+        return self._match_confidence
         
     @property
     def filename(self):
@@ -217,6 +437,11 @@ class ConfigureFilesData(object):
     def parent_folder(self):
         return str(self._parent_folder)
 
+    @property
+    def delivery(self):
+        # the folder the client files were added from
+        return str(self._parent_folder or self._folder_path)
+
     @property
     def sequence(self):
         return self._sequence
@@ -245,6 +470,21 @@ class ConfigureFilesData(object):
         self.sequence = res[0]
         self.shot = "_".join((res[0], res[1]))
 
+    def apply_match(self, match):
+        """
+        Using the existing sequence and shot matched to the filename
+        over the guess, where they were found.
+
+        Args:
+            match (ShotMatch): The match of the filename.
+        """
+        if match.sequence:
+            self.sequence = match.sequence
+        if match.shot:
+            self.shot = match.shot
+        if match.sequence or match.shot:
+            self._match_confidence = match.confidence
+
 
 class ConfigureFiles(object):
     """
@@ -272,9 +512,87 @@ class ConfigureFiles(object):
             _value += file.file_size
         return _value
     
+    def find_duplicates(self, workers=4):
+        """
+        Flagging the files the client has sent more than once.
+        Each duplicate links back to the first copy found.
+
+        Arguments:
+            workers (int) -- The number of threads and processes to hash with.
+
+        Returns:
+            list: Groups of duplicate files.
+        """
+        return find_duplicates(self._files, workers=workers)
+
+    def match_shots(self, matcher):
+        """
+        Matching every file against the existing sequences and shots in
+        one batch, so files of the same image sequence are only scored once.
+
+        Arguments:
+            matcher (ShotMatcher) -- The index of the existing shots.
+
+        Returns:
+            list: A ShotMatch for each file.
+        """
+        _matches = matcher.match_all([file.filename for file in self._files])
+        for file, match in zip(self._files, _matches):
+            file.apply_match(match)
+        return _matches
+
     def single_file(self, file):
+        if is_archive(file):
+            self.archive_files(file)
+            return
         self._files.append(ConfigureFilesData(file, self._folder))
 
+    def archive_files(self, archive):
+        """
+        Listing the members of a client archive as virtual file records.
+        Nothing is extracted here, the members are streamed straight to
+        their output location when the files are integrated.
+
+        Arguments:
+            archive (str) -- The zip or tar archive path.
+        """
+        archive = str(archive)
+        for member, size in list_members(archive):
+            _virtual_path = os.path.join(archive, member)
+            self._files.append(
+                ConfigureFilesData(
+                    _virtual_path,
+                    os.path.dirname(_virtual_path),
+                    parent_folder=self._folder,
+                    archive=archive,
+                    member=member,
+                    size=size
+                )
+            )
+
+    def list_folder(self, folder):
+        """
+        Listing a single folder without walking into its subfolders,
+        used by the lazy tree so only expanded folders are ever listed.
+        An archive is listed as its members.
+
+        Arguments:
+            folder (str) -- The folder or archive path.
+
+        Returns:
+            list: The subfolders and archives found, to be listed later.
+        """
+        if is_archive(folder):
+            self.archive_files(folder)
+            return []
+        _folders = []
+        for entry in sorted(os.scandir(folder), key=lambda entry: entry.name):
+            if entry.is_dir() or is_archive(entry.path):
+                _folders.append(entry.path)
+            elif entry.is_file():
+                self._files.append(ConfigureFilesData(entry.path, folder, parent_folder=self._folder))
+        return _folders
+
     def folder_files(self, folder):
         """
         Looping through the passed folder to find
@@ -288,7 +606,9 @@ class ConfigureFiles(object):
         """
         for file in os.listdir(folder):
             _full_path = os.path.join(folder, file)
-            if os.path.isfile(_full_path):
+            if is_archive(_full_path):
+                self.archive_files(_full_path)
+            elif os.path.isfile(_full_path):
                 self._files.append(ConfigureFilesData(_full_path, folder, parent_folder=self._folder))
             elif os.path.isdir(_full_path):
                 self.folder_files(_full_path)
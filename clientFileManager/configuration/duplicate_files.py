@@ -0,0 +1,101 @@
+################################################################################
+## Client File Manager TOOL - Ingesting client files into a production pipeline
+##  with tracking, logging and configuration overrides.
+##
+## File : duplicate_files.py
+## Description : Finding files a client has sent more than once in a delivery.
+##      Files are compared in stages, size first, then a hash of the first
+##      and last blocks, and only then a hash of the full contents.
+##
+## Created by: Kieran Knight
+## Email: kieransknight@gmail.com
+##
+################################################################################
+
+# Python Modules
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+# Application
+from utils import hash_file, hash_file_ends
+
+_BLOCK_SIZE = 64 * 1024
+
+
+def _group(records, key):
+    """
+    Grouping records by the passed key function, keeping only
+    the groups with more than one record.
+    """
+    _groups = {}
+    for record, value in zip(records, key):
+        _groups.setdefault(value, []).append(record)
+    return [group for group in _groups.values() if len(group) > 1]
+
+
+def find_duplicates(files, workers=4):
+    """
+    Finding the duplicate files in a list of configured files.
+
+    * Size - nearly every file is ruled out here without being opened.
+    * First and last block - a small read per candidate, on a thread pool
+      as it is bound by the storage rather than the CPU.
+    * Full hash - only for files still matching, on a process pool as
+      hashing large files is bound by the CPU.
+
+    Archive members are skipped, they can't be read without extracting them.
+
+    Args:
+        files (list): The ConfigureFilesData objects to check.
+        workers (int): The number of threads and processes to hash with.
+
+    Returns:
+        list: Groups of duplicate files, each group a list of ConfigureFilesData
+            with the first file being the one the others duplicate.
+    """
+    _records = []
+    _sizes = []
+    for record in files:
+        if record.is_archive_member:
+            continue
+        try:
+            _size = record.file_size
+        except OSError:
+            continue
+        # empty files are never worth flagging
+        if _size:
+            _records.append(record)
+            _sizes.append(_size)
+    _size_of = {id(record): size for record, size in zip(_records, _sizes)}
+    _by_size = _group(_records, _sizes)
+    if not _by_size:
+        return []
+
+    # stage two - the first and last block of every file sharing a size
+    _records = [record for group in _by_size for record in group]
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        _ends = list(executor.map(
+            lambda record: hash_file_ends(record.file_path, _size_of[id(record)], _BLOCK_SIZE), _records))
+
+    _duplicates = []
+    _to_hash = []
+    for group in _group(_records, zip([_size_of[id(record)] for record in _records], _ends)):
+        # both blocks cover the whole of a small file, so it is already a match
+        if _size_of[id(group[0])] <= _BLOCK_SIZE * 2:
+            _duplicates.append(group)
+        else:
+            _to_hash.extend(group)
+
+    # stage three - the full contents of anything still matching
+    if _to_hash:
+        with ProcessPoolExecutor(max_workers=max(1, workers)) as executor:
+            _hashes = list(executor.map(hash_file, [record.file_path for record in _to_hash]))
+        # kept so the catalog doesn't hash the same file again
+        for record, file_hash in zip(_to_hash, _hashes):
+            record.file_hash = file_hash
+        _duplicates.extend(_group(_to_hash, _hashes))
+
+    for group in _duplicates:
+        for record in group[1:]:
+            record.duplicate_of = group[0]
+    return _duplicates
+
@@ -0,0 +1,560 @@
+################################################################################
+## Client File Manager TOOL - Ingesting client files into a production pipeline
+##  with tracking, logging and configuration overrides.
+##
+## File : header_probe.py
+## Description : Reading the headers of client files, ie. the resolution and
+##      channels of EXR, DPX, TIFF, PNG and JPEG images and the frames of
+##      QuickTime and MP4 movies, and suggesting the option each file belongs
+##      to from its magic bytes. Only a few small reads are made per file and
+##      every result is cached by path, size and modified time.
+##
+## Created by: Kieran Knight
+## Email: kieransknight@gmail.com
+##
+################################################################################
+
+# Python Modules
+import os
+import json
+import struct
+import sqlite3
+import itertools
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+# bytes read from the start of every file, enough for the magic and most headers
+_HEAD = 64 * 1024
+# the most read of an EXR header or a movie's moov atom
+_HEADER_LIMIT = 16 * 1024 * 1024
+# paths looked up in the cache at once
+_CACHE_CHUNK = 500
+# version of the cached results, older results are probed again
+_VERSION = 1
+
+PLATE = 'Plate'
+TEXTURE = 'Texture'
+MODEL = 'Model'
+MOCAP = 'Mocap'
+REFERENCE = 'Reference'
+
+_EXR_COMPRESSION = ['none', 'rle', 'zips', 'zip', 'piz', 'pxr24', 'b44', 'b44a', 'dwaa', 'dwab']
+_EXR_PIXEL = {0: 'uint', 1: 'half', 2: 'float'}
+_DPX_DESCRIPTOR = {1: 'R', 2: 'G', 3: 'B', 4: 'A', 6: 'Y', 50: 'RGB', 51: 'RGBA', 52: 'ABGR'}
+_PNG_COLOUR = {0: 'Y', 2: 'RGB', 3: 'indexed', 4: 'YA', 6: 'RGBA'}
+_JPEG_FRAMES = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+_MOVIE_CONTAINERS = {b'moov', b'trak', b'mdia', b'minf', b'stbl'}
+
+# magic bytes at the start of a file, the format and the option it suggests
+_MAGIC = [
+    (b'\x76\x2f\x31\x01', 'EXR', PLATE),
+    (b'SDPX', 'DPX', PLATE),
+    (b'XPDS', 'DPX', PLATE),
+    (b'\x80\x2a\x5f\xd7', 'Cineon', PLATE),
+    (b'\xd7\x5f\x2a\x80', 'Cineon', PLATE),
+    (b'ARRI', 'ARRIRAW', PLATE),
+    (b'\x06\x0e\x2b\x34', 'MXF', PLATE),
+    (b'II*\x00', 'TIFF', TEXTURE),
+    (b'MM\x00*', 'TIFF', TEXTURE),
+    (b'II+\x00', 'TIFF', TEXTURE),
+    (b'MM\x00+', 'TIFF', TEXTURE),
+    (b'\x89PNG\r\n\x1a\n', 'PNG', TEXTURE),
+    (b'\xff\xd8\xff', 'JPEG', TEXTURE),
+    (b'8BPS', 'PSD', TEXTURE),
+    (b'#?RADIANCE', 'HDR', TEXTURE),
+    (b'#?RGBE', 'HDR', TEXTURE),
+    (b'DDS ', 'DDS', TEXTURE),
+    (b'Kaydara FBX Binary', 'FBX', MODEL),
+    (b'; FBX', 'FBX', MODEL),
+    (b'Ogawa', 'Alembic', MODEL),
+    (b'\x89HDF', 'Alembic', MODEL),
+    (b'PXR-USDC', 'USD', MODEL),
+    (b'#usda', 'USD', MODEL),
+    (b'glTF', 'glTF', MODEL),
+    (b'ply\n', 'PLY', MODEL),
+    (b'ply\r\n', 'PLY', MODEL),
+    (b'//Maya ASCII', 'Maya', MODEL),
+    (b'HIERARCHY', 'BVH', MOCAP),
+    (b'PathFileType', 'TRC', MOCAP),
+    (b'%PDF', 'PDF', REFERENCE),
+    (b'ID3', 'MP3', REFERENCE),
+]
+# formats that have no magic bytes of their own, or share them
+_EXTENSIONS = {
+    '.obj': ('OBJ', MODEL),
+    '.stl': ('STL', MODEL),
+    '.mb': ('Maya', MODEL),
+    '.c3d': ('C3D', MOCAP),
+    '.tga': ('TGA', TEXTURE),
+    '.tx': ('TIFF', TEXTURE),
+    '.r3d': ('R3D', PLATE),
+    '.braw': ('BRAW', PLATE),
+}
+
+
+class HeaderInfo(namedtuple('HeaderInfo', ('format', 'width', 'height', 'channels', 'frames', 'detail', 'option'))):
+    """
+    What was read from the header of a client file. Anything the format
+    doesn't have, or that couldn't be read, is None.
+    """
+    __slots__ = ()
+
+    @property
+    def summary(self):
+        """
+        The header as a single line, ie. 'EXR 4096x2160 RGBA half zip'.
+        """
+        _parts = [self.format]
+        if self.width and self.height:
+            _parts.append('{}x{}'.format(self.width, self.height))
+        if self.channels:
+            _parts.append(self.channels)
+        if self.frames:
+            _parts.append('{} frames'.format(self.frames))
+        if self.detail:
+            _parts.append(self.detail)
+        return ' '.join(_parts)
+
+
+def _info(file_format, option, width=None, height=None, channels=None, frames=None, detail=None):
+    return HeaderInfo(file_format, width, height, channels, frames, detail, option)
+
+
+def _read_at(handle, offset, size):
+    handle.seek(offset)
+    return handle.read(size)
+
+
+def _probe_exr(handle, head):
+    """
+    Reading the channels, data window and compression of the first part.
+    The header is a list of attributes, each its name, its type, the size
+    of its value and the value.
+    """
+    _flags = struct.unpack_from('<I', head, 4)[0]
+    _data = head
+    _offset = 8
+    _values = {}
+    while _data[_offset:_offset + 1] != b'\x00':
+        _name_end = _data.find(b'\x00', _offset)
+        _type_end = _data.find(b'\x00', _name_end + 1) if _name_end >= 0 else -1
+        _start = _type_end + 5
+        _size = struct.unpack_from('<i', _data, _type_end + 1)[0] if 0 <= _type_end and _start <= len(_data) else 0
+        if _type_end < 0 or _start > len(_data) or _start + _size > len(_data):
+            # a large header, ie. many channels or metadata, read the rest of it
+            _more = _read_at(handle, 0, min(max(len(_data) * 4, _start + _size), _HEADER_LIMIT))
+            if len(_more) <= len(_data):
+                break
+            _data = _more
+            continue
+        if _size < 0:
+            break
+        _name = _data[_offset:_name_end].decode('latin-1')
+        if _name in ('channels', 'dataWindow', 'compression'):
+            _values[_name] = _data[_start:_start + _size]
+        _offset = _start + _size
+
+    _width = _height = _channels = None
+    _detail = []
+    if 'dataWindow' in _values and len(_values['dataWindow']) >= 16:
+        _x_min, _y_min, _x_max, _y_max = struct.unpack_from('<4i', _values['dataWindow'])
+        _width, _height = _x_max - _x_min + 1, _y_max - _y_min + 1
+    if 'channels' in _values:
+        _names = []
+        _types = set()
+        _chlist = _values['channels']
+        _position = 0
+        while _position < len(_chlist) and _chlist[_position:_position + 1] != b'\x00':
+            _end = _chlist.find(b'\x00', _position)
+            if _end < 0 or _end + 17 > len(_chlist):
+                break
+            _names.append(_chlist[_position:_end].decode('latin-1'))
+            _types.add(_EXR_PIXEL.get(struct.unpack_from('<i', _chlist, _end + 1)[0], 'unknown'))
+            _position = _end + 17
+        # RGBA is the usual layout, anything else is listed in full
+        _channels = 'RGBA' if sorted(_names) == ['A', 'B', 'G', 'R'] else \
+            'RGB' if sorted(_names) == ['B', 'G', 'R'] else ','.join(_names)
+        _detail.extend(sorted(_types))
+    if 'compression' in _values and _values['compression']:
+        _compression = _values['compression'][0]
+        _detail.append(
+            _EXR_COMPRESSION[_compression] if _compression < len(_EXR_COMPRESSION) else 'compression {}'.format(
+                _compression))
+    if _flags & 0x1000:
+        _detail.append('multipart')
+    # tiled EXRs are mip mapped textures far more often than plates
+    _tiled = bool(_flags & 0x200)
+    if _tiled:
+        _detail.append('tiled')
+    return _info('EXR', TEXTURE if _tiled else PLATE, _width, _height, _channels, detail=' '.join(_detail) or None)
+
+
+def _probe_dpx(handle, head):
+    """
+    Reading the image size and first element of a DPX, and the sequence
+    length from the film industry header when it is set.
+    """
+    _order = '>' if head[:4] == b'SDPX' else '<'
+    if len(head) < 1720:
+        return _info('DPX', PLATE)
+    _width, _height = struct.unpack_from(_order + 'II', head, 772)
+    _descriptor = head[800]
+    _bits = head[803]
+    _length = struct.unpack_from(_order + 'I', head, 1716)[0]
+    return _info(
+        'DPX', PLATE, _width, _height,
+        _DPX_DESCRIPTOR.get(_descriptor, 'descriptor {}'.format(_descriptor)),
+        frames=_length if 0 < _length < 0xFFFFFFFF else None,
+        detail='{} bit'.format(_bits) if _bits else None
+    )
+
+
+def _probe_tiff(handle, head):
+    """
+    Reading the size and samples of the first image from its IFD, which can
+    be anywhere in the file so is read on its own.
+    """
+    _order = '<' if head[:2] == b'II' else '>'
+    if struct.unpack_from(_order + 'H', head, 2)[0] != 42:
+        return _info('TIFF', TEXTURE, detail='BigTIFF')
+    _ifd = struct.unpack_from(_order + 'I', head, 4)[0]
+    _count_data = _read_at(handle, _ifd, 2)
+    if len(_count_data) < 2:
+        return _info('TIFF', TEXTURE)
+    _count = struct.unpack(_order + 'H', _count_data)[0]
+    _entries = _read_at(handle, _ifd + 2, _count * 12)
+    _tags = {}
+    for index in range(len(_entries) // 12):
+        _tag, _type, _values = struct.unpack_from(_order + 'HHI', _entries, index * 12)
+        if _tag in (256, 257, 258, 277):
+            # short values sit in the first two bytes of the value field
+            _format = _order + ('H' if _type == 3 else 'I')
+            _value = struct.unpack_from(_format, _entries, index * 12 + 8)[0]
+            if _tag == 258 and _values * (2 if _type == 3 else 4) > 4:
+                _value = struct.unpack(_format, _read_at(handle, _value, 2 if _type == 3 else 4))[0]
+            _tags[_tag] = _value
+    _samples = _tags.get(277)
+    return _info(
+        'TIFF', TEXTURE, _tags.get(256), _tags.get(257),
+        {1: 'Y', 2: 'YA', 3: 'RGB', 4: 'RGBA'}.get(_samples, '{} channels'.format(_samples) if _samples else None),
+        detail='{} bit'.format(_tags[258]) if 258 in _tags else None
+    )
+
+
+def _probe_png(handle, head):
+    if len(head) < 26 or head[12:16] != b'IHDR':
+        return _info('PNG', TEXTURE)
+    _width, _height = struct.unpack_from('>II', head, 16)
+    return _info('PNG', TEXTURE, _width, _height, _PNG_COLOUR.get(head[25]), detail='{} bit'.format(head[24]))
+
+
+def _probe_jpeg(handle, head):
+    """
+    Walking the JPEG markers to the start of frame, skipping over EXIF and
+    other application data with a seek rather than reading it.
+    """
+    _offset = 2
+    while True:
+        _marker = _read_at(handle, _offset, 4)
+        if len(_marker) < 4 or _marker[0] != 0xFF:
+            return _info('JPEG', TEXTURE)
+        if _marker[1] == 0xFF:
+            # padding before a marker
+            _offset += 1
+            continue
+        if _marker[1] in (0x01,) or 0xD0 <= _marker[1] <= 0xD8:
+            _offset += 2
+            continue
+        if _marker[1] in (0xD9, 0xDA):
+            return _info('JPEG', TEXTURE)
+        _length = struct.unpack_from('>H', _marker, 2)[0]
+        if _marker[1] in _JPEG_FRAMES:
+            _frame = _read_at(handle, _offset + 4, 6)
+            if len(_frame) < 6:
+                return _info('JPEG', TEXTURE)
+            _bits, _height, _width, _components = struct.unpack('>BHHB', _frame)
+            return _info('JPEG', TEXTURE, _width, _height, {1: 'Y', 3: 'RGB', 4: 'CMYK'}.get(_components))
+        _offset += 2 + _length
+
+
+def _atoms(data, offset=0, end=None):
+    """
+    Listing the atoms of a QuickTime or MP4 container.
+
+    Yields:
+        tuple: (type, start of the payload, end of the atom)
+    """
+    end = len(data) if end is None else end
+    while offset + 8 <= end:
+        _size, _type = struct.unpack_from('>I4s', data, offset)
+        _header = 8
+        if _size == 1:
+            if offset + 16 > end:
+                return
+            _size = struct.unpack_from('>Q', data, offset + 8)[0]
+            _header = 16
+        elif _size == 0:
+            _size = end - offset
+        if _size < _header:
+            return
+        yield _type, offset + _header, offset + _size
+        offset += _size
+
+
+def _probe_movie(handle, head):
+    """
+    Finding the moov atom, which is at the end of files that weren't written
+    for streaming, and reading the size, frames and rate of the video track.
+    """
+    _size = os.fstat(handle.fileno()).st_size
+    _brand = head[8:12] if head[4:8] == b'ftyp' else b''
+    _format = 'MOV' if _brand in (b'qt  ', b'') else 'MP4'
+    _offset = 0
+    _moov = None
+    while _offset + 8 <= _size:
+        _header = _read_at(handle, _offset, 16)
+        if len(_header) < 8:
+            break
+        _atom_size, _type = struct.unpack_from('>I4s', _header)
+        _header_size = 8
+        if _atom_size == 1 and len(_header) == 16:
+            _atom_size = struct.unpack_from('>Q', _header, 8)[0]
+            _header_size = 16
+        elif _atom_size == 0:
+            _atom_size = _size - _offset
+        if _atom_size < _header_size:
+            break
+        if _type == b'moov':
+            if _atom_size <= _HEADER_LIMIT:
+                _moov = _read_at(handle, _offset + _header_size, _atom_size - _header_size)
+            break
+        _offset += _atom_size
+    if _moov is None:
+        return _info(_format, REFERENCE)
+
+    _video = None
+
+    def _walk(start, end, track):
+        nonlocal _video
+        for _type, _start, _end in _atoms(_moov, start, end):
+            if _type == b'trak':
+                _track = {}
+                _walk(_start, _end, _track)
+                if _track.get('handler') == b'vide' and _video is None:
+                    _video = _track
+            elif _type in _MOVIE_CONTAINERS:
+                _walk(_start, _end, track)
+            elif _type == b'hdlr' and _end - _start >= 12:
+                track['handler'] = _moov[_start + 8:_start + 12]
+            elif _type == b'tkhd' and _end - _start >= 84:
+                track['width'], track['height'] = struct.unpack_from('>II', _moov, _end - 8)
+            elif _type == b'mdhd' and _end - _start >= 24:
+                if _moov[_start] == 1:
+                    track['timescale'], track['duration'] = struct.unpack_from('>IQ', _moov, _start + 20)
+                else:
+                    track['timescale'], track['duration'] = struct.unpack_from('>II', _moov, _start + 12)
+            elif _type == b'stts' and _end - _start >= 8:
+                _entries = struct.unpack_from('>I', _moov, _start + 4)[0]
+                track['frames'] = sum(
+                    struct.unpack_from('>I', _moov, _start + 8 + index * 8)[0]
+                    for index in range(min(_entries, (_end - _start - 8) // 8))
+                )
+
+    _walk(0, len(_moov), {})
+    if not _video:
+        return _info(_format, REFERENCE, detail='no video')
+    _frames = _video.get('frames')
+    _detail = None
+    if _frames and _video.get('duration') and _video.get('timescale'):
+        _detail = '{:.3g} fps'.format(_frames / (_video['duration'] / float(_video['timescale'])))
+    return _info(
+        _format, REFERENCE,
+        # the track size is 16.16 fixed point
+        (_video.get('width') or 0) >> 16 or None, (_video.get('height') or 0) >> 16 or None,
+        frames=_frames, detail=_detail
+    )
+
+
+def _sniff(path, head):
+    """
+    Working out the format of a file from its magic bytes, falling back on its
+    extension for formats without any.
+
+    Returns:
+        tuple: (format, option) or None.
+    """
+    for magic, file_format, option in _MAGIC:
+        if head.startswith(magic):
+            return file_format, option
+    if head[4:8] in (b'ftyp', b'moov', b'mdat', b'wide', b'free', b'skip', b'pnot'):
+        return 'movie', REFERENCE
+    if head[:4] == b'RIFF' and head[8:12] in (b'AVI ', b'WAVE'):
+        return ('AVI' if head[8:12] == b'AVI ' else 'WAV'), REFERENCE
+    if head[:4] in (b'FOR4', b'FOR8') and b'Maya' in head[:64]:
+        return 'Maya', MODEL
+    _extension = os.path.splitext(path)[1].lower()
+    if _extension in _EXTENSIONS:
+        return _EXTENSIONS[_extension]
+    if head.startswith(b'solid') and _extension == '.stl':
+        return 'STL', MODEL
+    return None
+
+
+_PROBES = {
+    'EXR': _probe_exr,
+    'DPX': _probe_dpx,
+    'TIFF': _probe_tiff,
+    'PNG': _probe_png,
+    'JPEG': _probe_jpeg,
+    'movie': _probe_movie,
+}
+
+
+def probe_file(path):
+    """
+    Reading the header of a single file.
+
+    Args:
+        path (str): The file path.
+
+    Returns:
+        HeaderInfo: What was found, or None if the format isn't known.
+    """
+    with open(path, 'rb') as handle:
+        _head = handle.read(_HEAD)
+        _sniffed = _sniff(path, _head)
+        if _sniffed is None:
+            return None
+        file_format, option = _sniffed
+        if file_format not in _PROBES:
+            return _info(file_format, option)
+        try:
+            return _PROBES[file_format](handle, _head)
+        except (struct.error, IndexError, ValueError):
+            # a truncated or unusual header still tells us the format
+            return _info('MOV' if file_format == 'movie' else file_format, option)
+
+
+class HeaderCache(object):
+    """
+    The probed headers of every client file, so a delivery added again,
+    ie. in a saved session, is never probed twice. A result is only used
+    while the file has the same size and modified time.
+
+    Args:
+        location (str): The cache database file.
+    """
+    def __init__(self, location):
+        super(HeaderCache, self).__init__()
+        _folder = os.path.dirname(location)
+        if _folder and not os.path.isdir(_folder):
+            os.makedirs(_folder)
+        self._connection = sqlite3.connect(location)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS headers ('
+            'path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime REAL NOT NULL, version INTEGER NOT NULL, info TEXT)'
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self._connection.close()
+
+    def get_many(self, keys):
+        """
+        Looking up the headers of a batch of files.
+
+        Args:
+            keys (list): (path, size, mtime) of each file.
+
+        Returns:
+            dict: Paths mapped to their HeaderInfo, or None for files of an
+                unknown format, for every file still the same as when probed.
+        """
+        _keys = {path: (size, mtime) for path, size, mtime in keys}
+        _found = {}
+        _paths = iter(_keys)
+        while True:
+            _chunk = list(itertools.islice(_paths, _CACHE_CHUNK))
+            if not _chunk:
+                return _found
+            for path, size, mtime, version, info in self._connection.execute(
+                    'SELECT path, size, mtime, version, info FROM headers WHERE path IN ({})'.format(
+                        ', '.join('?' * len(_chunk))), _chunk):
+                if (size, mtime) == _keys[path] and version == _VERSION:
+                    _found[path] = HeaderInfo(*json.loads(info)) if info else None
+
+    def put_many(self, rows):
+        """
+        Caching the headers of a batch of files.
+
+        Args:
+            rows (list): (path, size, mtime, HeaderInfo or None) of each file.
+        """
+        with self._connection:
+            self._connection.executemany(
+                'INSERT OR REPLACE INTO headers VALUES (?, ?, ?, ?, ?)',
+                [
+                    (path, size, mtime, _VERSION, json.dumps(list(info)) if info else None)
+                    for path, size, mtime, info in rows
+                ]
+            )
+
+
+def probe_files(paths, cache_location=None, workers=8, batch_size=500):
+    """
+    Probing the headers of a batch of files across a thread pool, most of
+    the time is spent waiting on the storage. Each batch is stated on the
+    pool, looked up in the cache and only the files not already cached are
+    read. Results are yielded as each file finishes.
+
+    Args:
+        paths (list): The file paths.
+        cache_location (str): The cache database, nothing is cached if None.
+        workers (int): Files read at once.
+        batch_size (int): Files stated and looked up in the cache at once.
+
+    Yields:
+        tuple: (path, HeaderInfo or None), files that couldn't be read are skipped.
+    """
+    _cache = HeaderCache(cache_location) if cache_location else None
+    _paths = iter(paths)
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            while True:
+                _batch = list(itertools.islice(_paths, batch_size))
+                if not _batch:
+                    return
+                _keys = []
+                for path, future in [(path, executor.submit(os.stat, path)) for path in _batch]:
+                    try:
+                        _stat = future.result()
+                    except OSError:
+                        continue
+                    _keys.append((path, _stat.st_size, _stat.st_mtime))
+                _cached = _cache.get_many(_keys) if _cache else {}
+                _probed = []
+                _futures = []
+                for path, size, mtime in _keys:
+                    if path in _cached:
+                        yield path, _cached[path]
+                    else:
+                        _futures.append(((path, size, mtime), executor.submit(probe_file, path)))
+                for key, future in _futures:
+                    try:
+                        _header = future.result()
+                    except OSError:
+                        continue
+                    _probed.append(key + (_header,))
+                    yield key[0], _header
+                if _cache and _probed:
+                    _cache.put_many(_probed)
+    finally:
+        if _cache:
+            _cache.close()
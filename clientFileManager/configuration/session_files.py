@@ -0,0 +1,115 @@
+################################################################################
+## Client File Manager TOOL - Ingesting client files into a production pipeline
+##  with tracking, logging and configuration overrides.
+##
+## File : session_files.py
+## Description : Saving and loading a prepared ingest, every row of the client
+##      files tree with the values set on it, to a single SQLite file.
+##
+## Created by: Kieran Knight
+## Email: kieransknight@gmail.com
+##
+################################################################################
+
+# Python Modules
+import os
+import time
+import sqlite3
+
+_VERSION = 1
+
+# every row of the tree, in the order it was added
+SESSION_COLUMNS = (
+    'id', 'parent', 'kind', 'file', 'folder', 'parent_folder', 'archive', 'member',
+    'size', 'mtime', 'file_hash', 'duplicate_of', 'sequence', 'shot', 'location',
+    'option', 'populated'
+)
+
+# the kind of each row
+FILE_ROW = 0
+HEADER_ROW = 1
+FOLDER_ROW = 2
+
+_SCHEMA = """
+CREATE TABLE session (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE items (
+    id INTEGER PRIMARY KEY,
+    parent INTEGER,
+    kind INTEGER NOT NULL,
+    file TEXT,
+    folder TEXT,
+    parent_folder TEXT,
+    archive TEXT,
+    member TEXT,
+    size INTEGER,
+    mtime REAL,
+    file_hash TEXT,
+    duplicate_of INTEGER,
+    sequence TEXT,
+    shot TEXT,
+    location TEXT,
+    option TEXT,
+    populated INTEGER
+);
+"""
+
+
+def write_session(location, rows):
+    """
+    Writing the rows of a session, replacing the file if it already exists.
+    The rows are written to a temporary file first so a failed save
+    never leaves a broken session behind.
+
+    Args:
+        location (str): The session file.
+        rows (list): Tuples of SESSION_COLUMNS values.
+
+    Returns:
+        int: The number of rows written.
+    """
+    _folder = os.path.dirname(location)
+    if _folder and not os.path.isdir(_folder):
+        os.makedirs(_folder)
+    _temporary = '{}.saving'.format(location)
+    if os.path.exists(_temporary):
+        os.remove(_temporary)
+    _connection = sqlite3.connect(_temporary)
+    try:
+        _connection.execute('PRAGMA journal_mode=OFF')
+        _connection.executescript(_SCHEMA)
+        with _connection:
+            _connection.executemany(
+                'INSERT INTO session VALUES (?, ?)',
+                [('version', str(_VERSION)), ('saved', str(time.time())), ('rows', str(len(rows)))]
+            )
+            _connection.executemany(
+                'INSERT INTO items VALUES ({})'.format(', '.join('?' * len(SESSION_COLUMNS))), rows)
+    finally:
+        _connection.close()
+    os.replace(_temporary, location)
+    return len(rows)
+
+
+def read_session(location):
+    """
+    Reading the rows of a session. Nothing is checked against the
+    client files here, so loading doesn't wait on the storage.
+
+    Args:
+        location (str): The session file.
+
+    Raises:
+        ValueError: If the file was saved by a newer version of the tool.
+
+    Returns:
+        list: Tuples of SESSION_COLUMNS values, parents before their children.
+    """
+    _connection = sqlite3.connect('file:{}?mode=ro'.format(location), uri=True)
+    try:
+        _version = int(_connection.execute("SELECT value FROM session WHERE key = 'version'").fetchone()[0])
+        if _version > _VERSION:
+            raise ValueError('{} was saved by a newer version of the Client File Manager'.format(location))
+        return _connection.execute(
+            'SELECT {} FROM items ORDER BY id'.format(', '.join(SESSION_COLUMNS))).fetchall()
+    finally:
+        _connection.close()
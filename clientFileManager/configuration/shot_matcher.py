@@ -0,0 +1,341 @@
+################################################################################
+## Client File Manager TOOL - Ingesting client files into a production pipeline
+##  with tracking, logging and configuration overrides.
+##
+## File : shot_matcher.py
+## Description : Matching client filenames against the sequences and shots
+##      that already exist in the output location. The existing names are
+##      indexed once by the token they are anchored on, so each filename only
+##      scores the few names that share one of its tokens.
+##
+## Created by: Kieran Knight
+## Email: kieransknight@gmail.com
+##
+################################################################################
+
+# Python Modules
+import re
+from itertools import chain
+from functools import lru_cache
+from collections import namedtuple
+
+ShotMatch = namedtuple('ShotMatch', ('sequence', 'shot', 'confidence'))
+# the tokens of an existing name, the token it is anchored on and the weight of all of them
+_Name = namedtuple('_Name', ('tokens', 'anchor', 'total'))
+
+_NO_MATCH = ShotMatch(None, None, 0.0)
+# runs of letters, or of digits without their leading zeros
+_TOKENS = re.compile(r'([a-z]+)|0*(\d+)')
+# the last number of a reversed filename, the frame of an image sequence
+_FRAME = re.compile(r'\D*(\d+)')
+# tokens of the filename that may sit between two tokens of a name, ie. seq_010_comp_020
+_GAP = 2
+# weight of each number in a name, the numbers are what tell shots apart
+_NUMBER_WEIGHT = 2.0
+_SEQUENCE_WEIGHT = 0.4
+_SHOT_WEIGHT = 0.6
+# sequences whose shots are scored for each filename, if they scored close to the best
+_SEQUENCE_CANDIDATES = 2
+_SEQUENCE_MARGIN = 0.25
+# a sequence scoring this much was found by its letters as well as its number
+_SEQUENCE_FOUND = 0.8
+
+
+def tokenize(name):
+    """
+    Splitting a name into its runs of letters and numbers, lower case and
+    with leading zeros removed, so SEQ010_SH0020 and seq10-sh20 are the same.
+
+    Args:
+        name (str): The filename, sequence or shot.
+
+    Returns:
+        tuple: The tokens.
+    """
+    return tuple(word or number for word, number in _TOKENS.findall(name.lower()))
+
+
+def _trigrams(value):
+    return {value[index:index + 3] for index in range(len(value) - 2)}
+
+
+@lru_cache(maxsize=65536)
+def _word_similarity(a, b):
+    """
+    How alike two runs of letters are, ie. sh and shot or plate and plates.
+    """
+    if min(len(a), len(b)) < 2:
+        return 0.0
+    if a.startswith(b) or b.startswith(a):
+        return 0.8
+    if len(a) < 3 or len(b) < 3:
+        return 0.0
+    _a, _b = _trigrams(a), _trigrams(b)
+    _dice = 2.0 * len(_a & _b) / (len(_a) + len(_b))
+    return _dice * 0.8 if _dice >= 0.5 else 0.0
+
+
+def _similarity(name_token, token):
+    if token is None:
+        return 0.0
+    if name_token == token:
+        return 1.0
+    if name_token.isdigit() or token.isdigit():
+        return 0.0
+    return _word_similarity(name_token, token)
+
+
+def _weight(token):
+    return _NUMBER_WEIGHT if token.isdigit() else 1.0
+
+
+def prepare(name):
+    """
+    Preparing the tokens of an existing name to be aligned.
+
+    Args:
+        name (tuple): The tokens of the sequence or shot.
+
+    Returns:
+        _Name: The tokens, the index of the first number, or 0 if it has
+            none, and the total weight of the tokens.
+    """
+    return _Name(
+        name,
+        next((index for index, token in enumerate(name) if token.isdigit()), 0),
+        sum(_weight(token) for token in name)
+    )
+
+
+def align(name, tokens, positions, used=frozenset()):
+    """
+    Finding a name in the tokens of a filename. A name written out as is
+    scores 1. Otherwise the name is anchored on its first number, and the
+    rest of its tokens are looked for either side of the anchor allowing a
+    couple of other tokens in between. Every number in the name has to be
+    found, and a name without numbers has to be written out as is.
+
+    Args:
+        name (_Name): The prepared sequence or shot.
+        tokens (tuple): The tokens of the filename.
+        positions (dict): Each token of the filename mapped to where it is.
+        used (set): Positions of the filename already taken by another name.
+
+    Returns:
+        tuple: (score between 0 and 1, the positions matched)
+    """
+    name, _anchor, _total = name
+    _length = len(name)
+    _starts = positions.get(name[_anchor], ())
+    for start in _starts:
+        _first = start - _anchor
+        if _first >= 0 and tokens[_first:_first + _length] == name and \
+                used.isdisjoint(range(_first, _first + _length)):
+            return 1.0, tuple(range(_first, _first + _length))
+    if not name[_anchor].isdigit():
+        return 0.0, ()
+
+    _best = (0.0, ())
+    for start in _starts:
+        if start in used:
+            continue
+        _score = _similarity(name[_anchor], tokens[start])
+        if not _score:
+            continue
+        _score *= _weight(name[_anchor])
+        _positions = [start]
+        _found = True
+        for _step, _order in ((1, name[_anchor + 1:]), (-1, name[_anchor - 1::-1] if _anchor else ())):
+            _last = start
+            for name_token in _order:
+                _match = max(
+                    (
+                        (_similarity(name_token, tokens[position]), position)
+                        for position in range(_last + _step, _last + _step * (_GAP + 1), _step)
+                        if 0 <= position < len(tokens) and position not in used
+                    ),
+                    default=(0.0, None)
+                )
+                if _match[0]:
+                    _score += _match[0] * _weight(name_token)
+                    _positions.append(_match[1])
+                    _last = _match[1]
+                elif name_token.isdigit():
+                    _found = False
+                    break
+            if not _found:
+                break
+        if _found and _score / _total > _best[0]:
+            _best = (_score / _total, tuple(_positions))
+    return _best
+
+
+class ShotMatcher(object):
+    """
+    Matching client filenames against the sequences and shots that already
+    exist, so rows are filled with names that are already in use.
+
+    Every name is posted under the first of its numbers, or its first token
+    if it has none. Each filename is scored against the sequences posted
+    under one of its tokens, then against the shots of the best sequences.
+    Where no sequence matches, every shot posted under one of its tokens
+    is scored instead.
+    The confidence of a match is lowered when it is only part of a name,
+    when the sequence couldn't be found and when another shot scored the
+    same. Filenames that only differ by numbers no name uses, ie. the
+    frames of an image sequence, are only scored once.
+
+    Args:
+        shots (dict): Every existing sequence name mapped to its shot names.
+    """
+    def __init__(self, shots):
+        super(ShotMatcher, self).__init__()
+        self._sequences = {}
+        self._shots = {}
+        self._sequence_postings = {}
+        self._shot_postings = {}
+        self._all_shot_postings = {}
+        self._numbers = set()
+        self._cache = {}
+        self._frames = {}
+
+        for sequence, names in shots.items():
+            _sequence_tokens = tokenize(sequence)
+            if not _sequence_tokens:
+                continue
+            self._sequences[sequence] = prepare(_sequence_tokens)
+            self._sequence_postings.setdefault(self._anchor(self._sequences[sequence]), []).append(sequence)
+            for shot in names:
+                _shot_tokens = tokenize(shot)
+                # shots named after their sequence, ie. SEQ010/SEQ010_SH020, only need the shot part
+                if len(_shot_tokens) > len(_sequence_tokens) and \
+                        _shot_tokens[:len(_sequence_tokens)] == _sequence_tokens:
+                    _shot_tokens = _shot_tokens[len(_sequence_tokens):]
+                if not _shot_tokens:
+                    continue
+                self._shots[(sequence, shot)] = prepare(_shot_tokens)
+                _anchor = self._anchor(self._shots[(sequence, shot)])
+                self._shot_postings.setdefault((sequence, _anchor), []).append(shot)
+                self._all_shot_postings.setdefault(_anchor, []).append((sequence, shot))
+
+    def __len__(self):
+        return len(self._shots)
+
+    def _anchor(self, name):
+        """
+        Getting the token a name is posted under, a name can only match a
+        filename that has the token it is anchored on.
+
+        Args:
+            name (_Name): The prepared sequence or shot.
+        """
+        self._numbers.update(token for token in name.tokens if token.isdigit())
+        return name.tokens[name.anchor]
+
+    def match(self, filename):
+        """
+        Matching a single filename.
+
+        Args:
+            filename (str): The client filename.
+
+        Returns:
+            ShotMatch: The sequence and shot found, either can be None,
+                and the confidence of the match between 0 and 1.
+        """
+        # the frames of an image sequence are told apart by a number no name uses
+        _reversed = filename[::-1]
+        _frame = _FRAME.match(_reversed)
+        if _frame is None or (_frame.group(1)[::-1].lstrip('0') or '0') in self._numbers:
+            return self._match(filename)
+        _without_frame = (_reversed[:_frame.start(1)], _reversed[_frame.end():])
+        _match = self._frames.get(_without_frame)
+        if _match is None:
+            _match = self._frames[_without_frame] = self._match(filename)
+        return _match
+
+    def _match(self, filename):
+        # numbers no name uses can't match, so filenames only differing by them share a key
+        _numbers = self._numbers
+        _key = tuple([
+            word or (number if number in _numbers else None) for word, number in _TOKENS.findall(filename.lower())
+        ])
+        _match = self._cache.get(_key)
+        if _match is None:
+            _match = self._cache[_key] = self._score(_key)
+        return _match
+
+    def match_all(self, filenames):
+        """
+        Matching a batch of filenames, ie. every file of a delivery.
+
+        Args:
+            filenames (list): The client filenames.
+
+        Returns:
+            list: A ShotMatch for each filename.
+        """
+        return [self.match(filename) for filename in filenames]
+
+    def _score(self, tokens):
+        """
+        Scoring the tokens of a filename against the sequences and shots.
+
+        Returns:
+            ShotMatch: The best match.
+        """
+        _positions = {}
+        for position, token in enumerate(tokens):
+            if token is not None:
+                _positions.setdefault(token, []).append(position)
+
+        _sequences = []
+        for sequence in set(chain.from_iterable(self._sequence_postings.get(token, ()) for token in _positions)):
+            _score, _used = align(self._sequences[sequence], tokens, _positions)
+            if _score:
+                _sequences.append((_score, sequence, frozenset(_used)))
+        if _sequences:
+            _top = max(_sequences)[0]
+            _sequences = sorted(
+                (result for result in _sequences if result[0] >= _top - _SEQUENCE_MARGIN),
+                key=lambda result: (-result[0], result[1])
+            )[:_SEQUENCE_CANDIDATES]
+
+        # shots with the same name in different sequences score the same
+        _aligned = {}
+        _results = {}
+        for _sequence_score, sequence, _used in _sequences:
+            for shot in set(chain.from_iterable(
+                    self._shot_postings.get((sequence, token), ()) for token in _positions)):
+                _name = self._shots[(sequence, shot)]
+                if (_name.tokens, _used) not in _aligned:
+                    _aligned[(_name.tokens, _used)] = align(_name, tokens, _positions, _used)[0]
+                if _aligned[(_name.tokens, _used)]:
+                    _results[(sequence, shot)] = \
+                        _SEQUENCE_WEIGHT * _sequence_score + _SHOT_WEIGHT * _aligned[(_name.tokens, _used)]
+        if not _results:
+            # the sequence isn't in the filename, so any shot sharing its numbers could be it
+            _used = _sequences[0][2] if _sequences and _sequences[0][0] >= _SEQUENCE_FOUND else frozenset()
+            for sequence, shot in set(chain.from_iterable(
+                    self._all_shot_postings.get(token, ()) for token in _positions)):
+                _name = self._shots[(sequence, shot)]
+                if (_name.tokens, _used) not in _aligned:
+                    _aligned[(_name.tokens, _used)] = align(_name, tokens, _positions, _used)[0]
+                if _aligned[(_name.tokens, _used)]:
+                    _results[(sequence, shot)] = _SHOT_WEIGHT * _aligned[(_name.tokens, _used)]
+
+        if not _results:
+            if _sequences:
+                return ShotMatch(_sequences[0][1], None, round(_SEQUENCE_WEIGHT * _sequences[0][0], 3))
+            return _NO_MATCH
+        _confidence = max(_results.values())
+        _best = sorted(key for key, confidence in _results.items() if confidence >= _confidence - 1e-9)
+        sequence, shot = _best[0]
+        if len(_best) > 1:
+            if len({shot for _, shot in _best}) == 1:
+                # the shot is known but not which sequence it is in
+                sequence = None
+            else:
+                # another shot scoring the same means the filename doesn't say which it is
+                _confidence /= 2.0
+        return ShotMatch(sequence, shot, round(_confidence, 3))
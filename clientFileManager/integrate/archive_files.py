@@ -0,0 +1,189 @@
+################################################################################
+## Client File Manager TOOL - Ingesting client files into a production pipeline
+##  with tracking, logging and configuration overrides.
+##
+## File : archive_files.py
+## Description : Reading client archive deliveries (zip, tar, tar.gz, tar.xz)
+##      without extracting them to disk first. Members are listed for the
+##      configuration stage and streamed straight to their integrate location.
+##
+## Created by: Kieran Knight
+## Email: kieransknight@gmail.com
+##
+################################################################################
+
+# Python Modules
+import os
+import shutil
+import tarfile
+import zipfile
+import threading
+
+_ZIP_EXTENSIONS = ('.zip',)
+_TAR_EXTENSIONS = ('.tar', '.tar.gz', '.tgz', '.tar.xz', '.txz')
+_COPY_BUFFER = 1024 * 1024
+
+
+def is_archive(path):
+    """
+    Checking whether the passed path is an archive the application can read.
+    Only the extension is checked so folders with thousands of files
+    are not opened one by one.
+
+    Args:
+        path (str): The file path to check.
+
+    Returns:
+        bool: True if the file is a supported archive.
+    """
+    _name = str(path).lower()
+    return _name.endswith(_ZIP_EXTENSIONS + _TAR_EXTENSIONS) and os.path.isfile(str(path))
+
+
+def is_zip(path):
+    return str(path).lower().endswith(_ZIP_EXTENSIONS)
+
+
+def list_members(archive):
+    """
+    Listing the regular file members of an archive.
+    Directories, links and devices are skipped as they can't be integrated.
+
+    Args:
+        archive (str): The archive path.
+
+    Returns:
+        list: A list of (member name, member size) tuples.
+    """
+    archive = str(archive)
+    if is_zip(archive):
+        with zipfile.ZipFile(archive) as zip_file:
+            return [
+                (info.filename, info.file_size)
+                for info in zip_file.infolist() if not info.is_dir()
+            ]
+    with tarfile.open(archive, 'r:*') as tar_file:
+        return [(info.name, info.size) for info in tar_file if info.isfile()]
+
+
+def _stream(source, dst, progress=None, digest=None):
+    """
+    Streaming an open archive member to the destination path.
+
+    Args:
+        source (file object): The open archive member.
+        dst (str): The destination file path.
+        progress (callable): Called with the number of bytes after each write.
+        digest (StreamHash): Updated with the contents as they are written.
+    """
+    with open(dst, 'wb') as out_file:
+        while True:
+            _chunk = source.read(_COPY_BUFFER)
+            if not _chunk:
+                break
+            out_file.write(_chunk)
+            if digest:
+                digest.update(_chunk)
+            if progress:
+                progress(len(_chunk))
+
+
+# zip handles are kept open per worker thread, reading the central directory
+# of a large archive for every member would be far slower than the copy itself.
+_ZIP_HANDLES = {}
+_ZIP_LOCK = threading.Lock()
+
+
+def _zip_handle(archive):
+    _key = (threading.get_ident(), archive)
+    with _ZIP_LOCK:
+        if _key not in _ZIP_HANDLES:
+            _ZIP_HANDLES[_key] = zipfile.ZipFile(archive)
+        return _ZIP_HANDLES[_key]
+
+
+def _drop_zip_handle(archive):
+    _key = (threading.get_ident(), archive)
+    with _ZIP_LOCK:
+        _handle = _ZIP_HANDLES.pop(_key, None)
+    if _handle is not None:
+        try:
+            _handle.close()
+        except OSError:
+            pass
+
+
+def close_zip_handles():
+    """
+    Closing every zip handle opened by the worker threads.
+    """
+    with _ZIP_LOCK:
+        [handle.close() for handle in _ZIP_HANDLES.values()]
+        _ZIP_HANDLES.clear()
+
+
+def extract_zip_member(archive, member, dst, progress=None, digest=None):
+    """
+    Extracting a single zip member straight to its destination.
+    Zip members are independent of each other so this is safe to call
+    from several threads at once, each thread reads through its own handle.
+
+    Args:
+        archive (str): The zip archive path.
+        member (str): The member name inside the archive.
+        dst (str): The destination file path.
+        progress (callable): Called with the number of bytes after each write.
+        digest (StreamHash): Updated with the member contents as they are written.
+    """
+    try:
+        with _zip_handle(archive).open(member) as source:
+            _stream(source, dst, progress=progress, digest=digest)
+    except OSError:
+        # a handle on a share that dropped stays broken, so a retry opens the archive again
+        _drop_zip_handle(archive)
+        raise
+
+
+def extract_tar_members(archive, members, progress=None, digests=None):
+    """
+    Extracting tar members straight to their destinations.
+    Compressed tars can't be seeked cheaply, so the archive is read once from
+    start to end in stream mode and the requested members are written as they pass.
+
+    Args:
+        archive (str): The tar archive path.
+        members (list): A list of (member name, destination path) tuples.
+        progress (callable): Called with the destination and the number of bytes after each write.
+        digests (dict): Member names mapped to the StreamHash updated with their contents.
+
+    Returns:
+        dict: Destination paths mapped to the error raised, empty if all succeeded.
+    """
+    _wanted = {}
+    for member, dst in members:
+        _wanted.setdefault(member, []).append(dst)
+
+    _failed = {}
+    with tarfile.open(archive, 'r|*') as tar_file:
+        for info in tar_file:
+            if info.name not in _wanted:
+                continue
+            # stream mode can only read a member once, any repeated
+            # destinations are copied from the first extracted file.
+            _dsts = _wanted.pop(info.name)
+            try:
+                _stream(
+                    tar_file.extractfile(info), _dsts[0],
+                    progress=(lambda count, dst=_dsts[0]: progress(dst, count)) if progress else None,
+                    digest=(digests or {}).get(info.name)
+                )
+                [shutil.copyfile(_dsts[0], dst) for dst in _dsts[1:]]
+            except (OSError, tarfile.TarError) as error:
+                _failed.update({dst: error for dst in _dsts})
+            if not _wanted:
+                break
+
+    for member, dsts in _wanted.items():
+        for dst in dsts:
+            _failed[dst] = KeyError('{} was not found in {}'.format(member, archive))
+    return _failed
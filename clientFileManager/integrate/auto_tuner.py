@@ -0,0 +1,184 @@
+################################################################################
+## Client File Manager TOOL - Ingesting client files into a production pipeline
+##  with tracking, logging and configuration overrides.
+##
+## File : auto_tuner.py
+## Description : Tuning the number of copy workers while an integration runs.
+##      Throughput and per-file latency are measured and the worker count is
+##      moved up and down (AIMD) to find where extra workers stop helping.
+##
+## Created by: Kieran Knight
+## Email: kieransknight@gmail.com
+##
+################################################################################
+
+# Python Modules
+import os
+import time
+
+# Application
+from utils import read_json, write_json
+from paths import _AUTO_TUNE
+
+
+def read_tuned_workers(destination, default, tune_file=_AUTO_TUNE):
+    """
+    Reading the worker count learned for a destination on a previous run.
+
+    Args:
+        destination (str): The destination (output location) path.
+        default (int): The worker count to use if nothing has been learned yet.
+        tune_file (str): The json file the learned settings are stored in.
+
+    Returns:
+        int: The worker count.
+    """
+    if not os.path.exists(tune_file):
+        return default
+    try:
+        return int(read_json(tune_file).get(os.path.normpath(str(destination)), default))
+    except (ValueError, OSError):
+        return default
+
+
+def write_tuned_workers(destination, workers, tune_file=_AUTO_TUNE):
+    """
+    Storing the learned worker count for a destination.
+
+    Args:
+        destination (str): The destination (output location) path.
+        workers (int): The worker count to store.
+        tune_file (str): The json file the learned settings are stored in.
+    """
+    _data = {}
+    if os.path.exists(tune_file):
+        try:
+            _data = read_json(tune_file)
+        except (ValueError, OSError):
+            _data = {}
+    _data[os.path.normpath(str(destination))] = int(workers)
+    write_json(_data, json_file=tune_file)
+
+
+class ConcurrencyTuner(object):
+    """
+    Additive increase / multiplicative decrease tuner for the worker count.
+
+    Every interval the aggregate throughput and the mean per-file latency are
+    compared with the previous interval:
+    * throughput went up, or no knee has been found yet - another worker is added.
+    * throughput dropped, or latency doubled without a throughput gain - the
+      worker count is cut back, the storage is past its knee.
+    * the last added worker gave no gain - that count is the knee, the count
+      steps back and is held, only probing upwards again after a few stable intervals.
+
+    The count is only changed while every worker is busy, otherwise the
+    measurement says nothing about the storage.
+    """
+    _TOLERANCE = 0.05
+    _DECREASE = 0.75
+    _PROBE_INTERVALS = 5
+    _MIN_SAMPLES = 3
+
+    def __init__(self, workers, minimum=1, maximum=32, interval=2.0):
+        super(ConcurrencyTuner, self).__init__()
+        self._minimum = max(1, minimum)
+        self._maximum = max(self._minimum, maximum)
+        self._workers = min(self._maximum, max(self._minimum, workers))
+        self._interval = interval
+
+        self._start = time.time()
+        self._bytes = 0
+        self._latency = 0.0
+        self._samples = 0
+        self._saturated = True
+        self._last_throughput = None
+        self._best_latency = None
+        self._last_workers = self._workers
+        self._knee = None
+        self._stable = 0
+
+    @property
+    def workers(self):
+        return self._workers
+
+    @property
+    def maximum(self):
+        return self._maximum
+
+    def record(self, size, latency, running):
+        """
+        Recording a finished file.
+
+        Args:
+            size (int): The bytes copied.
+            latency (float): The seconds the copy took.
+            running (int): The number of workers busy when the file was started.
+        """
+        self._bytes += size
+        self._latency += latency
+        self._samples += 1
+        # a free worker at any point means the pool wasn't the bottleneck
+        self._saturated = self._saturated and running >= self._workers
+
+    def update(self):
+        """
+        Closing the current interval if it is over and adjusting the worker count.
+
+        Returns:
+            int: The new worker count, or None if it is unchanged.
+        """
+        _now = time.time()
+        _elapsed = _now - self._start
+        if _elapsed < self._interval or self._samples < self._MIN_SAMPLES:
+            return None
+
+        _throughput = self._bytes / _elapsed
+        _latency = self._latency / self._samples
+        _saturated = self._saturated
+        self._start = _now
+        self._bytes = 0
+        self._latency = 0.0
+        self._samples = 0
+        self._saturated = True
+
+        _previous = self._last_throughput
+        _changed = self._last_workers != self._workers
+        self._last_throughput = _throughput
+        self._last_workers = self._workers
+        if self._best_latency is None or _latency < self._best_latency:
+            self._best_latency = _latency
+        if _previous is None or not _saturated:
+            return None
+
+        _workers = self._workers
+        _gain = _throughput > _previous * (1 + self._TOLERANCE)
+        if _throughput < _previous * (1 - self._TOLERANCE) or (
+                _latency > self._best_latency * 2 and not _gain):
+            # past the knee, back off multiplicatively
+            _workers = int(_workers * self._DECREASE)
+            self._knee = max(self._minimum, _workers)
+            self._stable = 0
+            # fewer workers always lowers throughput at first, the next
+            # interval becomes the new baseline rather than another drop.
+            self._last_throughput = None
+        elif _changed and not _gain:
+            # the extra worker didn't help, this is the knee
+            _workers -= 1
+            self._knee = _workers
+            self._stable = 0
+            self._last_throughput = None
+        elif _gain or self._knee is None:
+            _workers += 1
+            self._stable = 0
+        else:
+            self._stable += 1
+            if self._stable >= self._PROBE_INTERVALS:
+                _workers += 1
+                self._stable = 0
+
+        _workers = min(self._maximum, max(self._minimum, _workers))
+        if _workers == self._workers:
+            return None
+        self._workers = _workers
+        return _workers
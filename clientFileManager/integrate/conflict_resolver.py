@@ -0,0 +1,184 @@
+################################################################################
+## Client File Manager TOOL - Ingesting client files into a production pipeline
+##  with tracking, logging and configuration overrides.
+##
+## File : conflict_resolver.py
+## Description : Deciding what happens to a client file whose destination
+##      already exists, with a policy per option. Every folder is listed once
+##      and kept in memory, so a run is resolved without checking each file
+##      on the storage.
+##
+## Created by: Kieran Knight
+## Email: kieransknight@gmail.com
+##
+################################################################################
+
+# Python Modules
+import os
+import re
+
+# Application
+from utils import normalise_path
+
+OVERWRITE = 'overwrite'
+SKIP = 'skip'
+RENAME = 'rename'
+VERSION = 'version'
+
+_VERSION_FOLDER = re.compile(r'^v(\d+)$')
+
+
+class ConflictResolver(object):
+    """
+    Resolving the destinations of a run with the conflict policy of their
+    option.
+
+    overwrite replaces the existing file, skip leaves it and doesn't
+    integrate the client file, rename adds the next free _1, _2... before
+    the extensions, and version writes every file of the run going to an
+    option folder to a new version folder after the newest one, ie.
+    {option}/v003/{filename}, starting at v001, so a sequence is never split
+    across versions. Options without a policy, or an unknown one, are
+    overwritten.
+
+    Each folder is listed the first time a destination in it is resolved,
+    and every destination resolved is added to its listing, so two client
+    files with the same name in a run are resolved against each other too.
+    Each destination is only written by the first file of the run to claim
+    it, later files are renamed by the rename policy and skipped by the others.
+
+    Args:
+        policies (dict): Option names mapped to their policy.
+    """
+    def __init__(self, policies):
+        super(ConflictResolver, self).__init__()
+        self._policies = policies
+        self._listings = {}
+        self._versions = {}
+        self._replacing = set()
+        self._claims = {}
+        self._rivals = {}
+        self._listed = 0
+
+    @property
+    def listed(self):
+        """
+        The number of folders read from the storage.
+        """
+        return self._listed
+
+    def _listing(self, folder):
+        """
+        Getting the names in a folder, each mapped to whether it is a folder.
+        A folder that doesn't exist yet holds nothing.
+        """
+        _listing = self._listings.get(folder)
+        if _listing is None:
+            _listing = self._listings[folder] = {}
+            try:
+                with os.scandir(folder) as entries:
+                    for entry in entries:
+                        try:
+                            _listing[entry.name] = entry.is_dir()
+                        except OSError:
+                            _listing[entry.name] = False
+                self._listed += 1
+            except OSError:
+                pass
+        return _listing
+
+    def exists(self, path):
+        """
+        Checking whether a file exists, or has been resolved earlier in the run.
+
+        Args:
+            path (str): The file path.
+        """
+        return os.path.basename(path) in self._listing(os.path.dirname(path))
+
+    def replaces(self, path):
+        """
+        Checking whether a resolved destination will overwrite a file.
+
+        Args:
+            path (str): The resolved destination.
+        """
+        return path in self._replacing
+
+    def rival(self, entry):
+        """
+        Getting the entry that claimed the destination of a skipped entry
+        earlier in the run.
+
+        Args:
+            entry (IntegrateEntry): The skipped entry.
+
+        Returns:
+            IntegrateEntry: The entry writing the destination, or None if the
+                entry was skipped because the file already exists.
+        """
+        return self._rivals.get(id(entry))
+
+    @staticmethod
+    def _key(path):
+        return os.path.normcase(normalise_path(path))
+
+    def resolve(self, entry):
+        """
+        Resolving the destination of an entry.
+
+        Args:
+            entry (IntegrateEntry): The file to integrate.
+
+        Returns:
+            str: The destination to write, or None if the file should be skipped.
+        """
+        _policy = self._policies.get(entry.option, OVERWRITE)
+        _dst = entry.dst
+        if _policy == VERSION:
+            _dst = self._next_version(_dst)
+        elif self.exists(_dst):
+            if _policy == SKIP and self._key(_dst) not in self._claims:
+                return None
+            if _policy == RENAME:
+                _dst = self._next_name(_dst)
+        _claimed = self._claims.setdefault(self._key(_dst), entry)
+        if _claimed is not entry:
+            self._rivals[id(entry)] = _claimed
+            return None
+        if self.exists(_dst):
+            self._replacing.add(_dst)
+        self._listing(os.path.dirname(_dst))[os.path.basename(_dst)] = False
+        return _dst
+
+    def _next_name(self, dst):
+        """
+        Getting the first free name of a file with a number added before its
+        extensions, ie. plate_2.1001.exr, so image sequences keep their frames.
+        """
+        _folder, _filename = os.path.split(dst)
+        _listing = self._listing(_folder)
+        _name, _dot, _extensions = _filename.partition('.')
+        _count = 1
+        while '{}_{}{}{}'.format(_name, _count, _dot, _extensions) in _listing:
+            _count += 1
+        return os.path.join(_folder, '{}_{}{}{}'.format(_name, _count, _dot, _extensions))
+
+    def _next_version(self, dst):
+        """
+        Getting the destination in the version folder of this run, the one
+        after the newest version folder on the storage. It is picked once for
+        each option folder, so every file of the run goes to the same version
+        and nothing is written into a version that already exists.
+        """
+        _folder, _filename = os.path.split(dst)
+        _version = self._versions.get(_folder)
+        if _version is None:
+            _version = self._versions[_folder] = 'v{:03d}'.format(max(
+                (int(_VERSION_FOLDER.match(name).group(1))
+                 for name, is_folder in self._listing(_folder).items()
+                 if is_folder and _VERSION_FOLDER.match(name)),
+                default=0
+            ) + 1)
+            self._listing(_folder)[_version] = True
+        return os.path.join(_folder, _version, _filename)
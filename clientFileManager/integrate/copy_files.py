@@ -0,0 +1,290 @@
+################################################################################
+## Client File Manager TOOL - Ingesting client files into a production pipeline
+##  with tracking, logging and configuration overrides.
+##
+## File : copy_files.py
+## Description : Copying client files without flooding the page cache.
+##      Destinations are preallocated, sources are read sequentially and
+##      written data is dropped from the cache once it is on disk. Very
+##      large files can optionally bypass the cache with O_DIRECT.
+##
+## Created by: Kieran Knight
+## Email: kieransknight@gmail.com
+##
+################################################################################
+
+# Python Modules
+import os
+import mmap
+import time
+import stat
+import errno
+import shutil
+import tempfile
+import argparse
+import threading
+
+# Application
+from utils import _DEFAULT_CONFIG
+
+_ALIGNMENT = 4096
+
+# page aligned buffers, reused by each worker thread for every file it copies
+_BUFFERS = threading.local()
+
+
+def _buffer(size):
+    """
+    Getting this thread's copy buffer. Anonymous mmaps are page aligned,
+    which O_DIRECT requires, and are kept so no buffer is allocated per file.
+
+    Args:
+        size (int): The buffer size in bytes.
+
+    Returns:
+        mmap.mmap: The buffer.
+    """
+    size = max(_ALIGNMENT, size - size % _ALIGNMENT)
+    _current = getattr(_BUFFERS, 'buffer', None)
+    if _current is None or len(_current) != size:
+        if _current is not None:
+            _current.close()
+        _BUFFERS.buffer = mmap.mmap(-1, size)
+    return _BUFFERS.buffer
+
+
+def _advise(fd, offset, length, advice):
+    if hasattr(os, 'posix_fadvise'):
+        try:
+            os.posix_fadvise(fd, offset, length, advice)
+        except OSError:
+            pass
+
+
+def _preallocate(fd, size):
+    """
+    Reserving the full destination size up front so the filesystem can lay
+    the file out in as few extents as possible.
+    Not every filesystem supports this (ie. SMB and some NFS mounts), in which
+    case the file is just written normally.
+    """
+    if not size or not hasattr(os, 'posix_fallocate'):
+        return
+    try:
+        os.posix_fallocate(fd, 0, size)
+    except OSError as error:
+        if error.errno not in (errno.EOPNOTSUPP, errno.EINVAL, errno.ENOSYS):
+            raise
+
+
+def _read_into(fd, buf):
+    if hasattr(os, 'readv'):
+        return os.readv(fd, [buf])
+    _data = os.read(fd, len(buf))
+    buf[:len(_data)] = _data
+    return len(_data)
+
+
+def _write_all(fd, view):
+    while view:
+        view = view[os.write(fd, view):]
+
+
+def _open_destination(dst, flags=0):
+    _flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0) | flags
+    try:
+        return os.open(dst, _flags, 0o666)
+    except PermissionError:
+        # matching xcopy /R, read-only destinations are overwritten
+        if not os.path.exists(dst):
+            raise
+        os.chmod(dst, os.stat(dst).st_mode | stat.S_IWRITE)
+        return os.open(dst, _flags, 0o666)
+
+
+def _copy_buffered(src_fd, dst_fd, size, settings, progress=None, digest=None):
+    """
+    Copying through the page cache, but dropping every flushed window of the
+    destination from the cache so it doesn't push out everything else.
+    """
+    _buf = _buffer(settings['bufferSize'])
+    _view = memoryview(_buf)
+    _window = settings['flushWindow']
+    _flushed = 0
+    _written = 0
+    try:
+        while True:
+            _read = _read_into(src_fd, _buf)
+            if not _read:
+                break
+            _write_all(dst_fd, _view[:_read])
+            _written += _read
+            if digest:
+                digest.update(_view[:_read])
+            if progress:
+                progress(_read)
+            if _window and _written - _flushed >= _window:
+                os.fdatasync(dst_fd) if hasattr(os, 'fdatasync') else os.fsync(dst_fd)
+                _advise(dst_fd, _flushed, _written - _flushed, getattr(os, 'POSIX_FADV_DONTNEED', 0))
+                _advise(src_fd, _flushed, _written - _flushed, getattr(os, 'POSIX_FADV_DONTNEED', 0))
+                _flushed = _written
+    finally:
+        _view.release()
+    return _written
+
+
+def _copy_direct(src, dst, size, settings, progress=None, digest=None):
+    """
+    Copying with O_DIRECT on both files so nothing passes through the page cache.
+    O_DIRECT needs aligned buffers, offsets and lengths, so the final partial
+    block is padded and the file is truncated back to the bytes copied.
+    A share can return less than was asked for anywhere in the file, which
+    is carried on from while it stays aligned. A read that isn't aligned
+    can't be carried on from, so it has to have been the end of the file.
+
+    Returns:
+        int: The bytes copied, or None if the filesystem doesn't support O_DIRECT.
+
+    Raises:
+        OSError: The source returned less than the whole file.
+    """
+    try:
+        src_fd = os.open(src, os.O_RDONLY | os.O_DIRECT)
+    except OSError as error:
+        if error.errno == errno.EINVAL:
+            return None
+        raise
+    try:
+        try:
+            dst_fd = _open_destination(dst, os.O_DIRECT)
+        except OSError as error:
+            if error.errno == errno.EINVAL:
+                return None
+            raise
+        try:
+            _preallocate(dst_fd, size)
+            _buf = _buffer(settings['bufferSize'])
+            _view = memoryview(_buf)
+            _copied = 0
+            try:
+                while True:
+                    _read = _read_into(src_fd, _buf)
+                    if not _read:
+                        break
+                    _padded = _read + (-_read % _ALIGNMENT)
+                    _write_all(dst_fd, _view[:_padded])
+                    _copied += _read
+                    if digest:
+                        digest.update(_view[:_read])
+                    if progress:
+                        progress(_read)
+                    if _read % _ALIGNMENT:
+                        break
+            finally:
+                _view.release()
+            os.ftruncate(dst_fd, _copied)
+            # the source may have shrunk since it was opened, but a short read before its end is a failed copy
+            _size = os.fstat(src_fd).st_size
+            if _copied != _size:
+                raise OSError(errno.EIO, 'Read {} of {} bytes'.format(_copied, _size), src)
+        finally:
+            os.close(dst_fd)
+    finally:
+        os.close(src_fd)
+    return _copied
+
+
+def copy_file(src, dst, settings=None, progress=None, digest=None):
+    """
+    Copying a single file to its destination.
+
+    Args:
+        src (str): The source file path.
+        dst (str): The destination file path.
+        settings (dict): The copyFile settings, the defaults are used for any missing.
+        progress (callable): Called with the number of bytes after each write.
+        digest (StreamHash): Updated with the contents as they are copied.
+
+    Returns:
+        int: The number of bytes copied.
+    """
+    settings = dict(_DEFAULT_CONFIG['copyFile'], **(settings or {}))
+    _size = os.path.getsize(src)
+
+    if settings['directIO'] and hasattr(os, 'O_DIRECT') and _size >= settings['directThreshold']:
+        _copied = _copy_direct(src, dst, _size, settings, progress=progress, digest=digest)
+        if _copied is not None:
+            shutil.copystat(src, dst)
+            return _copied
+
+    src_fd = os.open(src, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+    try:
+        _advise(src_fd, 0, 0, getattr(os, 'POSIX_FADV_SEQUENTIAL', 0))
+        dst_fd = _open_destination(dst)
+        try:
+            _preallocate(dst_fd, _size)
+            _copied = _copy_buffered(src_fd, dst_fd, _size, settings, progress=progress, digest=digest)
+            # the file may have shrunk since it was preallocated
+            if _copied != _size:
+                os.ftruncate(dst_fd, _copied)
+            # small files aren't worth a sync each, they barely touch the cache
+            if _copied >= settings['flushWindow']:
+                os.fdatasync(dst_fd) if hasattr(os, 'fdatasync') else os.fsync(dst_fd)
+                _advise(dst_fd, 0, 0, getattr(os, 'POSIX_FADV_DONTNEED', 0))
+                _advise(src_fd, 0, 0, getattr(os, 'POSIX_FADV_DONTNEED', 0))
+        finally:
+            os.close(dst_fd)
+    finally:
+        os.close(src_fd)
+    shutil.copystat(src, dst)
+    return _copied
+
+
+def benchmark(src, folder, settings=None, repeat=3):
+    """
+    Timing the plain copy (shutil.copyfile) against the cache friendly
+    and O_DIRECT copies of the same file.
+
+    Args:
+        src (str): The file to copy.
+        folder (str): The folder the copies are written to, ie. on the output storage.
+        settings (dict): The copyFile settings to benchmark with.
+        repeat (int): How many times each method is run, the best time is kept.
+
+    Returns:
+        dict: Method names mapped to their best time in seconds.
+    """
+    settings = dict(_DEFAULT_CONFIG['copyFile'], **(settings or {}))
+    _methods = {
+        'plain': lambda dst: shutil.copyfile(src, dst),
+        'cache friendly': lambda dst: copy_file(src, dst, dict(settings, directIO=False)),
+    }
+    if hasattr(os, 'O_DIRECT'):
+        _methods['direct'] = lambda dst: copy_file(src, dst, dict(settings, directIO=True, directThreshold=0))
+
+    _results = {}
+    for name, method in _methods.items():
+        _times = []
+        for _run in range(repeat):
+            _handle, dst = tempfile.mkstemp(dir=folder)
+            os.close(_handle)
+            try:
+                _start = time.time()
+                method(dst)
+                _times.append(time.time() - _start)
+            finally:
+                os.remove(dst)
+        _results[name] = min(_times)
+    return _results
+
+
+if __name__ == '__main__':
+    _parser = argparse.ArgumentParser(description='Benchmark the integration copy methods.')
+    _parser.add_argument('src', help='The file to copy.')
+    _parser.add_argument('folder', help='The folder to copy to.')
+    _parser.add_argument('--repeat', type=int, default=3)
+    _args = _parser.parse_args()
+
+    _size = os.path.getsize(_args.src)
+    for (name, seconds) in benchmark(_args.src, _args.folder, repeat=_args.repeat).items():
+        print('{:<16}{:>8.2f}s {:>10.1f} MB/s'.format(name, seconds, _size / seconds / 1024 / 1024 if seconds else 0))
@@ -0,0 +1,339 @@
+################################################################################
+## Client File Manager TOOL - Ingesting client files into a production pipeline
+##  with tracking, logging and configuration overrides.
+##
+## File : delta_transfer.py
+## Description : Updating a destination that already exists from a
+##      re-delivered file, reusing every block that hasn't changed.
+##      Moved blocks are matched rsync style, by a weak checksum confirmed by
+##      a strong hash, and the new file is rebuilt beside the old one and
+##      swapped into place so the destination is never half written.
+##
+## Created by: Kieran Knight
+## Email: kieransknight@gmail.com
+##
+################################################################################
+
+# Python Modules
+import os
+import zlib
+import shutil
+import hashlib
+import tempfile
+
+# Application
+from integrate.copy_files import copy_file
+
+# bytes from the start of each block searched for when a block has moved
+_ANCHOR = 64
+# blocks after the last match that are looked for when data has moved
+_LOOKAHEAD = 4
+# anchor hits checked for each block before it is given up on
+_ATTEMPTS = 8
+# literal data held before it is written
+_LITERAL_LIMIT = 8 * 1024 * 1024
+# blocks written without reusing anything before the file is copied in full instead
+_PROBE_BLOCKS = 64
+
+
+def _strong(data):
+    return hashlib.sha1(data).digest()
+
+
+class BlockSignatures(object):
+    """
+    The blocks of the existing destination.
+
+    Blocks are compared directly where they are expected, which is all a
+    file changed in place or appended to needs. The weak checksum and
+    strong hash of every block are only worked out the first time a block
+    has to be found anywhere in the file, with a single C call per block
+    for each so nothing is looped over byte by byte.
+
+    Args:
+        fd (int): The open existing destination.
+        block_size (int): The block size in bytes.
+    """
+    def __init__(self, fd, block_size):
+        super(BlockSignatures, self).__init__()
+        self._fd = fd
+        self._block_size = block_size
+        self._size = os.fstat(fd).st_size
+        self._count = -(-self._size // block_size)
+        self._anchors = {}
+        self._weak = None
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def block_size(self):
+        return self._block_size
+
+    def length(self, index):
+        return min(self._block_size, self._size - index * self._block_size)
+
+    def read(self, index):
+        return os.pread(self._fd, self.length(index), index * self._block_size)
+
+    def anchor(self, index):
+        if index not in self._anchors:
+            self._anchors[index] = os.pread(self._fd, _ANCHOR, index * self._block_size)
+        return self._anchors[index]
+
+    def matches(self, index, data):
+        return len(data) == self.length(index) and self.read(index) == data
+
+    def _build(self):
+        self._weak = {}
+        for index in range(self._count):
+            _block = self.read(index)
+            self._weak.setdefault(zlib.adler32(_block), {}).setdefault(_strong(_block), index)
+
+    def find(self, data):
+        """
+        Finding a block with the same contents anywhere in the destination.
+
+        Args:
+            data (bytes): The block of the new file.
+
+        Returns:
+            int: The index of the matching block, or None.
+        """
+        if self._weak is None:
+            self._build()
+        _strong_hashes = self._weak.get(zlib.adler32(data))
+        if not _strong_hashes:
+            return None
+        return _strong_hashes.get(_strong(data))
+
+
+def _search(window, start, end, signatures, candidates):
+    """
+    Searching part of the new file for blocks that have moved, ie. after
+    data was inserted or removed. The start of each candidate block is found
+    with bytes.find and only those offsets are checked in full.
+
+    Returns:
+        tuple: (offset, block index) of the earliest match, or None.
+    """
+    _best = None
+    for index in candidates:
+        _anchor = signatures.anchor(index)
+        _length = signatures.length(index)
+        _offset = start
+        for _attempt in range(_ATTEMPTS):
+            _offset = window.find(_anchor, _offset, min(end, len(window) - _length) + len(_anchor))
+            if _offset < 0 or (_best is not None and _offset >= _best[0]):
+                break
+            if signatures.matches(index, window[_offset:_offset + _length]):
+                _best = (_offset, index)
+                break
+            _offset += 1
+    return _best
+
+
+def delta_instructions(src, signatures, progress=None, digest=None):
+    """
+    Working out how to build the new file from the existing destination.
+
+    Each block of the new file is first compared with the block after the
+    last match. Where it doesn't match, the few blocks that follow are
+    searched for in the next two blocks of the new file, which finds blocks
+    moved by an insert or removal, and then the block is looked up by its
+    checksum in case it has moved anywhere else. Anything else is sent as
+    literal data.
+
+    Args:
+        src (str): The new file.
+        signatures (BlockSignatures): The blocks of the existing destination.
+        progress (callable): Called with the number of bytes of the new file read.
+        digest (StreamHash): Updated with the contents of the new file as it is read.
+
+    Yields:
+        tuple: ('copy', offset, length) to reuse a range of the destination,
+            or ('data', bytes) to write new data.
+    """
+    _block_size = signatures.block_size
+    _read_size = _block_size * 32
+    _expected = 0
+    _literal = []
+    _literal_size = 0
+    _window = b''
+    _position = 0
+    _eof = False
+    with open(src, 'rb') as handle:
+        while True:
+            if not _eof and len(_window) - _position < _block_size * 3:
+                _chunk = handle.read(_read_size)
+                _eof = not _chunk
+                if digest:
+                    digest.update(_chunk)
+                _window = _window[_position:] + _chunk
+                _position = 0
+            if _position >= len(_window):
+                break
+
+            _block = _window[_position:_position + _block_size]
+            _index = None
+            _offset = _position
+            if _expected < len(signatures) and signatures.matches(_expected, _block):
+                _index = _expected
+            else:
+                _candidates = range(_expected, min(_expected + _LOOKAHEAD, len(signatures)))
+                _found = _search(_window, _position, _position + _block_size * 2, signatures, _candidates)
+                if _found is not None:
+                    _offset, _index = _found
+                elif len(_block) == _block_size and _expected < len(signatures):
+                    # data past the end of the destination, or a short last block, is new
+                    _index = signatures.find(_block)
+
+            if _index is None:
+                _literal.append(_block)
+                _literal_size += len(_block)
+                _position += len(_block)
+                if progress:
+                    progress(len(_block))
+                if _literal_size >= _LITERAL_LIMIT:
+                    yield ('data', b''.join(_literal))
+                    _literal = []
+                    _literal_size = 0
+                continue
+
+            if _offset > _position:
+                _literal.append(_window[_position:_offset])
+            if _literal:
+                yield ('data', b''.join(_literal))
+                _literal = []
+                _literal_size = 0
+            _length = signatures.length(_index)
+            yield ('copy', _index * _block_size, _length)
+            if progress:
+                progress(_offset + _length - _position)
+            _position = _offset + _length
+            _expected = _index + 1
+    if _literal:
+        yield ('data', b''.join(_literal))
+
+
+def _copy_range(src_fd, dst_fd, offset, length):
+    """
+    Copying a range of the existing destination into the new file.
+    copy_file_range lets the filesystem share the blocks or copy them
+    on the server where it can, ie. reflinks on XFS and btrfs and server
+    side copies on NFS 4.2, rather than passing them through the tool.
+    """
+    if hasattr(os, 'copy_file_range'):
+        try:
+            while length:
+                _copied = os.copy_file_range(src_fd, dst_fd, length, offset)
+                if not _copied:
+                    break
+                offset += _copied
+                length -= _copied
+            if not length:
+                return
+        except OSError:
+            pass
+    while length:
+        _data = os.pread(src_fd, min(length, 8 * 1024 * 1024), offset)
+        if not _data:
+            raise OSError('{} bytes missing from the existing destination'.format(length))
+        _view = memoryview(_data)
+        while _view:
+            _view = _view[os.write(dst_fd, _view):]
+        offset += len(_data)
+        length -= len(_data)
+
+
+def _resumed(progress, reported):
+    """
+    Wrapping a progress callback so the bytes it has already been given
+    aren't counted again when the file is copied from the start.
+    """
+    if not progress:
+        return None
+    _skip = [reported]
+
+    def _progress(count):
+        _new = max(0, count - _skip[0])
+        _skip[0] = max(0, _skip[0] - count)
+        if _new:
+            progress(_new)
+    return _progress
+
+
+def delta_copy(src, dst, block_size=128 * 1024, progress=None, settings=None, digest=None):
+    """
+    Updating an existing destination from a new version of the file.
+    The new file is written beside the destination and renamed over it once
+    complete, so readers only ever see the old file or the new one.
+    When nothing has been reused after the first blocks the file has been
+    replaced rather than updated, and the rest is copied normally.
+
+    Args:
+        src (str): The new file.
+        dst (str): The existing destination.
+        block_size (int): The block size in bytes.
+        progress (callable): Called with the number of bytes after each block.
+        settings (dict): The copyFile settings used if the file is copied in full.
+        digest (StreamHash): Updated with the contents of the new file.
+
+    Returns:
+        tuple: (bytes written from the new file, bytes reused from the destination).
+    """
+    _handle, _temporary = tempfile.mkstemp(
+        dir=os.path.dirname(dst), prefix='.{}.'.format(os.path.basename(dst)), suffix='.delta')
+    _written = 0
+    _reused = 0
+    _probe = block_size * _PROBE_BLOCKS
+    try:
+        _old_fd = os.open(dst, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+        try:
+            _signatures = BlockSignatures(_old_fd, block_size)
+            # neighbouring blocks are copied as one range
+            _pending = None
+            for instruction in delta_instructions(src, _signatures, progress=progress, digest=digest):
+                if instruction[0] == 'copy':
+                    _reused += instruction[2]
+                    if _pending and _pending[0] + _pending[1] == instruction[1]:
+                        _pending[1] += instruction[2]
+                        continue
+                    if _pending:
+                        _copy_range(_old_fd, _handle, *_pending)
+                    _pending = [instruction[1], instruction[2]]
+                    continue
+                if _pending:
+                    _copy_range(_old_fd, _handle, *_pending)
+                    _pending = None
+                _view = memoryview(instruction[1])
+                while _view:
+                    _view = _view[os.write(_handle, _view):]
+                _written += len(instruction[1])
+                if not _reused and _written >= _probe:
+                    break
+            if _pending:
+                _copy_range(_old_fd, _handle, *_pending)
+        finally:
+            os.close(_old_fd)
+        _replaced = not _reused and _written >= _probe
+        if not _replaced:
+            os.fsync(_handle)
+        os.close(_handle)
+        _handle = None
+        if _replaced:
+            # the new file is read again from the start
+            if digest:
+                digest.reset()
+            _written = copy_file(
+                src, _temporary, settings=settings, progress=_resumed(progress, _written), digest=digest)
+        else:
+            shutil.copystat(src, _temporary)
+        os.replace(_temporary, dst)
+    except BaseException:
+        if _handle is not None:
+            os.close(_handle)
+        if os.path.exists(_temporary):
+            os.remove(_temporary)
+        raise
+    return _written, _reused
@@ -0,0 +1,97 @@
+################################################################################
+## Client File Manager TOOL - Ingesting client files into a production pipeline
+##  with tracking, logging and configuration overrides.
+##
+## File : destination_planner.py
+## Description : Planning the destination folders of an integration run.
+##      Every {output}/{sequence}/{shot}/{option} folder is created once, up
+##      front, rather than being checked for every file that is copied.
+##
+## Created by: Kieran Knight
+## Email: kieransknight@gmail.com
+##
+################################################################################
+
+# Python Modules
+import os
+
+
+class DestinationPlanner(object):
+    """
+    Collecting the unique destination folders of a run and creating them
+    in a single pass before any file is copied.
+
+    Folders are created parents first and every folder that is known to exist
+    is cached, so each folder costs a single mkdir on the storage rather than
+    an exists check and makedirs walk per file. Folders are kept as absolute
+    paths, so a relative output location is walked up to its root too.
+    """
+    def __init__(self):
+        super(DestinationPlanner, self).__init__()
+        self._folders = set()
+        self._known = set()
+        self._created = 0
+
+    @property
+    def folders(self):
+        return self._folders
+
+    @property
+    def created(self):
+        """
+        The number of planned folders that were created, parents created
+        along the way aren't counted.
+        """
+        return self._created
+
+    @staticmethod
+    def folder_of(dst):
+        """
+        Getting the planned folder of a destination file, as it is keyed
+        in the failures returned by create.
+
+        Args:
+            dst (str): The destination file path.
+        """
+        return os.path.dirname(os.path.abspath(dst))
+
+    def add(self, dst):
+        """
+        Adding the folder of a destination file to the plan.
+
+        Args:
+            dst (str): The destination file path.
+        """
+        self._folders.add(self.folder_of(dst))
+
+    def _make_folder(self, folder):
+        if folder in self._known:
+            return
+        _parent = os.path.dirname(folder)
+        if _parent != folder and _parent not in self._known:
+            self._make_folder(_parent)
+        try:
+            os.mkdir(folder)
+            if folder in self._folders:
+                self._created += 1
+        except OSError:
+            # existing folders, drive roots and mount points all land here
+            if not os.path.isdir(folder):
+                raise
+        self._known.add(folder)
+
+    def create(self):
+        """
+        Creating every planned folder that doesn't exist yet.
+
+        Returns:
+            dict: Folders mapped to the error raised, empty if all were created.
+        """
+        _failed = {}
+        # sorted so parents are always reached before their children
+        for folder in sorted(self._folders):
+            try:
+                self._make_folder(folder)
+            except OSError as error:
+                _failed[folder] = error
+        return _failed
@@ -13,34 +13,112 @@
 # Python Modules
 import os
 import sys
-import subprocess
+import queue
+import sqlite3
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+# Application
+from utils import _DEFAULT_CONFIG, format_size, hash_file, StreamHash
+from logger.integration_catalog import IntegrationCatalog
+from logger.disk_usage import DiskUsage
+from integrate.io_scheduler import IOScheduler
+from integrate.destination_planner import DestinationPlanner
+from integrate.conflict_resolver import ConflictResolver
+from integrate.staged_publish import StagedPublish, clean_stale
+from integrate.retry_policy import RetryPolicy
+from integrate.auto_tuner import ConcurrencyTuner, read_tuned_workers, write_tuned_workers
+from integrate.archive_files import is_zip, close_zip_handles
+from integrate.copy_files import copy_file
+from integrate.integrate_progress import IntegrateProgress
+from integrate.service_client import ServiceProgress, entry_to_dict
+from integrate.integrate_jobs import IntegrateEntry, CopyJob, DeltaCopyJob, ZipMemberJob, TarArchiveJob
 
 class IntegrateFiles(object):
     """
     Main class that integrates the files from the input location
     to the desired location on disk
+
+    The files are read from the tree widgets, or can be passed in as entries
+    to integrate without the UI. When a service client is passed, the files
+    are handed to the integration service rather than copied here.
     """
+    _LOG_INTERVAL = 10.0
+    _FOLLOW_INTERVAL = 0.1
     def __init__(
         self, root, children, 
-        ui_main=None, app_logging=False, save_logging=False
+        ui_main=None, app_logging=False, save_logging=False, configuration=None, entries=None,
+        service=None, priority=0
         ):
         super(IntegrateFiles, self).__init__()
 
         self._complete = []
         self._ignored = []
         self._failed = []
+        self._jobs = []
+        self._tar_jobs = {}
+        self._headers = []
+        self._links = []
+        self._integrated = {}
+        self._replaced = {}
+        self._submitted = []
+        self._errors = {}
+        self._progress = IntegrateProgress()
+        self._last_log = 0
 
         self._root = root
         self._child_count = children
         self._ui_main = ui_main
         self._app_logging = app_logging
         self._save_logging = save_logging
+        self._configuration = configuration
+        self._service = service
+        self._priority = priority
+        self._io_settings = configuration.io_scheduler if configuration else _DEFAULT_CONFIG['ioScheduler']
+        self._priority_shots = set(self._io_settings['priorityShots'])
+        self._copy_settings = configuration.copy_file if configuration else _DEFAULT_CONFIG['copyFile']
+        self._duplicate_action = (configuration.duplicates if configuration else _DEFAULT_CONFIG['duplicates'])['action']
+        self._delta_settings = configuration.delta_transfer if configuration else _DEFAULT_CONFIG['deltaTransfer']
+        self._resolver = ConflictResolver(configuration.conflicts if configuration else _DEFAULT_CONFIG['conflicts'])
+        self._staged_settings = configuration.staged_publish if configuration else _DEFAULT_CONFIG['stagedPublish']
+        self._staging = StagedPublish() if self._staged_settings['enabled'] else None
+        self._retry = RetryPolicy.from_configuration(
+            configuration.retries if configuration else _DEFAULT_CONFIG['retries'])
 
-        self.check_all_integration()
+        if entries is None:
+            self.check_all_integration()
+        else:
+            [self.add_entry(entry) for entry in entries]
+        if self._service:
+            self._run_service()
+        else:
+            self._run_jobs()
         if self._save_logging:
             self._save_logging.completed_files(self._complete)
             self._save_logging.failed_files(self._failed)
             self._save_logging.ignored_files(self._ignored)
+            self._save_logging.info(self._progress.summary())
+            self._close_log()
+
+    @property
+    def progress(self):
+        return self._progress
+
+    @property
+    def headers(self):
+        return self._headers
+
+    @property
+    def complete(self):
+        return self._complete
+
+    @property
+    def failed(self):
+        return self._failed
+
+    @property
+    def ignored(self):
+        return self._ignored
 
     def check_all_integration(self):
         """
@@ -48,97 +126,614 @@ class IntegrateFiles(object):
         to make sure the files are renderable and processed 
         correctly.
 
-        Directly goes to the copy method to copy individual files
+        Every item that passes the checks is turned into a job straight away
         rather than looping through items twice. This saves
         querying the widgets for a second time.
         """
         for child in range(self._child_count):
-            _item = self._root.child(child)
-            _sub_item = _item.childCount()
-            if _item.option.currentText() == 'Ignore':
-                _msg = '{} is set to ignore - will not be integrating'.format(
-                    _item.item_contents.file_path
-                )
-                self._app_logging.info(_msg)
-                self._ignored.append(_item)
-                continue
-            if not _sub_item:
+            self._check_item(self._root.child(child))
+
+    def _check_item(self, _item, header=None):
+        """
+        Checking a single tree item and every item below it.
+        Lazy folders that were never expanded are listed here, their files
+        take their values from the folder widgets.
+
+        Args:
+            _item (CustomTreeItem): The tree item.
+            header (CustomTreeItem): The header item it is under, if any.
+        """
+        if _item.option.currentText() == 'Ignore':
+            _msg = '{} is set to ignore - will not be integrating'.format(
+                _item.item_contents.file_path
+            )
+            self._app_logging.info(_msg)
+            self._ignored.append(IntegrateEntry.from_item(_item, header=header))
+            return
+        if _item.is_lazy and not _item.populated:
+            self._headers.append(_item)
+            [self.add_entry(IntegrateEntry.from_folder(_item, contents)) for contents in _item.list_files()]
+            return
+        if not _item.childCount() and not _item.is_lazy:
+            if header is None:
                 _msg = '{} - Checking widget is set correctly'.format(_item.item_contents.file_path)
                 self._app_logging.info(_msg)
-                _paths = self.check_paths(_item)
-                if not _paths:
-                    self._failed.append(_item)
-                    continue
-                self._run(_item)
-                self._complete.append(_item)
-            for sub in range(_sub_item):
-                _sub_widget = _item.child(sub)
-                if _sub_widget.option.currentText() == 'Ignore':
-                    _msg = '{} is set to ignore - will not be integrating'.format(
-                        _sub_widget.item_contents.file_path
-                    )
-                    self._app_logging.info(_msg)
-                    self._ignored.append(_sub_widget)
-                    continue
-                _sub_paths = self.check_paths(_sub_widget)
-                if not _sub_paths:
-                    self._failed.append(_sub_widget)
-                    continue
-                self._run(_sub_widget)
-                self._complete.append(_sub_widget)
-                if not self._failed:
-                    self.update_all_widgets(_item)
-
-    def check_paths(self, item):
-        """
-        Checking the path of the passed item to make sure
-        it has been setup correctly.p
+            self.add_entry(IntegrateEntry.from_item(_item, header=header))
+            return
+        self._headers.append(_item)
+        for sub in range(_item.childCount()):
+            self._check_item(_item.child(sub), header=_item)
+
+    def add_entry(self, entry):
+        """
+        Checking a single entry and building its job.
+
+        Args:
+            entry (IntegrateEntry): The file to integrate.
+        """
+        if entry.option == 'Ignore':
+            self._app_logging.info('{} is set to ignore - will not be integrating'.format(
+                entry.contents.file_path))
+            self._ignored.append(entry)
+            return
+        if not self.check_paths(entry):
+            self._failed.append(entry)
+            return
+        if self._service:
+            # duplicates and conflicts are handled by the service with its own configuration
+            self._submitted.append(entry)
+            return
+        _dst = self._resolver.resolve(entry)
+        if _dst is None:
+            _rival = self._resolver.rival(entry)
+            if _rival:
+                self._app_logging.warning('{} - conflicts with {} writing {}, only {} is written'.format(
+                    entry.src, _rival.src, _rival.dst, _rival.src))
+            else:
+                self._app_logging.info('{} already exists - will not be integrating'.format(entry.dst))
+            self._ignored.append(entry)
+            return
+        entry.dst = _dst
+        if entry.contents.duplicate_of and self._duplicate_action == 'skip':
+            self._app_logging.info('{} is a duplicate of {} - will not be integrating'.format(
+                entry.contents.file_path, entry.contents.duplicate_of.file_path))
+            self._ignored.append(entry)
+            return
+        if entry.contents.duplicate_of and self._duplicate_action == 'hardlink':
+            # linked once every other file is copied, so the original is in place
+            self._links.append(entry)
+            self._replaced[entry.dst] = self._replaced_size(entry.dst)
+            self._progress.add(entry.dst, 0, group=entry.header)
+            return
+        self._integrate(entry)
+
+    def check_paths(self, entry):
+        """
+        Checking the path of the passed entry to make sure
+        it has been setup correctly.
 
         Args:
-            item ([type]): [description]
+            entry (IntegrateEntry): The file to integrate.
 
         Returns:
-            [type]: [description]
+            bool: True if the entry has been setup correctly.
         """
-        if not item.sequence.currentText() and not item.shot.currentText() and not item.location.currentText():
+        if not entry.sequence and not entry.shot and not entry.location:
             self._app_logging.error('Sequence, Shot and Location are required to Integrate client files correctly.\' \
                 nPlease make sure these are filled out correctly')
             return False
         return True
 
-    def _run(self, c_file):
+    def _integrate(self, entry):
         """
-        The main copying function to take the files from the client location
-        to the desired output location.
+        Building the job for a single entry. Zip members are independent so
+        each gets its own job, tar members are grouped so each tar is only
+        read once.
 
         Args:
-            c_file (CustomTreeWidget Obj): The custom tree widget object displayed in the UI.
+            entry (IntegrateEntry): The file to integrate.
         """
-        self._app_logging.info('Starting Copy for Item - {}'.format(c_file.item_contents.file_path))
-        _output = c_file.location.currentText()
-        _sequence = c_file.sequence.currentText()
-        _shot = c_file.shot.currentText()
-        _output_seq_shot = os.path.join(_output, _sequence, _shot)
-        if not os.path.exists(_output_seq_shot):
-            self._app_logging.error('Folder does not exist - Creating required folder')
-            os.makedirs(_output_seq_shot)
-        
-        # copying the files through subprocess
-        src = os.path.join(c_file.item_contents.folder, c_file.filename.text())
-        dst = os.path.join(_output_seq_shot, c_file.option.currentText(), c_file.filename.text())
-        _cmd = 'cmd /c echo F | xcopy /R /Y /K "{src}" "{dst}"'.format(src=src, dst=dst)
-        integrate = subprocess.Popen(_cmd, shell=True, stdout=subprocess.PIPE)
-        integrate_str = integrate.communicate()[0].strip()
-        if not os.path.exists(dst):
-            self._failed.append(c_file)
-            self._app_logging.error('Failed to copy file {}'.format(dst))
-            [
-            wdg.setStyleSheet('background-color: red; border: 1.5px solid #32414B') 
-            for wdg in c_file.items
-            ]
+        _contents = entry.contents
+        _priority = 1 if entry.shot in self._priority_shots else 0
+        self._replaced[entry.dst] = self._replaced_size(entry.dst)
+
+        if _contents.is_archive_member and not is_zip(_contents.archive):
+            if _contents.archive not in self._tar_jobs:
+                self._tar_jobs[_contents.archive] = TarArchiveJob(_contents.archive, 0, _priority)
+                self._jobs.append(self._tar_jobs[_contents.archive])
+            self._tar_jobs[_contents.archive].add_target(entry)
+            _size = _contents.file_size
+        elif _contents.is_archive_member:
+            _size = _contents.file_size
+            job = ZipMemberJob(entry.src, _size, _priority)
+            job.add_target(entry)
+            self._jobs.append(job)
+        else:
+            try:
+                _size = os.path.getsize(entry.src)
+            except OSError:
+                _size = 0
+            # a staged file is written from scratch, so there is nothing to update in place
+            if self._delta_settings['enabled'] and _size >= self._delta_settings['minSize'] \
+                    and self._replaced[entry.dst] is not None and not self._staging:
+                # a re-delivered file, only the changed blocks are written
+                job = DeltaCopyJob(
+                    entry.src, _size, _priority,
+                    settings=self._copy_settings, block_size=self._delta_settings['blockSize'])
+            else:
+                job = CopyJob(entry.src, _size, _priority, settings=self._copy_settings)
+            job.add_target(entry)
+            self._jobs.append(job)
+        self._progress.add(entry.dst, _size, group=entry.header)
+
+    def _replaced_size(self, dst):
+        """
+        Getting the size of a file about to be overwritten. Only files the
+        resolver found in its listings are looked at on the storage.
+
+        Returns:
+            int: The size in bytes, or None if there is nothing there yet.
+        """
+        return self._existing_size(dst) if self._resolver.replaces(dst) else None
+
+    @staticmethod
+    def _existing_size(dst):
+        """
+        Getting the size of a file about to be overwritten, so the disk usage
+        only counts the difference.
+
+        Returns:
+            int: The size in bytes, or None if there is nothing there yet.
+        """
+        try:
+            return os.path.getsize(dst)
+        except OSError:
+            return None
+
+    def _run_jobs(self):
+        """
+        Handing every job to the per-device scheduler and waiting for
+        them to finish. Header items are coloured once all of their
+        children have been integrated.
+        """
+        _tuner = self._build_tuner()
+        _destination = self._configuration.output_location if _tuner else None
+        scheduler = IOScheduler.from_configuration(
+            self._io_settings, logger=self._app_logging, tuner=_tuner, tune_destination=_destination,
+            retry=self._retry)
+        _hashing = self._hashing()
+        for job in self._claim_destinations(self.plan_destinations()):
+            job.progress = self._progress.advance
+            job.hashing = _hashing
+            scheduler.submit(job)
+        self._progress.start()
+        try:
+            scheduler.run(on_complete=self._job_complete, on_tick=self._update_progress, on_retry=self._job_retry)
+        finally:
+            close_zip_handles()
+        self._report_failing(scheduler)
+        self._run_links()
+        if self._staging:
+            self._publish()
+        self._record_catalog()
+        self._record_usage()
+        if _tuner:
+            write_tuned_workers(_destination, _tuner.workers)
+        self._app_logging.info(self._progress.summary())
+
+        _failed_headers = {id(entry.header) for entry in self._failed}
+        [self.update_all_widgets(_item) for _item in self._headers if id(_item) not in _failed_headers]
+
+    def plan_destinations(self):
+        """
+        Creating every destination folder of the run in one pass before
+        anything is copied. Jobs writing to a folder that couldn't be
+        created are failed straight away. A staged run creates its folders
+        in the staging folder instead.
+
+        Returns:
+            list: The jobs that are ready to run.
+        """
+        if self._staging:
+            self._stage_entries()
+        planner = DestinationPlanner()
+        [planner.add(entry.write_path) for job in self._jobs for entry in job.targets]
+        [planner.add(entry.write_path) for entry in self._links]
+        _failed = planner.create()
+        self._app_logging.info('Created {} of {} destination folders'.format(
+            planner.created, len(planner.folders)))
+
+        _ready = []
+        for job in self._jobs:
+            _failures = {
+                entry.dst: _failed[planner.folder_of(entry.write_path)]
+                for entry in job.targets if planner.folder_of(entry.write_path) in _failed
+            }
+            if _failures:
+                self._job_complete(job, _failures)
+                continue
+            _ready.append(job)
+        return _ready
+
+    def _claim_destinations(self, jobs):
+        """
+        Making sure every destination is written by a single job. Two jobs
+        writing the same file on different workers would each truncate it and
+        leave a mix of both. The conflict resolver already gives each
+        destination to a single entry, so this only guards entries that reach
+        a job some other way. The entry added last writes a destination, as it
+        would have overwritten the others, and is the one its progress was
+        planned for. The others, ie. a duplicate link, are failed as conflicts.
+
+        Args:
+            jobs (list): The jobs that are ready to run.
+
+        Returns:
+            list: The jobs that still have an entry to write.
+        """
+        _key = lambda entry: os.path.normcase(os.path.abspath(entry.write_path))
+        _claims = {_key(entry): entry for job in jobs for entry in job.targets}
+        _claims.update({_key(entry): entry for entry in self._links})
+
+        def _claimed(entry):
+            _winner = _claims[_key(entry)]
+            if _winner is entry:
+                return False
+            self._app_logging.error('{} - conflicts with {} writing the same destination, only {} is written'.format(
+                entry.src, _winner.src, _winner.src))
+            self._failed_copy(entry)
+            return True
+
+        _ready = []
+        for job in jobs:
+            [job.remove_target(entry) for entry in list(job.targets) if _claimed(entry)]
+            if job.targets:
+                _ready.append(job)
+        self._links = [entry for entry in self._links if not _claimed(entry)]
+        return _ready
+
+    def _job_retry(self, job, failures, attempt, delay):
+        """
+        Logging a job that failed with transient errors and starting its
+        progress again, as it will be written from the start.
+
+        Args:
+            job (BaseIntegrateJob): The failed job.
+            failures (dict): Destination paths mapped to the error raised.
+            attempt (int): The attempt that failed.
+            delay (float): Seconds until the job is run again.
+        """
+        self._app_logging.warning('{} - {}, retrying in {:.1f}s (attempt {} of {})'.format(
+            job.src, next(iter(failures.values())), delay, attempt + 1, self._retry.attempts))
+        [self._progress.restart(entry.dst) for entry in job.targets]
+
+    def _report_failing(self, scheduler):
+        """
+        Listing every file still failing once the jobs have finished, with
+        the error it last failed with and how often it was run, in the
+        application log and the integration log.
+
+        Args:
+            scheduler (IOScheduler): The scheduler the jobs ran on.
+        """
+        if scheduler.retried:
+            self._app_logging.info('Retried {} jobs after transient errors'.format(scheduler.retried))
+        _failing = [
+            '{} - {} ({} attempts)'.format(dst, error, scheduler.attempts(job))
+            for dst, (job, error) in self._errors.items()
+        ]
+        if not _failing:
+            return
+        _report = '{} files still failing:\n{}'.format(len(_failing), '\n'.join(_failing))
+        self._app_logging.error(_report)
+        if self._save_logging:
+            self._save_logging.info(_report)
+
+    def _stage_entries(self):
+        """
+        Giving every entry of the run its staging path, once the staging
+        folders left behind by stopped runs have been removed.
+        """
+        _entries = [entry for job in self._jobs for entry in job.targets] + self._links
+        for location in {str(entry.location) for entry in _entries}:
+            _removed = clean_stale(location, self._staged_settings['staleHours'])
+            if _removed:
+                self._app_logging.info('Removed {} stale staging folders from {}'.format(_removed, location))
+        [self._staging.stage(entry) for entry in _entries]
+        self._app_logging.info('Staging run {} of {} files'.format(self._staging.run_id, len(_entries)))
+
+    def _publish(self):
+        """
+        Publishing a staged run once every file has been written and
+        verified, or rolling the whole run back if any file failed. Files
+        that were written are failed with the run, so nothing is reported as
+        integrated that isn't in the live folders.
+        """
+        _problems = self._staging.verify(self._complete)
+        _staged = [entry for entry in self._complete if entry.dst not in _problems]
+        for entry in self._complete:
+            if entry.dst in _problems:
+                self._app_logging.error('{} - {}'.format(entry.src, _problems[entry.dst]))
+                self._failed_copy(entry)
+        self._complete = []
+        self._integrated = {}
+
+        if self._failed:
+            self._staging.rollback()
+            self._app_logging.error('{} of {} files failed, rolled back staged run {} - nothing was published'.format(
+                len(self._failed), len(self._failed) + len(_staged), self._staging.run_id))
+            [self._failed_copy(entry) for entry in _staged]
+            return
+        try:
+            self._staging.publish()
+        except OSError as error:
+            self._app_logging.error('Failed to publish staged run {}, the files left are kept in {} - {}'.format(
+                self._staging.run_id, ', '.join(self._staging.roots.values()), error))
+        for entry in _staged:
+            # a file that couldn't be moved is still at its staging path
+            if os.path.lexists(entry.write_path):
+                self._failed_copy(entry)
+                continue
+            self._complete.append(entry)
+            if entry.item:
+                self.update_all_widgets(entry.item)
+        self._app_logging.info('Published {} files from staged run {}'.format(
+            len(self._complete), self._staging.run_id))
+
+    def _build_tuner(self):
+        """
+        Building the worker count tuner for the output location,
+        starting from the count learned on the last run to that location.
+
+        Returns:
+            ConcurrencyTuner: The tuner, or None if auto tuning is turned off.
+        """
+        if not self._configuration or not self._configuration.auto_tune['enabled']:
+            return None
+        _settings = self._configuration.auto_tune
+        _workers = read_tuned_workers(self._configuration.output_location, self._io_settings['defaultLimit'])
+        return ConcurrencyTuner(
+            _workers,
+            minimum=_settings['minWorkers'],
+            maximum=_settings['maxWorkers'],
+            interval=_settings['interval']
+        )
+
+    def _run_links(self):
+        """
+        Hardlinking duplicate files to the integrated copy of their original.
+        Falls back to copying when the original wasn't integrated or the
+        link can't be made, ie. across devices.
+        """
+        for entry in self._links:
+            _original = self._integrated.get(id(entry.contents.duplicate_of))
+            try:
+                if os.path.lexists(entry.write_path):
+                    os.remove(entry.write_path)
+                try:
+                    if _original is None:
+                        raise OSError('{} was not integrated'.format(entry.contents.duplicate_of.file_path))
+                    os.link(_original.write_path, entry.write_path)
+                    entry.contents.file_hash = entry.contents.file_hash or _original.contents.file_hash
+                    self._app_logging.info('successfully Linked: {0} to {1}'.format(entry.dst, _original.dst))
+                except OSError:
+                    _digest = StreamHash() if self._hashing() else None
+                    copy_file(entry.src, entry.write_path, settings=self._copy_settings, digest=_digest)
+                    entry.contents.file_hash = _digest.hexdigest() if _digest else entry.contents.file_hash
+                    self._app_logging.info('successfully Copied: {0} from {1}'.format(entry.src, entry.dst))
+            except OSError as error:
+                self._app_logging.error('{} - {}'.format(entry.src, error))
+                self._failed_copy(entry)
+                continue
+            self._complete.append(entry)
+            # a staged file is only integrated once it has been published
+            if entry.item and not self._staging:
+                self.update_all_widgets(entry.item)
+
+    def _hashing(self):
+        """
+        Files are hashed while they are written whenever the catalog records
+        them, so the scrub can verify them later.
+        """
+        return bool(self._configuration and self._configuration.catalog['enabled'])
+
+    def _record_catalog(self):
+        """
+        Recording every integrated file in the catalog.
+        Files are hashed while they are written, so they are only read again
+        here if turned on in the configuration and the hash still isn't known.
+        """
+        if not self._configuration or not self._configuration.catalog['enabled'] or not self._complete:
             return
-        self._app_logging.info('successfully Copied: {0} from {1}'.format(src, dst))
-        self.update_all_widgets(c_file)
+        _settings = self._configuration.catalog
+        if _settings['hashFiles']:
+            _unhashed = [entry for entry in self._complete if not entry.contents.file_hash]
+            try:
+                with ProcessPoolExecutor() as executor:
+                    # the integrated copy is hashed, archive members have no source file of their own
+                    _hashes = executor.map(hash_file, [entry.dst for entry in _unhashed])
+                    for entry, file_hash in zip(_unhashed, _hashes):
+                        entry.contents.file_hash = file_hash
+            except OSError as error:
+                self._app_logging.warning('Failed to hash integrated files - {}'.format(error))
+        try:
+            with IntegrationCatalog(_settings['location'], batch_size=_settings['batchSize']) as catalog:
+                for entry in self._complete:
+                    catalog.add(entry, delivery_id=entry.contents.delivery, file_hash=entry.contents.file_hash)
+                self._app_logging.info('Recorded {} files in the catalog, run {}'.format(
+                    len(self._complete), catalog.run_id))
+        except sqlite3.Error as error:
+            self._app_logging.error('Failed to record the catalog - {}'.format(error))
+
+    def _close_log(self):
+        """
+        Closing the integration log, which indexes it and rotates the older logs.
+        """
+        try:
+            _compressed, _removed = self._save_logging.close()
+        except (OSError, sqlite3.Error) as error:
+            self._app_logging.warning('Failed to index the integration log - {}'.format(error))
+            return
+        if _compressed or _removed:
+            self._app_logging.info('Compressed {} and removed {} old integration logs'.format(_compressed, _removed))
+
+    def _record_usage(self):
+        """
+        Adding the bytes and files written to the disk usage of each
+        sequence, shot and option, so it never has to be crawled to be known.
+        """
+        if not self._configuration or not self._configuration.disk_usage_settings['enabled'] or not self._complete:
+            return
+        _changes = {}
+        for entry in self._complete:
+            _size = self._existing_size(entry.dst)
+            if _size is None:
+                continue
+            _previous = self._replaced.get(entry.dst)
+            _change = _changes.setdefault(str(entry.location), {}).setdefault(
+                (entry.sequence, entry.shot, entry.option), [0, 0])
+            _change[0] += _size - (_previous or 0)
+            _change[1] += 0 if _previous is not None else 1
+        try:
+            with DiskUsage(self._configuration.catalog['location']) as usage:
+                [usage.add(location, changes) for location, changes in _changes.items()]
+        except sqlite3.Error as error:
+            self._app_logging.error('Failed to record the disk usage - {}'.format(error))
+
+    def _run_service(self):
+        """
+        Submitting every entry to the integration service as a single plan
+        and following its progress until it has finished. The widgets are
+        updated from the result the same way as a local integration.
+        """
+        _groups = {index: header for index, header in enumerate(self._headers)}
+        _group_of = {id(header): index for index, header in _groups.items()}
+        _index_of = {id(entry.contents): index for index, entry in enumerate(self._submitted)}
+        _plan = [
+            entry_to_dict(
+                entry,
+                group=_group_of.get(id(entry.header)),
+                duplicate_of=_index_of.get(id(entry.contents.duplicate_of))
+            )
+            for entry in self._submitted
+        ]
+        self._progress = ServiceProgress(_groups)
+        if not _plan:
+            return
+        _plan_id = self._service.submit(_plan, priority=self._priority)
+        self._app_logging.info('Submitted {} files to the integration service as plan {}'.format(
+            len(_plan), _plan_id))
+        self._follow_plan(_plan_id)
+
+        _result = self._service.plan(_plan_id)['result'] or {}
+        if 'error' in _result:
+            self._app_logging.error('Plan {} failed - {}'.format(_plan_id, _result['error']))
+        _complete = set(_result.get('complete', []))
+        _ignored = set(_result.get('ignored', []))
+        _resolved = _result.get('resolved', {})
+        for entry in self._submitted:
+            if entry.dst in _resolved:
+                entry.dst = _resolved[entry.dst]
+            if entry.dst in _complete:
+                self._complete.append(entry)
+                if entry.item:
+                    self.update_all_widgets(entry.item)
+            elif entry.dst in _ignored:
+                self._ignored.append(entry)
+            else:
+                self._failed_copy(entry)
+        self._app_logging.info(self._progress.summary())
+        _failed_headers = {id(entry.header) for entry in self._failed}
+        [self.update_all_widgets(_item) for _item in self._headers if id(_item) not in _failed_headers]
+
+    def _follow_plan(self, plan_id):
+        """
+        Following the progress of a plan on its own thread, as the stream
+        waits on the service between events. This thread keeps updating the
+        UI the same way it does while the scheduler runs the jobs locally.
+
+        Args:
+            plan_id (int): The plan submitted to the service.
+
+        Raises:
+            Exception: Whatever following the plan failed with.
+        """
+        _events = queue.Queue()
+
+        def _follow():
+            try:
+                [_events.put(event) for event in self._service.follow(plan_id)]
+            except Exception as error:
+                _events.put(error)
+            _events.put(None)
+
+        threading.Thread(target=_follow, name='follow-plan-{}'.format(plan_id), daemon=True).start()
+        while True:
+            try:
+                _event = _events.get(timeout=self._FOLLOW_INTERVAL)
+            except queue.Empty:
+                self._update_progress()
+                continue
+            if _event is None:
+                return
+            if isinstance(_event, Exception):
+                raise _event
+            self._progress.update(_event)
+            self._update_progress()
+
+    def _update_progress(self):
+        """
+        Sampling the throughput and passing the progress to the UI.
+        When running without the UI the progress is logged instead.
+        """
+        if not self._progress.sample():
+            return
+        if self._ui_main:
+            self._ui_main.update_integrate_progress(self._progress, self._headers)
+        if self._progress.elapsed - self._last_log >= self._LOG_INTERVAL:
+            self._last_log = self._progress.elapsed
+            self._app_logging.info(self._progress.summary())
+
+    def _job_complete(self, job, failures):
+        """
+        Updating the entries of a finished job.
+        Called from the main thread so the widgets can be updated.
+
+        Args:
+            job (BaseIntegrateJob): The finished job.
+            failures (dict): Destination paths mapped to the error raised.
+        """
+        for entry in job.targets:
+            self._progress.finish(entry.dst)
+            if entry.dst in failures:
+                self._app_logging.error('{} - {}'.format(job.src, failures[entry.dst]))
+                self._errors[entry.dst] = (job, failures[entry.dst])
+                self._failed_copy(entry)
+                continue
+            self._app_logging.info('successfully Copied: {0} from {1}'.format(job.src, entry.dst))
+            if job.reused:
+                self._app_logging.info('Reused {} of {} already at {}'.format(
+                    format_size(job.reused), format_size(job.size), entry.dst))
+            self._complete.append(entry)
+            self._integrated[id(entry.contents)] = entry
+            if entry.item and not self._staging:
+                self.update_all_widgets(entry.item)
+
+    def _failed_copy(self, entry):
+        """
+        Marking the passed entry as failed and colouring the widgets.
+
+        Args:
+            entry (IntegrateEntry): The file that failed.
+        """
+        self._failed.append(entry)
+        self._app_logging.error('Failed to copy file {}'.format(entry.dst))
+        if not entry.item:
+            return
+        [
+        wdg.setStyleSheet('background-color: red; border: 1.5px solid #32414B') 
+        for wdg in entry.item.items
+        ]
 
     def update_all_widgets(self, c_file):
         """
@@ -0,0 +1,352 @@
+################################################################################
+## Client File Manager TOOL - Ingesting client files into a production pipeline
+##  with tracking, logging and configuration overrides.
+##
+## File : integrate_jobs.py
+## Description : The units of work the integrator hands to the scheduler.
+##      All values are read from the tree widgets when a job is built, so
+##      jobs can run on worker threads without touching the UI. Destination
+##      folders are created by the planner before any job runs.
+##
+## Created by: Kieran Knight
+## Email: kieransknight@gmail.com
+##
+################################################################################
+
+# Python Modules
+import os
+
+# Application
+from utils import StreamHash
+from integrate.copy_files import copy_file
+from integrate.delta_transfer import delta_copy
+from integrate.archive_files import extract_zip_member, extract_tar_members
+
+
+class IntegrateEntry(object):
+    """
+    A single client file to be integrated.
+    Holds the values set on the tree widgets, so the file can be integrated
+    without the UI, ie. from the command line.
+    """
+    def __init__(self, contents, location, sequence, shot, option, item=None, header=None):
+        super(IntegrateEntry, self).__init__()
+        self._contents = contents
+        self._location = location
+        self._sequence = sequence
+        self._shot = shot
+        self._option = option
+        self._item = item
+        self._header = header
+        self._dst = None
+        self._staged = None
+
+    @classmethod
+    def from_item(cls, item, header=None):
+        """
+        Reading the entry values from a tree item's widgets.
+
+        Args:
+            item (CustomTreeItem): The tree item.
+            header (CustomTreeItem): The header item the tree item is under, if any.
+
+        Returns:
+            IntegrateEntry: The entry.
+        """
+        return cls(
+            item.item_contents,
+            item.location.currentText(),
+            item.sequence.currentText(),
+            item.shot.currentText(),
+            item.option.currentText(),
+            item=item,
+            header=header
+        )
+
+    @classmethod
+    def from_folder(cls, folder, contents):
+        """
+        Building the entry of a file below a folder that was never listed
+        in the tree. The values are read from the folder's widgets, sequence
+        and shot are guessed from the filename if the folder has none.
+
+        Args:
+            folder (CustomTreeFolderItem): The folder item the file is below.
+            contents (ConfigureFilesData): The file.
+
+        Returns:
+            IntegrateEntry: The entry.
+        """
+        return cls(
+            contents,
+            folder.location.currentText(),
+            folder.sequence.currentText() or contents.sequence,
+            folder.shot.currentText() or contents.shot,
+            folder.option.currentText(),
+            header=folder
+        )
+
+    @property
+    def contents(self):
+        return self._contents
+
+    @property
+    def location(self):
+        return self._location
+
+    @property
+    def sequence(self):
+        return self._sequence
+
+    @property
+    def shot(self):
+        return self._shot
+
+    @property
+    def option(self):
+        return self._option
+
+    @property
+    def filename(self):
+        return self._contents.filename
+
+    @property
+    def item(self):
+        return self._item
+
+    @property
+    def header(self):
+        return self._header
+
+    @property
+    def src(self):
+        if self._contents.is_archive_member:
+            return self._contents.archive
+        return os.path.join(self._contents.folder, self.filename)
+
+    @property
+    def planned_dst(self):
+        return os.path.join(self.location, self.sequence, self.shot, self.option, self.filename)
+
+    @property
+    def dst(self):
+        return self._dst or self.planned_dst
+
+    @dst.setter
+    def dst(self, value):
+        # set when the destination is renamed or versioned to avoid a conflict
+        self._dst = value
+
+    @property
+    def staged(self):
+        return self._staged
+
+    @staged.setter
+    def staged(self, value):
+        # set when the run is published as a whole, see StagedPublish
+        self._staged = value
+
+    @property
+    def write_path(self):
+        """
+        Where the file is written, its staging path when the run is staged.
+        """
+        return self._staged or self.dst
+
+
+class BaseIntegrateJob(object):
+    """
+    Base class all integration jobs inherit from.
+    A job reads from a single source and writes one or more entries.
+
+    Raises:
+        NotImplementedError: All inheriting classes should include the
+            run method
+    """
+    def __init__(self, src, size, priority=0):
+        super(BaseIntegrateJob, self).__init__()
+        self._src = src
+        self._size = size
+        self._priority = priority
+        self._targets = []
+        self._progress = None
+        self._hashing = False
+        self._reused = 0
+
+    @property
+    def src(self):
+        return self._src
+
+    @property
+    def dst(self):
+        return self._targets[0].dst
+
+    @property
+    def size(self):
+        return self._size
+
+    @property
+    def priority(self):
+        return self._priority
+
+    @property
+    def targets(self):
+        return self._targets
+
+    @property
+    def reused(self):
+        """
+        The bytes reused from an existing destination rather than written.
+        """
+        return self._reused
+
+    @property
+    def progress(self):
+        return self._progress
+
+    @progress.setter
+    def progress(self, value):
+        self._progress = value
+
+    @property
+    def hashing(self):
+        """
+        Whether each file is hashed while it is written, so its hash can be
+        recorded without reading the integrated copy again.
+        """
+        return self._hashing
+
+    @hashing.setter
+    def hashing(self, value):
+        self._hashing = value
+
+    def _digest(self):
+        return StreamHash() if self._hashing else None
+
+    @staticmethod
+    def _record_hash(entry, digest):
+        if digest:
+            entry.contents.file_hash = digest.hexdigest()
+
+    def add_target(self, entry):
+        """
+        Adding an entry this job will write.
+
+        Args:
+            entry (IntegrateEntry): The entry to write.
+        """
+        self._targets.append(entry)
+
+    def remove_target(self, entry):
+        """
+        Removing an entry this job will no longer write.
+
+        Args:
+            entry (IntegrateEntry): The entry to remove.
+        """
+        self._targets.remove(entry)
+
+    def _progress_for(self, dst):
+        """
+        Building the callback the copy functions report written bytes to.
+
+        Args:
+            dst (str): The destination being written.
+
+        Returns:
+            callable: The callback, or None if progress isn't tracked.
+        """
+        if not self._progress:
+            return None
+        return lambda count: self._progress(dst, count)
+
+    def run(self):
+        """
+        Running the job.
+
+        Returns:
+            dict: Destination paths mapped to the error raised, empty if all succeeded.
+        """
+        raise NotImplementedError
+
+
+class CopyJob(BaseIntegrateJob):
+    """
+    Copying a single client file to its output location.
+    """
+    def __init__(self, src, size, priority=0, settings=None):
+        super(CopyJob, self).__init__(src, size, priority=priority)
+        self._settings = settings
+
+    def run(self):
+        _entry = self.targets[0]
+        _digest = self._digest()
+        copy_file(
+            self.src, _entry.write_path, settings=self._settings, progress=self._progress_for(_entry.dst),
+            digest=_digest)
+        self._record_hash(_entry, _digest)
+        return {}
+
+
+class DeltaCopyJob(CopyJob):
+    """
+    Updating a destination that already exists from a re-delivered file,
+    only writing the blocks that have changed.
+    """
+    def __init__(self, src, size, priority=0, settings=None, block_size=128 * 1024):
+        super(DeltaCopyJob, self).__init__(src, size, priority=priority, settings=settings)
+        self._block_size = block_size
+
+    def run(self):
+        _digest = self._digest()
+        _, self._reused = delta_copy(
+            self.src,
+            self.dst,
+            block_size=self._block_size,
+            progress=self._progress_for(self.dst),
+            settings=self._settings,
+            digest=_digest
+        )
+        self._record_hash(self.targets[0], _digest)
+        return {}
+
+
+class ZipMemberJob(BaseIntegrateJob):
+    """
+    Streaming a single zip member to its output location.
+    """
+    def run(self):
+        _entry = self.targets[0]
+        _digest = self._digest()
+        extract_zip_member(
+            self.src, _entry.contents.member, _entry.write_path, progress=self._progress_for(_entry.dst),
+            digest=_digest)
+        self._record_hash(_entry, _digest)
+        return {}
+
+
+class TarArchiveJob(BaseIntegrateJob):
+    """
+    Streaming every wanted member of a tar archive in a single pass.
+    """
+    def add_target(self, entry):
+        super(TarArchiveJob, self).add_target(entry)
+        self._size += entry.contents.file_size
+
+    def remove_target(self, entry):
+        super(TarArchiveJob, self).remove_target(entry)
+        self._size -= entry.contents.file_size
+
+    def run(self):
+        # progress and failures are reported by the path written, which is the staging path of a staged run
+        _destinations = {entry.write_path: entry.dst for entry in self.targets}
+        _digests = {entry.contents.member: self._digest() for entry in self.targets}
+        _failures = extract_tar_members(
+            self.src,
+            [(entry.contents.member, entry.write_path) for entry in self.targets],
+            progress=(lambda path, count: self._progress(_destinations[path], count)) if self._progress else None,
+            digests=_digests
+        )
+        [self._record_hash(entry, _digests[entry.contents.member])
+         for entry in self.targets if entry.write_path not in _failures]
+        return {_destinations[path]: error for path, error in _failures.items()}
@@ -0,0 +1,219 @@
+################################################################################
+## Client File Manager TOOL - Ingesting client files into a production pipeline
+##  with tracking, logging and configuration overrides.
+##
+## File : integrate_progress.py
+## Description : Byte based progress and ETA for an integration run.
+##      The copy workers report written bytes as they go and the throughput
+##      is smoothed with an exponentially weighted moving average (EWMA).
+##
+## Created by: Kieran Knight
+## Email: kieransknight@gmail.com
+##
+################################################################################
+
+# Python Modules
+import time
+import threading
+
+# Application
+from utils import format_size
+
+
+def format_duration(seconds):
+    """
+    Formatting seconds as hours, minutes and seconds.
+
+    Args:
+        seconds (float): The number of seconds.
+
+    Returns:
+        str: The duration, ie. '01:12:05'
+    """
+    seconds = int(seconds)
+    return '{:02d}:{:02d}:{:02d}'.format(seconds // 3600, seconds % 3600 // 60, seconds % 60)
+
+
+class IntegrateProgress(object):
+    """
+    Tracking the bytes planned and done for an integration run.
+
+    Workers report written bytes from their own threads, so every update
+    is taken under a lock. The throughput is sampled from the main thread
+    at a fixed interval, so the EWMA isn't thrown off by many tiny files
+    finishing at once.
+    Files are also grouped, ie. by their header folder, so the completion
+    of each folder can be shown.
+    """
+    _ALPHA = 0.3
+    _SAMPLE_INTERVAL = 0.5
+
+    def __init__(self):
+        super(IntegrateProgress, self).__init__()
+        self._lock = threading.Lock()
+        self._files = {}
+        self._groups = {}
+        self._planned = 0
+        self._done = 0
+        self._rate = None
+        self._start = time.time()
+        self._last_sample = self._start
+        self._last_done = 0
+
+    @property
+    def planned(self):
+        return self._planned
+
+    @property
+    def done(self):
+        return self._done
+
+    @property
+    def rate(self):
+        # short runs finish before the first sample, fall back to the average
+        if self._rate is None:
+            return self._done / self.elapsed if self.elapsed else 0.0
+        return self._rate
+
+    @property
+    def percent(self):
+        if not self._planned:
+            return 100.0
+        return 100.0 * self._done / self._planned
+
+    @property
+    def eta(self):
+        """
+        The estimated seconds left, or None until the throughput is known.
+        """
+        if self._done >= self._planned:
+            return 0.0
+        if not self._rate:
+            return None
+        return (self._planned - self._done) / self._rate
+
+    @property
+    def elapsed(self):
+        return time.time() - self._start
+
+    def add(self, dst, size, group=None):
+        """
+        Adding a planned file. A file added again replaces what was planned
+        for it, so a destination is never counted twice.
+
+        Args:
+            dst (str): The destination path, used to report progress against.
+            size (int): The bytes the file will write.
+            group (object): The group the file belongs to, ie. its header item.
+        """
+        _previous = self._files.get(dst)
+        if _previous is not None:
+            self._planned -= _previous[1]
+            self._done -= _previous[2]
+            self._groups[_previous[0]][0] -= _previous[1]
+            self._groups[_previous[0]][1] -= _previous[2]
+        self._files[dst] = [group, size, 0]
+        self._planned += size
+        _group = self._groups.setdefault(group, [0, 0])
+        _group[0] += size
+
+    def start(self):
+        self._start = self._last_sample = time.time()
+        self._last_done = self._done
+
+    def advance(self, dst, count):
+        """
+        Recording bytes written for a file. Safe to call from any thread.
+
+        Args:
+            dst (str): The destination path being written.
+            count (int): The bytes written since the last call.
+        """
+        with self._lock:
+            _file = self._files.get(dst)
+            if _file is None:
+                return
+            # files that grew since they were planned can't go past 100%
+            count = max(0, min(count, _file[1] - _file[2]))
+            _file[2] += count
+            self._groups[_file[0]][1] += count
+            self._done += count
+
+    def restart(self, dst):
+        """
+        Taking back the bytes written for a file that is about to be
+        written again, ie. retried after a transient failure.
+
+        Args:
+            dst (str): The destination path.
+        """
+        with self._lock:
+            _file = self._files.get(dst)
+            if _file is None:
+                return
+            self._groups[_file[0]][1] -= _file[2]
+            self._done -= _file[2]
+            _file[2] = 0
+
+    def finish(self, dst):
+        """
+        Marking a file as done, whether it succeeded or failed, so
+        it no longer counts towards the time left.
+
+        Args:
+            dst (str): The destination path.
+        """
+        _file = self._files.get(dst)
+        if _file is not None:
+            self.advance(dst, _file[1] - _file[2])
+
+    def sample(self):
+        """
+        Updating the EWMA throughput. Called regularly from the main thread.
+
+        Returns:
+            bool: True if a new sample was taken.
+        """
+        _now = time.time()
+        _elapsed = _now - self._last_sample
+        if _elapsed < self._SAMPLE_INTERVAL:
+            return False
+        with self._lock:
+            _done = self._done
+        # bytes taken back for a retried file don't count against the throughput
+        _rate = max(0.0, (_done - self._last_done) / _elapsed)
+        self._rate = _rate if self._rate is None else self._ALPHA * _rate + (1 - self._ALPHA) * self._rate
+        self._last_sample = _now
+        self._last_done = _done
+        return True
+
+    def group_percent(self, group):
+        """
+        The completion of a single group.
+
+        Args:
+            group (object): The group, ie. a header item.
+
+        Returns:
+            float: The percentage done.
+        """
+        _planned, _done = self._groups.get(group, [0, 0])
+        if not _planned:
+            return 100.0
+        return 100.0 * _done / _planned
+
+    def summary(self):
+        """
+        The progress as a single line, used by the progress bar and the logs.
+
+        Returns:
+            str: ie. '45.2% - 12.3 GB of 27.2 GB - 210.5 MB/s - ETA 00:01:12'
+        """
+        _eta = self.eta
+        return '{percent:.1f}% - {done} of {planned} - {rate}/s - ETA {eta}'.format(
+            percent=self.percent,
+            done=format_size(self._done),
+            planned=format_size(self._planned),
+            rate=format_size(self.rate),
+            eta=format_duration(_eta) if _eta is not None else '--:--:--'
+        )
@@ -0,0 +1,485 @@
+################################################################################
+## Client File Manager TOOL - Ingesting client files into a production pipeline
+##  with tracking, logging and configuration overrides.
+##
+## File : integration_service.py
+## Description : A local integration service shared by every workstation
+##      integrating to the same storage. Plans are queued in SQLite, run one at
+##      a time in priority order, and their progress is streamed back over an
+##      HTTP API that every request has to send the shared token to.
+##
+## Created by: Kieran Knight
+## Email: kieransknight@gmail.com
+##
+################################################################################
+
+# Python Modules
+import os
+import re
+import hmac
+import json
+import time
+import sqlite3
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Application
+from utils import normalise_path
+from configuration.configure import ConfigureFilesData
+from logger.application_logging import IntegrateLogger
+from integrate.integrate_files import IntegrateFiles
+from integrate.integrate_jobs import IntegrateEntry
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS plans (
+    id INTEGER PRIMARY KEY,
+    submitted REAL NOT NULL,
+    submitter TEXT,
+    priority INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL,
+    entries TEXT NOT NULL,
+    result TEXT
+);
+CREATE INDEX IF NOT EXISTS plans_queue ON plans (status, priority, id);
+"""
+
+_FINISHED = ('done', 'failed')
+_LOOPBACK = ('127.0.0.1', 'localhost', '::1')
+
+
+def entry_from_dict(data, entries=None):
+    """
+    Building an entry from the values sent by a client, see entry_to_dict.
+
+    Args:
+        data (dict): The entry values.
+        entries (list): The entries built so far, duplicates point back into these.
+
+    Returns:
+        IntegrateEntry: The entry, grouped by the group id sent.
+    """
+    contents = ConfigureFilesData(
+        data['file'],
+        data['folder'],
+        parent_folder=data.get('parentFolder'),
+        archive=data.get('archive'),
+        member=data.get('member'),
+        size=data.get('size')
+    )
+    contents.file_hash = data.get('fileHash')
+    if entries is not None and data.get('duplicateOf') is not None:
+        contents.duplicate_of = entries[data['duplicateOf']].contents
+    return IntegrateEntry(
+        contents,
+        data['location'],
+        data['sequence'],
+        data['shot'],
+        data['option'],
+        header=data.get('group')
+    )
+
+
+def is_below(path, folder):
+    """
+    Checking whether a path is inside a folder once both are normalised,
+    so '..' can't step out of it.
+    """
+    _folder = normalise_path(folder)
+    _path = normalise_path(path)
+    try:
+        return _path != _folder and os.path.commonpath([_folder, _path]) == _folder
+    except ValueError:
+        # paths on different drives
+        return False
+
+
+def check_entry(entry, output_location, source_folders):
+    """
+    Checking an entry sent by a client only reads from the source folders
+    and is written below the output location, so a plan can't make the
+    service read or write anywhere else, ie. with a different location or
+    a shot of '../..'.
+
+    Args:
+        entry (IntegrateEntry): The entry built from the client values.
+        output_location (str): The output location of the service.
+        source_folders (list): The folders client files can be read from.
+
+    Raises:
+        ValueError: The entry would be read or written outside of its folders.
+    """
+    if not is_below(entry.planned_dst, output_location):
+        raise ValueError('{} is not below the output location {}'.format(entry.planned_dst, output_location))
+    if not any(is_below(entry.src, folder) for folder in source_folders):
+        raise ValueError('{} is not below any of the service source folders'.format(entry.src))
+
+
+class IntegrationQueue(object):
+    """
+    The persistent queue of plans. Plans that were running when the service
+    stopped are queued again when it starts.
+
+    Args:
+        location (str): The queue database file.
+    """
+    def __init__(self, location):
+        super(IntegrationQueue, self).__init__()
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(location, check_same_thread=False)
+        self._connection.row_factory = sqlite3.Row
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.executescript(_SCHEMA)
+        with self._lock, self._connection:
+            self._connection.execute("UPDATE plans SET status = 'queued' WHERE status = 'running'")
+
+    def add(self, entries, priority=0, submitter=None):
+        """
+        Adding a plan to the queue.
+
+        Returns:
+            int: The plan id.
+        """
+        with self._lock, self._connection:
+            return self._connection.execute(
+                "INSERT INTO plans (submitted, submitter, priority, status, entries) VALUES (?, ?, ?, 'queued', ?)",
+                (time.time(), submitter, priority, json.dumps(entries))
+            ).lastrowid
+
+    def next(self):
+        """
+        Taking the next plan off the queue, highest priority first
+        and then in the order they were submitted.
+
+        Returns:
+            dict: The plan, or None if the queue is empty.
+        """
+        with self._lock, self._connection:
+            _row = self._connection.execute(
+                "SELECT * FROM plans WHERE status = 'queued' ORDER BY priority DESC, id LIMIT 1").fetchone()
+            if _row is None:
+                return None
+            self._connection.execute("UPDATE plans SET status = 'running' WHERE id = ?", (_row['id'],))
+        _plan = dict(_row)
+        _plan['entries'] = json.loads(_plan['entries'])
+        return _plan
+
+    def finish(self, plan_id, status, result):
+        with self._lock, self._connection:
+            self._connection.execute(
+                'UPDATE plans SET status = ?, result = ? WHERE id = ?', (status, json.dumps(result), plan_id))
+
+    def plan(self, plan_id):
+        """
+        Getting a plan without its entries.
+
+        Returns:
+            dict: The plan, or None if it doesn't exist.
+        """
+        with self._lock:
+            _row = self._connection.execute(
+                'SELECT id, submitted, submitter, priority, status, result FROM plans WHERE id = ?',
+                (plan_id,)
+            ).fetchone()
+        if _row is None:
+            return None
+        _plan = dict(_row)
+        _plan['result'] = json.loads(_plan['result']) if _plan['result'] else None
+        return _plan
+
+    def plans(self, limit=100):
+        with self._lock:
+            _rows = self._connection.execute(
+                'SELECT id, submitted, submitter, priority, status FROM plans ORDER BY id DESC LIMIT ?',
+                (limit,)
+            ).fetchall()
+        return [dict(row) for row in _rows]
+
+    def close(self):
+        self._connection.close()
+
+
+class _ServiceReporter(object):
+    """
+    Standing in for the UI of a running plan, IntegrateFiles passes it the
+    progress so the service can stream it back to the client.
+    """
+    def __init__(self, service, plan_id, groups):
+        super(_ServiceReporter, self).__init__()
+        self._service = service
+        self._plan_id = plan_id
+        self._groups = groups
+
+    def update_integrate_progress(self, progress, headers):
+        self._service.set_progress(self._plan_id, progress, self._groups)
+
+
+class _ServiceHandler(BaseHTTPRequestHandler):
+    """
+    The HTTP API of the service.
+
+    * GET /status - the service and its queue.
+    * GET /plans - the latest plans.
+    * POST /plans - submitting a plan, returns its id.
+    * GET /plans/{id} - a plan, with its result once it has finished.
+    * GET /plans/{id}/progress - the plan progress, streamed as a line of
+      json every half a second until the plan has finished.
+
+    Every request has to send the service token as a bearer token when
+    the service has one.
+    """
+    _PLAN = re.compile(r'^/plans/(\d+)(/progress)?$')
+
+    def _authorised(self):
+        _token = self.server.service.token
+        if not _token:
+            return True
+        _sent = self.headers.get('Authorization', '')
+        if hmac.compare_digest(_sent.encode('utf-8'), 'Bearer {}'.format(_token).encode('utf-8')):
+            return True
+        self._send_json({'error': 'Unauthorised'}, 401)
+        return False
+
+    def log_message(self, format, *args):
+        self.server.service.logger.debug('{} - {}'.format(self.address_string(), format % args))
+
+    def _send_json(self, data, code=200):
+        _body = json.dumps(data).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(_body)))
+        self.end_headers()
+        self.wfile.write(_body)
+
+    def do_GET(self):
+        if not self._authorised():
+            return
+        _service = self.server.service
+        if self.path == '/status':
+            return self._send_json(_service.status())
+        if self.path == '/plans':
+            return self._send_json(_service.queue.plans())
+        _match = self._PLAN.match(self.path)
+        if not _match or _service.plan(int(_match.group(1))) is None:
+            return self._send_json({'error': 'Not found'}, 404)
+        if not _match.group(2):
+            return self._send_json(_service.plan(int(_match.group(1))))
+        self._stream(int(_match.group(1)))
+
+    def do_POST(self):
+        if not self._authorised():
+            return
+        if self.path != '/plans':
+            return self._send_json({'error': 'Not found'}, 404)
+        try:
+            _data = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))).decode('utf-8'))
+            _plan_id = self.server.service.submit(
+                _data['entries'], int(_data.get('priority', 0)), _data.get('submitter'))
+        except (ValueError, KeyError, TypeError) as error:
+            return self._send_json({'error': 'Invalid plan - {}'.format(error)}, 400)
+        self._send_json({'id': _plan_id}, 201)
+
+    def _stream(self, plan_id):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.end_headers()
+        while True:
+            _plan = self.server.service.plan(plan_id)
+            try:
+                self.wfile.write((json.dumps(_plan) + '\n').encode('utf-8'))
+                self.wfile.flush()
+            except OSError:
+                # the client has gone, the plan keeps running
+                return
+            if _plan['status'] in _FINISHED:
+                return
+            time.sleep(self.server.service.STREAM_INTERVAL)
+
+
+class IntegrationService(object):
+    """
+    Running the plans submitted by every client one at a time, so the
+    storage only ever sees the streams the scheduler allows, however many
+    workstations are integrating. Plans are only accepted if every file is
+    read from the service source folders, or the watched drop folders, and
+    written below the output location of the service.
+
+    Args:
+        configuration (IntegrateConfigure): The configuration plans are integrated with.
+        host (str): The address to listen on, localhost by default.
+        port (int): The port to listen on, 0 picks a free port.
+        queue_location (str): The queue database file.
+        token (str): The token every request has to send.
+
+    Raises:
+        ValueError: Listening on more than localhost without a token.
+    """
+    STREAM_INTERVAL = 0.5
+
+    def __init__(self, configuration, host='127.0.0.1', port=8765, queue_location=None, token=None):
+        super(IntegrationService, self).__init__()
+        if not token and host not in _LOOPBACK:
+            raise ValueError(
+                'The integration service needs a token to listen on {}, set the service token'.format(host))
+        self._configuration = configuration
+        self._token = token
+        self._queue = IntegrationQueue(queue_location or configuration.service['queue'])
+        self._server = ThreadingHTTPServer((host, port), _ServiceHandler)
+        self._server.daemon_threads = True
+        self._server.service = self
+        self._wake = threading.Event()
+        self._running = False
+        self._current = None
+        self._progress = {}
+        self._worker = None
+
+    @property
+    def logger(self):
+        return self._configuration.logger
+
+    @property
+    def queue(self):
+        return self._queue
+
+    @property
+    def token(self):
+        return self._token
+
+    @property
+    def address(self):
+        return self._server.server_address
+
+    def status(self):
+        return {
+            'running': self._current,
+            'queued': sum(1 for plan in self._queue.plans() if plan['status'] == 'queued')
+        }
+
+    def submit(self, entries, priority=0, submitter=None):
+        """
+        Queuing a plan once every entry has been checked.
+
+        Raises:
+            ValueError: An entry would be read or written outside of its folders.
+        """
+        self._build_entries(entries)
+        _plan_id = self._queue.add(entries, priority, submitter)
+        self.logger.info('Plan {} queued from {} - {} files, priority {}'.format(
+            _plan_id, submitter, len(entries), priority))
+        self._wake.set()
+        return _plan_id
+
+    def plan(self, plan_id):
+        """
+        Getting a plan with its live progress while it runs.
+
+        Returns:
+            dict: The plan, or None if it doesn't exist.
+        """
+        _plan = self._queue.plan(plan_id)
+        if _plan is not None:
+            _plan['progress'] = self._progress.get(plan_id) or (_plan['result'] or {}).get('progress')
+        return _plan
+
+    def _build_entries(self, values):
+        """
+        Building the entries of a plan from the values sent by the client.
+
+        Raises:
+            ValueError: An entry would be read or written outside of its folders.
+        """
+        _sources = list(self._configuration.service['sources']) + list(self._configuration.watch_folders['folders'])
+        if not _sources:
+            raise ValueError('No source folders are set, add them to the service sources')
+        entries = []
+        for data in values:
+            entries.append(entry_from_dict(data, entries))
+            check_entry(entries[-1], self._configuration.output_location, _sources)
+        return entries
+
+    def set_progress(self, plan_id, progress, groups):
+        self._progress[plan_id] = self._progress_values(progress, groups)
+
+    @staticmethod
+    def _progress_values(progress, groups):
+        return {
+            'percent': progress.percent,
+            'done': progress.done,
+            'planned': progress.planned,
+            'rate': progress.rate,
+            'eta': progress.eta,
+            'summary': progress.summary(),
+            'groups': {str(group): progress.group_percent(group) for group in groups}
+        }
+
+    def _run_plan(self, plan):
+        """
+        Integrating a single plan with the service configuration.
+        """
+        self._current = plan['id']
+        self.logger.info('Running plan {} from {}'.format(plan['id'], plan['submitter']))
+        try:
+            # plans queued before the service checked them are checked again here
+            entries = self._build_entries(plan['entries'])
+            _groups = {entry.header for entry in entries}
+            _integrate = IntegrateFiles(
+                None,
+                0,
+                ui_main=_ServiceReporter(self, plan['id'], _groups),
+                app_logging=self.logger,
+                save_logging=IntegrateLogger(
+                    self._configuration.logging_location, rotation=self._configuration.log_rotation
+                ) if self._configuration.logging_option else False,
+                configuration=self._configuration,
+                entries=entries
+            )
+        except Exception as error:
+            self.logger.error('Plan {} failed - {}'.format(plan['id'], error))
+            self._queue.finish(plan['id'], 'failed', {'error': str(error), 'complete': [], 'failed': []})
+        else:
+            self._queue.finish(plan['id'], 'done', {
+                'complete': [entry.dst for entry in _integrate.complete],
+                'failed': [entry.dst for entry in _integrate.failed],
+                'ignored': [entry.dst for entry in _integrate.ignored],
+                # destinations renamed or versioned to avoid a conflict
+                'resolved': {entry.planned_dst: entry.dst for entry in entries if entry.dst != entry.planned_dst},
+                'progress': self._progress_values(_integrate.progress, _groups)
+            })
+        finally:
+            self._current = None
+            self._progress.pop(plan['id'], None)
+
+    def _work(self):
+        while self._running:
+            _plan = self._queue.next()
+            if _plan is None:
+                self._wake.wait(1.0)
+                self._wake.clear()
+                continue
+            self._run_plan(_plan)
+
+    def start(self):
+        """
+        Starting the worker and the API, without blocking.
+        """
+        self._running = True
+        self._worker = threading.Thread(target=self._work, name='integration-service', daemon=True)
+        self._worker.start()
+        threading.Thread(target=self._server.serve_forever, name='integration-api', daemon=True).start()
+        self.logger.info('Integration service listening on http://{}:{}'.format(*self.address))
+
+    def serve_forever(self):
+        self.start()
+        try:
+            while self._worker.is_alive():
+                self._worker.join(1.0)
+        finally:
+            self.stop()
+
+    def stop(self):
+        self._running = False
+        self._wake.set()
+        self._server.shutdown()
+        self._server.server_close()
+        if self._worker:
+            self._worker.join()
+        self._queue.close()
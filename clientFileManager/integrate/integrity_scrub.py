@@ -0,0 +1,316 @@
+################################################################################
+## Client File Manager TOOL - Ingesting client files into a production pipeline
+##  with tracking, logging and configuration overrides.
+##
+## File : integrity_scrub.py
+## Description : Checking the integrated files in the output location are
+##      still what was integrated. Files are re-hashed in a process pool
+##      throttled to a set rate, and each result is kept in the catalog so an
+##      interrupted scrub carries on where it stopped.
+##
+## Created by: Kieran Knight
+## Email: kieransknight@gmail.com
+##
+################################################################################
+
+# Python Modules
+import os
+import time
+import hashlib
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+# Application
+from utils import normalise_path
+from logger.integration_catalog import IntegrationCatalog
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS scrub_runs (
+    id INTEGER PRIMARY KEY,
+    location TEXT NOT NULL,
+    started REAL NOT NULL,
+    finished REAL
+);
+CREATE TABLE IF NOT EXISTS scrub_results (
+    run INTEGER NOT NULL,
+    destination TEXT NOT NULL,
+    status TEXT NOT NULL,
+    hash TEXT,
+    checked REAL NOT NULL,
+    PRIMARY KEY (run, destination)
+);
+"""
+
+VERIFIED = 'verified'
+MODIFIED = 'modified'
+MISSING = 'missing'
+UNEXPECTED = 'unexpected'
+UNVERIFIED = 'unverified'
+FAILED = 'failed'
+
+
+def hash_file_throttled(path, rate=0, block_size=1024 * 1024):
+    """
+    Hashing a file the same way as utils.hash_file, but reading no faster
+    than the passed rate so the storage stays responsive for everyone else.
+
+    Args:
+        path (str): The file path.
+        rate (float): The most bytes read per second, 0 for no limit.
+        block_size (int): The bytes read at a time.
+
+    Returns:
+        str: The hex digest of the file.
+    """
+    _hash = hashlib.blake2b(digest_size=20)
+    _start = time.time()
+    _read = 0
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(block_size), b''):
+            _hash.update(block)
+            _read += len(block)
+            if rate:
+                _ahead = _read / rate - (time.time() - _start)
+                if _ahead > 0:
+                    time.sleep(_ahead)
+    return _hash.hexdigest()
+
+
+class ScrubReport(object):
+    """
+    The result of a scrub, every checked destination grouped by its status.
+    """
+    def __init__(self, run_id, results):
+        super(ScrubReport, self).__init__()
+        self._run_id = run_id
+        self._results = {}
+        for destination, status in results:
+            self._results.setdefault(status, []).append(destination)
+
+    @property
+    def run_id(self):
+        return self._run_id
+
+    @property
+    def problems(self):
+        """
+        Every destination that isn't as it was integrated.
+        """
+        return {
+            status: sorted(self._results.get(status, []))
+            for status in (MISSING, MODIFIED, UNEXPECTED, FAILED) if self._results.get(status)
+        }
+
+    def files(self, status):
+        return sorted(self._results.get(status, []))
+
+    def count(self, status):
+        return len(self._results.get(status, []))
+
+    def summary(self):
+        return ', '.join('{} {}'.format(
+            self.count(status), status) for status in (VERIFIED, UNVERIFIED, MODIFIED, MISSING, UNEXPECTED, FAILED))
+
+
+class IntegrityScrub(object):
+    """
+    Scrubbing the output location against the hashes recorded in the catalog.
+
+    Every file the catalog has integrated to the output location is re-hashed
+    and compared with its recorded hash. Files recorded without a hash can
+    only be checked by size and are reported as unverified. Files that are
+    no longer there are missing, and files the catalog never integrated are
+    unexpected.
+
+    Each result is written to the catalog as the scrub goes. A scrub that
+    didn't finish is carried on by the next one of the same location, and
+    the files it already checked are skipped.
+
+    Args:
+        catalog_location (str): The catalog database file.
+        output_location (str): The folder to scrub.
+        rate (float): The most MB read per second, shared by every worker. 0 for no limit.
+        workers (int): Processes hashing files.
+        batch_size (int): Results written per transaction.
+        logger (BaseLogger): The logger the scrub is reported to.
+    """
+    _LOG_INTERVAL = 30.0
+
+    def __init__(self, catalog_location, output_location, rate=50, workers=2, batch_size=500, logger=None):
+        super(IntegrityScrub, self).__init__()
+        self._catalog_location = catalog_location
+        self._output_location = normalise_path(output_location)
+        self._rate = rate * 1024 * 1024
+        self._workers = max(1, workers)
+        self._batch_size = max(1, batch_size)
+        self._logger = logger
+        self._pending = []
+        self._total = 0
+        self._checked = 0
+        self._stopped = False
+        self._connection = None
+
+    @property
+    def total(self):
+        return self._total
+
+    @property
+    def checked(self):
+        return self._checked
+
+    def _log(self, msg):
+        if self._logger:
+            self._logger.info(msg)
+
+    def stop(self):
+        """
+        Stopping a running scrub, it is carried on next time.
+        """
+        self._stopped = True
+
+    def _start_run(self, resume):
+        """
+        Getting the unfinished run of this location to carry on, or starting a new one.
+
+        Returns:
+            int: The run id.
+        """
+        _row = self._connection.execute(
+            'SELECT id FROM scrub_runs WHERE location = ? AND finished IS NULL ORDER BY id DESC LIMIT 1',
+            (self._output_location,)
+        ).fetchone()
+        with self._connection:
+            if _row and resume:
+                return _row[0]
+            if _row:
+                self._connection.execute('UPDATE scrub_runs SET finished = ? WHERE id = ?', (time.time(), _row[0]))
+            return self._connection.execute(
+                'INSERT INTO scrub_runs (location, started) VALUES (?, ?)',
+                (self._output_location, time.time())
+            ).lastrowid
+
+    def _record(self, run_id, destination, status, file_hash=None):
+        self._pending.append((run_id, destination, status, file_hash, time.time()))
+        self._checked += 1
+        if status != VERIFIED:
+            self._log('{} - {}'.format(status.capitalize(), destination))
+        if len(self._pending) >= self._batch_size:
+            self._flush()
+
+    def _flush(self):
+        if not self._pending:
+            return
+        with self._connection:
+            self._connection.executemany(
+                'INSERT OR REPLACE INTO scrub_results VALUES (?, ?, ?, ?, ?)', self._pending)
+        self._pending = []
+
+    def _files_on_disk(self):
+        _files = set()
+        for folder, folders, files in os.walk(self._output_location):
+            # hidden files are partial writes, ie. a delta transfer in progress
+            folders[:] = [name for name in folders if not name.startswith('.')]
+            _files.update(os.path.join(folder, name) for name in files if not name.startswith('.'))
+        return _files
+
+    def run(self, resume=True):
+        """
+        Scrubbing the output location.
+
+        Args:
+            resume (bool): Carry on the last scrub if it didn't finish, rather than starting again.
+
+        Returns:
+            ScrubReport: Every destination checked by the run, including those
+                checked before it was resumed.
+        """
+        self._stopped = False
+        with IntegrationCatalog(self._catalog_location) as catalog:
+            _expected = catalog.find_location(self._output_location)
+        self._connection = sqlite3.connect(self._catalog_location)
+        try:
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.executescript(_SCHEMA)
+            run_id = self._start_run(resume)
+            _done = {
+                row[0] for row in self._connection.execute(
+                    'SELECT destination FROM scrub_results WHERE run = ?', (run_id,))
+            }
+            if _done:
+                self._log('Carrying on scrub {}, {} files already checked'.format(run_id, len(_done)))
+            _on_disk = self._files_on_disk()
+            self._total = len(set(_expected) | _on_disk)
+            self._checked = len(_done)
+
+            for destination in sorted(set(_expected) - _on_disk - _done):
+                self._record(run_id, destination, MISSING)
+            for destination in sorted(_on_disk - set(_expected) - _done):
+                self._record(run_id, destination, UNEXPECTED)
+            self._hash_files(run_id, [
+                _expected[destination] for destination in sorted(_on_disk & set(_expected) - _done)])
+
+            self._flush()
+            if not self._stopped:
+                with self._connection:
+                    self._connection.execute(
+                        'UPDATE scrub_runs SET finished = ? WHERE id = ?', (time.time(), run_id))
+            _report = ScrubReport(run_id, self._connection.execute(
+                'SELECT destination, status FROM scrub_results WHERE run = ?', (run_id,)))
+        finally:
+            # an interrupted scrub keeps everything it has checked
+            try:
+                self._flush()
+            finally:
+                self._connection.close()
+                self._connection = None
+        self._log('{} scrub {} of {} - {}'.format(
+            'Stopped' if self._stopped else 'Finished', run_id, self._output_location, _report.summary()))
+        return _report
+
+    def _hash_files(self, run_id, rows):
+        """
+        Re-hashing the integrated files and comparing them with the catalog.
+        Only a couple of files per worker are queued at a time, so a stopped
+        scrub doesn't leave a long queue to finish.
+
+        Args:
+            run_id (int): The scrub run.
+            rows (list): The catalog rows of the files to check.
+        """
+        _rate = self._rate / self._workers
+        _last_log = time.time()
+        with ProcessPoolExecutor(max_workers=self._workers) as executor:
+            _running = {}
+            _rows = iter(rows)
+            while True:
+                while not self._stopped and len(_running) < self._workers * 2:
+                    row = next(_rows, None)
+                    if row is None:
+                        break
+                    _destination = row['destination']
+                    try:
+                        _size = os.path.getsize(_destination)
+                    except OSError:
+                        self._record(run_id, _destination, MISSING)
+                        continue
+                    if row['size'] is not None and _size != row['size']:
+                        self._record(run_id, _destination, MODIFIED)
+                    elif not row['hash']:
+                        self._record(run_id, _destination, UNVERIFIED)
+                    else:
+                        _running[executor.submit(hash_file_throttled, _destination, _rate)] = row
+                if not _running:
+                    break
+                _finished, _ = wait(_running, return_when=FIRST_COMPLETED)
+                for future in _finished:
+                    row = _running.pop(future)
+                    try:
+                        _hash = future.result()
+                    except OSError as error:
+                        self._log('Failed to hash {} - {}'.format(row['destination'], error))
+                        self._record(run_id, row['destination'], FAILED)
+                        continue
+                    self._record(run_id, row['destination'], VERIFIED if _hash == row['hash'] else MODIFIED, _hash)
+                if time.time() - _last_log >= self._LOG_INTERVAL:
+                    _last_log = time.time()
+                    self._log('Scrubbed {} of {} files'.format(self._checked, self._total))
@@ -0,0 +1,388 @@
+################################################################################
+## Client File Manager TOOL - Ingesting client files into a production pipeline
+##  with tracking, logging and configuration overrides.
+##
+## File : io_scheduler.py
+## Description : Scheduling integration jobs per storage device. Every source
+##      and destination device gets its own concurrency limit, with separate
+##      queues for large sequential files and small files. Jobs that fail with
+##      transient errors are held back and queued again once their backoff
+##      has passed.
+##
+## Created by: Kieran Knight
+## Email: kieransknight@gmail.com
+##
+################################################################################
+
+# Python Modules
+import os
+import time
+import heapq
+import queue
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+
+# Application
+from utils import format_size
+
+
+def device_id(path, cache=None, folder=False):
+    """
+    Getting the device (st_dev) the passed path lives on.
+    Destinations usually don't exist yet, so the closest existing
+    parent folder is used instead.
+
+    Args:
+        path (str): The file or folder path.
+        cache (dict): Folder paths mapped to their device, saves a stat per file.
+        folder (bool): Whether the path is a folder rather than a file.
+
+    Returns:
+        int: The device id.
+    """
+    _folder = os.path.abspath(path) if folder else os.path.dirname(os.path.abspath(path))
+    _walked = []
+    while True:
+        if cache is not None and _folder in cache:
+            _device = cache[_folder]
+            break
+        try:
+            _device = os.stat(_folder).st_dev
+            break
+        except OSError:
+            _walked.append(_folder)
+            _parent = os.path.dirname(_folder)
+            if _parent == _folder:
+                _device = 0
+                break
+            _folder = _parent
+    if cache is not None:
+        cache.update({_path: _device for _path in _walked + [_folder]})
+    return _device
+
+
+class DeviceStats(object):
+    """
+    Tracking how busy a single device has been during a run.
+    """
+    def __init__(self, name, limit):
+        super(DeviceStats, self).__init__()
+        self.name = name
+        self.limit = limit
+        self.running = 0
+        self.running_large = 0
+        self.busy = 0.0
+        self.bytes = 0
+        self.jobs = 0
+
+    def utilisation(self, wall):
+        """
+        The share of the device's stream slots that were in use.
+
+        Args:
+            wall (float): The elapsed seconds of the run.
+
+        Returns:
+            float: Utilisation between 0 and 1.
+        """
+        if not wall:
+            return 0.0
+        return min(1.0, self.busy / (wall * self.limit))
+
+
+class IOScheduler(object):
+    """
+    Per-device I/O scheduler.
+    Jobs are grouped by their source and destination device. A job only starts
+    once both devices have a free stream, so a spinning disk array isn't thrashed
+    while a fast NVMe device can run many streams at once.
+
+    Large files are held in their own queue with a lower limit per device so
+    they stay sequential, while small files fill the remaining streams.
+    Higher priority jobs are always started first.
+
+    When a retry policy is passed, a job that failed with transient errors
+    waits out its backoff while the other jobs carry on, then goes back into
+    its queue. Only once it has run out of attempts, or fails with a
+    permanent error, is it completed with its failures.
+    """
+    _MAX_WORKERS = 64
+    _REPORT_INTERVAL = 10.0
+
+    def __init__(
+        self, default_limit=4, large_limit=2, large_file_size=64 * 1024 * 1024,
+        device_limits=None, logger=None, tuner=None, tune_destination=None, retry=None
+        ):
+        super(IOScheduler, self).__init__()
+        self._default_limit = max(1, default_limit)
+        self._large_limit = max(1, large_limit)
+        self._large_file_size = large_file_size
+        self._logger = logger
+        self._device_cache = {}
+        self._devices = {}
+        self._queues = {}
+        self._order = itertools.count()
+        self._pending = 0
+        self._retry = retry
+        self._retries = []
+        self._attempts = {}
+        self._retried = 0
+
+        # limits are configured by path, as users won't know the device numbers
+        self._device_limits = {
+            device_id(path, self._device_cache, folder=True): limit
+            for (path, limit) in (device_limits or {}).items()
+        }
+
+        # the tuner takes over the limit of the destination device
+        self._tuner = tuner
+        self._tuned_device = None
+        if tuner and tune_destination:
+            self._tuned_device = device_id(tune_destination, self._device_cache, folder=True)
+            self._device_limits[self._tuned_device] = tuner.workers
+
+    @classmethod
+    def from_configuration(cls, settings, logger=None, tuner=None, tune_destination=None, retry=None):
+        """
+        Building the scheduler from the ioScheduler configuration settings.
+
+        Args:
+            settings (dict): The ioScheduler section of the configuration.
+            logger (BaseLogger): The logger the device utilisation is reported to.
+            tuner (ConcurrencyTuner): Optional tuner for the destination device's limit.
+            tune_destination (str): The destination folder the tuner applies to.
+            retry (RetryPolicy): Optional policy for retrying transient failures.
+
+        Returns:
+            IOScheduler: The scheduler.
+        """
+        return cls(
+            default_limit=settings['defaultLimit'],
+            large_limit=settings['largeFileLimit'],
+            large_file_size=settings['largeFileSize'],
+            device_limits=settings['deviceLimits'],
+            logger=logger,
+            tuner=tuner,
+            tune_destination=tune_destination,
+            retry=retry
+        )
+
+    @property
+    def tuner(self):
+        return self._tuner
+
+    @property
+    def devices(self):
+        return self._devices
+
+    @property
+    def retried(self):
+        """
+        The number of times a job was queued again after a transient failure.
+        """
+        return self._retried
+
+    def attempts(self, job):
+        """
+        The number of times a job has been run.
+        """
+        return self._attempts.get(job, 1)
+
+    def _device(self, path):
+        _id = device_id(path, self._device_cache)
+        if _id not in self._devices:
+            self._devices[_id] = DeviceStats(
+                os.path.dirname(path), self._device_limits.get(_id, self._default_limit))
+        return _id
+
+    def submit(self, job):
+        """
+        Queuing a job against its source and destination devices.
+
+        Args:
+            job (BaseIntegrateJob): The job to run.
+        """
+        _devices = tuple(sorted({self._device(job.src), self._device(job.dst)}))
+        _large = job.size >= self._large_file_size
+        self._queue(job, (_devices, _large))
+
+    def _queue(self, job, key):
+        heapq.heappush(self._queues.setdefault(key, []), (-job.priority, next(self._order), job))
+        self._pending += 1
+
+    def _requeue_retries(self):
+        """
+        Queuing the jobs whose backoff has passed again.
+        """
+        _now = time.time()
+        while self._retries and self._retries[0][0] <= _now:
+            _, _, job, key = heapq.heappop(self._retries)
+            self._queue(job, key)
+
+    def _hold_for_retry(self, job, key, failures, on_retry=None):
+        """
+        Holding back a failed job until its backoff has passed, if the
+        retry policy allows it.
+
+        Returns:
+            bool: True if the job will be run again.
+        """
+        if not self._retry:
+            return False
+        _attempt = self.attempts(job)
+        _delay = self._retry.delay(_attempt, failures)
+        if _delay is None:
+            return False
+        self._attempts[job] = _attempt + 1
+        self._retried += 1
+        heapq.heappush(self._retries, (time.time() + _delay, next(self._order), job, key))
+        if on_retry:
+            on_retry(job, failures, _attempt, _delay)
+        return True
+
+    def _has_capacity(self, devices, large):
+        for _id in devices:
+            _stats = self._devices[_id]
+            if _stats.running >= _stats.limit:
+                return False
+            if large and _stats.running_large >= min(self._large_limit, _stats.limit):
+                return False
+        return True
+
+    def _next_job(self):
+        """
+        Finding the highest priority job that has free streams on its devices.
+
+        Returns:
+            tuple: The (devices, large) queue key and the job, or None.
+        """
+        _best = None
+        for key, jobs in self._queues.items():
+            if not jobs or not self._has_capacity(*key):
+                continue
+            if _best is None or jobs[0] < self._queues[_best][0]:
+                _best = key
+        if _best is None:
+            return None
+        return _best, heapq.heappop(self._queues[_best])[2]
+
+    def _acquire(self, devices, large, count):
+        for _id in devices:
+            self._devices[_id].running += count
+            if large:
+                self._devices[_id].running_large += count
+
+    @staticmethod
+    def _execute(job):
+        _start = time.time()
+        try:
+            _failures = job.run()
+        except Exception as error:
+            _failures = {entry.dst: error for entry in job.targets}
+        return _failures, time.time() - _start
+
+    def run(self, on_complete=None, on_tick=None, on_retry=None):
+        """
+        Running every submitted job and waiting for them to finish.
+        The callbacks are always called from the calling thread, so it is
+        safe to update UI widgets from them.
+
+        Args:
+            on_complete (callable): Called with the job and its failures dict.
+            on_tick (callable): Called regularly while the jobs are running.
+            on_retry (callable): Called with the job, its failures dict, the
+                attempt that failed and the seconds until it is run again.
+        """
+        if not self._pending:
+            return
+        _workers = sum(stats.limit for stats in self._devices.values())
+        if self._tuner:
+            _workers += self._tuner.maximum
+        _workers = min(self._MAX_WORKERS, _workers)
+        _done = queue.Queue()
+        _running = 0
+        _start = _last_report = time.time()
+
+        with ThreadPoolExecutor(max_workers=_workers) as executor:
+            while self._pending or _running or self._retries:
+                self._requeue_retries()
+                _next = self._next_job()
+                while _next:
+                    (_devices, _large), job = _next
+                    self._acquire(_devices, _large, 1)
+                    self._pending -= 1
+                    _running += 1
+                    future = executor.submit(self._execute, job)
+                    future.add_done_callback(
+                        lambda future, job=job, key=(_devices, _large): _done.put((job, key, future.result())))
+                    _next = self._next_job()
+
+                try:
+                    job, (_devices, _large), (_failures, _elapsed) = _done.get(timeout=0.25)
+                except queue.Empty:
+                    job = None
+
+                if job is not None:
+                    if self._tuned_device in _devices:
+                        self._tune(job, _elapsed)
+                    _running -= 1
+                    self._acquire(_devices, _large, -1)
+                    for _id in _devices:
+                        self._devices[_id].busy += _elapsed
+                        self._devices[_id].bytes += job.size
+                        self._devices[_id].jobs += 1
+                    if not _failures or not self._hold_for_retry(job, (_devices, _large), _failures, on_retry):
+                        if on_complete:
+                            on_complete(job, _failures)
+
+                if on_tick:
+                    on_tick()
+
+                if time.time() - _last_report >= self._REPORT_INTERVAL:
+                    _last_report = time.time()
+                    self.report(_last_report - _start)
+
+        self.report(time.time() - _start)
+
+    def _tune(self, job, elapsed):
+        """
+        Passing a finished job to the tuner and applying any new limit
+        to the destination device.
+
+        Args:
+            job (BaseIntegrateJob): The finished job.
+            elapsed (float): The seconds the job took.
+        """
+        _stats = self._devices[self._tuned_device]
+        self._tuner.record(job.size, elapsed, _stats.running)
+        _workers = self._tuner.update()
+        if _workers is None:
+            return
+        _stats.limit = _workers
+        if self._logger:
+            self._logger.info('Auto tune - device {} ({}) now using {} workers'.format(
+                self._tuned_device, _stats.name, _workers))
+
+    def report(self, wall):
+        """
+        Logging the utilisation of every device used in the run.
+
+        Args:
+            wall (float): The elapsed seconds of the run.
+        """
+        if not self._logger:
+            return
+        for (_id, stats) in self._devices.items():
+            self._logger.info(
+                'Device {id} ({name}) - {running}/{limit} streams, {util:.0%} utilised, '
+                '{jobs} jobs, {size} ({rate}/s)'.format(
+                    id=_id,
+                    name=stats.name,
+                    running=stats.running,
+                    limit=stats.limit,
+                    util=stats.utilisation(wall),
+                    jobs=stats.jobs,
+                    size=format_size(stats.bytes),
+                    rate=format_size(stats.bytes / wall if wall else 0)
+                )
+            )
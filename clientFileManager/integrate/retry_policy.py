@@ -0,0 +1,113 @@
+################################################################################
+## Client File Manager TOOL - Ingesting client files into a production pipeline
+##  with tracking, logging and configuration overrides.
+##
+## File : retry_policy.py
+## Description : Telling the errors worth retrying from those that aren't.
+##      A network share that drops for a moment fails a copy with an I/O
+##      error or a timeout that is gone a few seconds later, while a missing
+##      file or a full disk fails the same way however often it is retried.
+##
+## Created by: Kieran Knight
+## Email: kieransknight@gmail.com
+##
+################################################################################
+
+# Python Modules
+import errno
+import random
+
+_TRANSIENT_ERRNOS = {
+    getattr(errno, name) for name in (
+        'EIO', 'ETIMEDOUT', 'ESTALE', 'EAGAIN', 'ENOTCONN', 'ECONNRESET', 'ECONNABORTED', 'ENETDOWN',
+        'ENETUNREACH', 'ENETRESET', 'EHOSTDOWN', 'EHOSTUNREACH', 'EPIPE', 'ENOLINK', 'ECOMM', 'EREMOTEIO'
+    )
+    if hasattr(errno, name)
+}
+# Windows reports a dropped share with its own codes, ie. the network name is no longer available
+_TRANSIENT_WINERRORS = {
+    53,     # ERROR_BAD_NETPATH
+    59,     # ERROR_UNEXP_NET_ERR
+    64,     # ERROR_NETNAME_DELETED
+    121,    # ERROR_SEM_TIMEOUT
+    240,    # ERROR_VC_DISCONNECTED
+    1231,   # ERROR_NETWORK_UNREACHABLE
+}
+
+
+def is_transient(error):
+    """
+    Checking whether an error is likely to go away by itself, ie. the
+    share was disconnected. Errors raised while handling another error,
+    ie. a tar read error caused by an I/O error, are transient if what
+    caused them is.
+
+    Args:
+        error (Exception): The error a job failed with.
+
+    Returns:
+        bool: True if the job is worth retrying.
+    """
+    _seen = set()
+    while error is not None and id(error) not in _seen:
+        _seen.add(id(error))
+        if isinstance(error, (TimeoutError, ConnectionError)):
+            return True
+        if isinstance(error, OSError) and (
+                error.errno in _TRANSIENT_ERRNOS or getattr(error, 'winerror', None) in _TRANSIENT_WINERRORS):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+class RetryPolicy(object):
+    """
+    How often and how soon a job that failed with transient errors is
+    run again. Each retry waits twice as long as the one before, up to the
+    longest delay, with half of the wait picked at random so jobs that
+    failed together don't all hit the share again at the same moment.
+
+    Args:
+        attempts (int): The most times a job is run, including the first.
+        initial_delay (float): Seconds before the first retry.
+        max_delay (float): The longest wait in seconds before a retry.
+    """
+    def __init__(self, attempts=5, initial_delay=2.0, max_delay=60.0):
+        super(RetryPolicy, self).__init__()
+        self._attempts = max(1, attempts)
+        self._initial_delay = initial_delay
+        self._max_delay = max_delay
+
+    @classmethod
+    def from_configuration(cls, settings):
+        """
+        Args:
+            settings (dict): The retries configuration.
+
+        Returns:
+            RetryPolicy: The policy, or None if retrying is turned off.
+        """
+        if not settings['enabled']:
+            return None
+        return cls(settings['attempts'], settings['initialDelay'], settings['maxDelay'])
+
+    @property
+    def attempts(self):
+        return self._attempts
+
+    def delay(self, attempt, failures):
+        """
+        Getting how long to wait before running a failed job again.
+
+        Args:
+            attempt (int): The attempt that failed, starting from 1.
+            failures (dict): Destination paths mapped to the error raised.
+
+        Returns:
+            float: The seconds to wait, or None if the job shouldn't be
+                retried, ie. a failure was permanent or it has run out of attempts.
+        """
+        if attempt >= self._attempts or not failures or not all(map(is_transient, failures.values())):
+            return None
+        _delay = min(self._max_delay, self._initial_delay * 2 ** (attempt - 1))
+        return _delay / 2 + random.uniform(0, _delay / 2)
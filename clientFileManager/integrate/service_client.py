@@ -0,0 +1,211 @@
+################################################################################
+## Client File Manager TOOL - Ingesting client files into a production pipeline
+##  with tracking, logging and configuration overrides.
+##
+## File : service_client.py
+## Description : Submitting integration plans to the integration service
+##      and following their progress. Used by the UI and the command line
+##      when the service is turned on in the configuration.
+##
+## Created by: Kieran Knight
+## Email: kieransknight@gmail.com
+##
+################################################################################
+
+# Python Modules
+import json
+import time
+import getpass
+import urllib.request
+
+
+def entry_to_dict(entry, group=None, duplicate_of=None):
+    """
+    Turning an entry into the plain values sent to the service.
+
+    Args:
+        entry (IntegrateEntry): The file to integrate.
+        group (int): The group the file belongs to, ie. the index of its header item.
+        duplicate_of (int): The index in the plan of the file this one duplicates.
+
+    Returns:
+        dict: The entry values.
+    """
+    _contents = entry.contents
+    return {
+        'file': _contents.file_path,
+        'folder': _contents.folder,
+        'parentFolder': _contents.delivery,
+        'archive': _contents.archive,
+        'member': _contents.member,
+        'size': _contents.file_size if _contents.is_archive_member else None,
+        'fileHash': _contents.file_hash,
+        'duplicateOf': duplicate_of,
+        'location': entry.location,
+        'sequence': entry.sequence,
+        'shot': entry.shot,
+        'option': entry.option,
+        'group': group
+    }
+
+
+class ServiceClient(object):
+    """
+    Talking to the integration service over its HTTP API.
+
+    Args:
+        host (str): The host the service runs on.
+        port (int): The port the service listens on.
+        timeout (float): Seconds to wait for a response.
+        token (str): The token of the service, if it has one.
+    """
+    def __init__(self, host='127.0.0.1', port=8765, timeout=10.0, token=None):
+        super(ServiceClient, self).__init__()
+        self._url = 'http://{}:{}'.format(host, port)
+        self._timeout = timeout
+        self._token = token
+
+    @classmethod
+    def from_configuration(cls, settings):
+        return cls(settings['host'], settings['port'], token=settings['token'])
+
+    @property
+    def url(self):
+        return self._url
+
+    def _request(self, path, data=None, timeout=None):
+        _headers = {'Content-Type': 'application/json'}
+        if self._token:
+            _headers['Authorization'] = 'Bearer {}'.format(self._token)
+        _request = urllib.request.Request(
+            self._url + path,
+            data=json.dumps(data).encode('utf-8') if data is not None else None,
+            headers=_headers
+        )
+        return urllib.request.urlopen(_request, timeout=timeout or self._timeout)
+
+    def _json(self, path, data=None):
+        with self._request(path, data) as response:
+            return json.loads(response.read().decode('utf-8'))
+
+    def available(self):
+        """
+        Checking the service is running.
+
+        Returns:
+            bool: True if the service responded.
+        """
+        try:
+            self._json('/status')
+        except (OSError, ValueError):
+            return False
+        return True
+
+    def status(self):
+        return self._json('/status')
+
+    def submit(self, entries, priority=0, submitter=None):
+        """
+        Submitting a plan to the service queue.
+
+        Args:
+            entries (list): The entries as dictionaries, see entry_to_dict.
+            priority (int): Plans with a higher priority are run first.
+            submitter (str): Who submitted the plan, the current user by default.
+
+        Returns:
+            int: The plan id.
+        """
+        return self._json('/plans', {
+            'entries': entries,
+            'priority': priority,
+            'submitter': submitter or getpass.getuser()
+        })['id']
+
+    def plan(self, plan_id):
+        return self._json('/plans/{:d}'.format(plan_id))
+
+    def plans(self):
+        return self._json('/plans')
+
+    def follow(self, plan_id):
+        """
+        Following a plan until it has finished.
+        The service streams a line of progress every half a second.
+
+        Args:
+            plan_id (int): The plan id.
+
+        Yields:
+            dict: The plan status and progress.
+        """
+        # the stream is open for as long as the plan runs
+        with self._request('/plans/{:d}/progress'.format(plan_id), timeout=3600) as response:
+            for line in response:
+                if line.strip():
+                    yield json.loads(line.decode('utf-8'))
+
+
+class ServiceProgress(object):
+    """
+    The progress of a plan running on the service, with the same interface
+    as IntegrateProgress so the UI and logs can show it the same way.
+
+    Args:
+        groups (dict): Group ids sent to the service mapped to the header items.
+    """
+    def __init__(self, groups=None):
+        super(ServiceProgress, self).__init__()
+        self._groups = {id(header): str(group) for group, header in (groups or {}).items()}
+        self._progress = {}
+        self._status = 'queued'
+        self._start = time.time()
+
+    @property
+    def status(self):
+        return self._status
+
+    @property
+    def percent(self):
+        return self._progress.get('percent', 0.0)
+
+    @property
+    def planned(self):
+        return self._progress.get('planned', 0)
+
+    @property
+    def done(self):
+        return self._progress.get('done', 0)
+
+    @property
+    def rate(self):
+        return self._progress.get('rate', 0.0)
+
+    @property
+    def eta(self):
+        return self._progress.get('eta')
+
+    @property
+    def elapsed(self):
+        return time.time() - self._start
+
+    def update(self, event):
+        """
+        Updating from a progress line streamed by the service.
+
+        Args:
+            event (dict): The plan status and progress.
+        """
+        self._status = event['status']
+        self._progress = event.get('progress') or {}
+
+    def sample(self):
+        return True
+
+    def group_percent(self, group):
+        return self._progress.get('groups', {}).get(self._groups.get(id(group)), 0.0)
+
+    def summary(self):
+        if self._status == 'queued':
+            return 'Queued on the integration service'
+        return self._progress.get('summary', '')
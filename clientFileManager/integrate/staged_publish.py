@@ -0,0 +1,170 @@
+################################################################################
+## Client File Manager TOOL - Ingesting client files into a production pipeline
+##  with tracking, logging and configuration overrides.
+##
+## File : staged_publish.py
+## Description : Integrating a run as a whole or not at all. Every file is
+##      written to a hidden staging folder inside its output location, so it
+##      is on the same filesystem, and only once the whole run has been
+##      written and verified is it moved into the live folders with renames.
+##      A run that fails is rolled back by removing its staging folder.
+##
+## Created by: Kieran Knight
+## Email: kieransknight@gmail.com
+##
+################################################################################
+
+# Python Modules
+import os
+import time
+import uuid
+import shutil
+
+STAGING_FOLDER = '.staging'
+
+
+def clean_stale(location, hours):
+    """
+    Removing the staging folders of runs that were stopped before they
+    could publish or roll back, ie. the application was killed.
+
+    Args:
+        location (str): The output location.
+        hours (float): How old a staging folder is before it is removed.
+
+    Returns:
+        int: The staging folders removed.
+    """
+    _folder = os.path.join(location, STAGING_FOLDER)
+    _removed = 0
+    try:
+        _runs = list(os.scandir(_folder))
+    except OSError:
+        return _removed
+    for run in _runs:
+        try:
+            if not run.is_dir(follow_symlinks=False) or time.time() - run.stat().st_mtime < hours * 3600:
+                continue
+        except OSError:
+            continue
+        shutil.rmtree(run.path, ignore_errors=True)
+        _removed += 1
+    return _removed
+
+
+class StagedPublish(object):
+    """
+    The staging folders of a single run, one for each output location it
+    writes to. Each file is staged at the same path below the staging folder
+    as it has below the output location, so publishing is a rename of each
+    folder that isn't live yet, and a rename of each file into the folders
+    that are. Nothing is copied twice, and the live folders only ever hold
+    whole files.
+
+    Args:
+        run_id (str): Names the staging folders, a new id by default.
+    """
+    def __init__(self, run_id=None):
+        super(StagedPublish, self).__init__()
+        self._run_id = run_id or uuid.uuid4().hex
+        self._roots = {}
+
+    @property
+    def run_id(self):
+        return self._run_id
+
+    @property
+    def roots(self):
+        """
+        The output locations mapped to their staging folder.
+        """
+        return dict(self._roots)
+
+    def stage(self, entry):
+        """
+        Giving an entry the path it is written to before it is published.
+
+        Args:
+            entry (IntegrateEntry): The file to integrate, its destination has to be resolved.
+        """
+        _location = str(entry.location)
+        if _location not in self._roots:
+            self._roots[_location] = os.path.join(_location, STAGING_FOLDER, self._run_id)
+        entry.staged = os.path.join(self._roots[_location], os.path.relpath(entry.dst, _location))
+
+    @staticmethod
+    def verify(entries):
+        """
+        Checking every staged file was written in full.
+
+        Args:
+            entries (list): The IntegrateEntry of each file written.
+
+        Returns:
+            dict: Destination paths mapped to what is wrong, empty if all were written.
+        """
+        _problems = {}
+        for entry in entries:
+            try:
+                _size = os.path.getsize(entry.write_path)
+                # archive members have no source file of their own
+                _expected = entry.contents.file_size if entry.contents.is_archive_member \
+                    else os.path.getsize(entry.src)
+            except OSError as error:
+                _problems[entry.dst] = error
+                continue
+            if _size != _expected:
+                _problems[entry.dst] = 'staged {} bytes of {}'.format(_size, _expected)
+        return _problems
+
+    def publish(self):
+        """
+        Moving every staged file into its live folder, then removing the
+        staging folders.
+
+        Raises:
+            OSError: A file or folder couldn't be moved, whatever was not
+                moved is left in the staging folder.
+        """
+        for location, root in self._roots.items():
+            if not os.path.isdir(root):
+                continue
+            with os.scandir(root) as entries:
+                _items = [(item.path, item.name) for item in entries]
+            for path, name in _items:
+                self._move(path, os.path.join(location, name))
+        self.rollback()
+
+    def _move(self, staged, live):
+        """
+        Moving a staged file or folder to its live path. A folder that isn't
+        live yet is renamed whole, so it appears with all of its files at
+        once, otherwise its files are moved into the live folder one by one.
+        """
+        if not os.path.isdir(staged) or os.path.islink(staged):
+            os.replace(staged, live)
+            return
+        if not os.path.lexists(live):
+            try:
+                os.rename(staged, live)
+                return
+            except OSError:
+                # another run created the folder since it was checked
+                if not os.path.isdir(live):
+                    raise
+        with os.scandir(staged) as entries:
+            _items = [(item.path, item.name) for item in entries]
+        for path, name in _items:
+            self._move(path, os.path.join(live, name))
+
+    def rollback(self):
+        """
+        Removing the staging folders and anything still in them.
+        """
+        for location, root in self._roots.items():
+            shutil.rmtree(root, ignore_errors=True)
+            try:
+                # only removed once no other run is staging to the location
+                os.rmdir(os.path.join(location, STAGING_FOLDER))
+            except OSError:
+                pass
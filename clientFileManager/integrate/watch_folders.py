@@ -0,0 +1,373 @@
+################################################################################
+## Client File Manager TOOL - Ingesting client files into a production pipeline
+##  with tracking, logging and configuration overrides.
+##
+## File : watch_folders.py
+## Description : Watching client drop folders for new deliveries.
+##      Changes are picked up with inotify on Linux, or by polling anywhere
+##      else, and a delivery is only handed on once it has stopped changing.
+##
+## Created by: Kieran Knight
+## Email: kieransknight@gmail.com
+##
+################################################################################
+
+# Python Modules
+import os
+import re
+import sys
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+
+# files still being written by the common transfer tools
+_PARTIAL_SUFFIXES = ('.part', '.partial', '.tmp', '.crdownload', '.filepart', '.aspx', '~')
+# rsync writes to .{name}.{6 random characters} and renames it once done
+_RSYNC_TEMPORARY = re.compile(r'^\..+\.[A-Za-z0-9]{6}$')
+
+
+def is_partial(name):
+    """
+    Checking whether a file name looks like a transfer in progress,
+    ie. the temporary files rsync and Aspera write to.
+    """
+    return name.lower().endswith(_PARTIAL_SUFFIXES) or bool(_RSYNC_TEMPORARY.match(name))
+
+
+def is_hidden(name):
+    """
+    Checking whether a file is hidden, ie. .DS_Store, which doesn't hold a
+    delivery back or count as one.
+    """
+    return name.startswith('.')
+
+
+def snapshot(path):
+    """
+    Taking the size and modified time of everything in a delivery.
+
+    Args:
+        path (str): The delivery file or folder.
+
+    Returns:
+        dict: File paths mapped to their (size, mtime), or None if the
+            delivery is still being transferred.
+    """
+    _snapshot = {}
+    if os.path.isfile(path):
+        _stat = os.stat(path)
+        return {path: (_stat.st_size, _stat.st_mtime)}
+    for folder, _, files in os.walk(path):
+        for name in files:
+            if is_partial(name):
+                return None
+            if is_hidden(name):
+                continue
+            _file = os.path.join(folder, name)
+            try:
+                _stat = os.stat(_file)
+            except OSError:
+                # removed while walking, the next snapshot will differ anyway
+                return None
+            _snapshot[_file] = (_stat.st_size, _stat.st_mtime)
+    return _snapshot
+
+
+class PollingBackend(object):
+    """
+    Finding changed deliveries by comparing a listing of each drop folder.
+    Only the top level of each delivery is compared here, the delivery
+    itself is checked in full before it is handed on.
+    """
+    # changes deep inside a delivery aren't seen
+    recursive = False
+
+    def __init__(self, folders, interval=5.0):
+        super(PollingBackend, self).__init__()
+        self._folders = folders
+        self._interval = interval
+        self._listing = {}
+        self._last_poll = 0
+
+    def _list(self, folder):
+        _listing = {}
+        try:
+            for entry in os.scandir(folder):
+                if is_partial(entry.name) or is_hidden(entry.name):
+                    continue
+                _stat = entry.stat()
+                _listing[entry.path] = (_stat.st_size, _stat.st_mtime)
+                if entry.is_dir():
+                    # files written inside a delivery folder update its mtime
+                    for sub in os.scandir(entry.path):
+                        _sub = sub.stat()
+                        _listing[sub.path] = (_sub.st_size, _sub.st_mtime)
+        except OSError:
+            pass
+        return _listing
+
+    def changes(self, timeout):
+        """
+        Waiting for changes in the drop folders.
+
+        Args:
+            timeout (float): The longest to wait in seconds.
+
+        Returns:
+            set: The paths that changed.
+        """
+        time.sleep(timeout)
+        if time.time() - self._last_poll < self._interval:
+            return set()
+        self._last_poll = time.time()
+        _changed = set()
+        for folder in self._folders:
+            _listing = self._list(folder)
+            _previous = self._listing.get(folder, {})
+            _changed.update(
+                path for path in set(_listing) | set(_previous)
+                if _listing.get(path) != _previous.get(path)
+            )
+            self._listing[folder] = _listing
+        return _changed
+
+    def close(self):
+        pass
+
+
+class InotifyBackend(object):
+    """
+    Finding changed deliveries with inotify, so nothing is read from the
+    drop folders until something has actually changed in them.
+    Every folder below a drop folder is watched, new folders are
+    watched as soon as they are created.
+
+    Raises:
+        OSError: If inotify isn't available.
+    """
+    recursive = True
+    _IN_MODIFY = 0x00000002
+    _IN_CLOSE_WRITE = 0x00000008
+    _IN_MOVED_FROM = 0x00000040
+    _IN_MOVED_TO = 0x00000080
+    _IN_CREATE = 0x00000100
+    _IN_DELETE = 0x00000200
+    _IN_Q_OVERFLOW = 0x00004000
+    _IN_ISDIR = 0x40000000
+    _IN_NONBLOCK = 0o4000
+    _MASK = _IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+    _EVENT = struct.Struct('iIII')
+
+    def __init__(self, folders):
+        super(InotifyBackend, self).__init__()
+        if not sys.platform.startswith('linux'):
+            raise OSError(errno.ENOSYS, 'inotify is only available on Linux')
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self._fd = self._libc.inotify_init1(self._IN_NONBLOCK)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self._folders = folders
+        self._watches = {}
+        for folder in folders:
+            self._watch_tree(folder)
+
+    def _watch(self, folder):
+        _wd = self._libc.inotify_add_watch(self._fd, os.fsencode(folder), self._MASK)
+        if _wd < 0:
+            # usually the watch limit, raise fs.inotify.max_user_watches
+            raise OSError(ctypes.get_errno(), 'inotify_add_watch failed for {}'.format(folder))
+        self._watches[_wd] = folder
+
+    def _watch_tree(self, folder):
+        for _folder, _, _ in os.walk(folder):
+            self._watch(_folder)
+
+    def changes(self, timeout):
+        """
+        Waiting for changes in the drop folders.
+
+        Args:
+            timeout (float): The longest to wait in seconds.
+
+        Returns:
+            set: The paths that changed.
+        """
+        if not select.select([self._fd], [], [], timeout)[0]:
+            return set()
+        try:
+            _data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+        _changed = set()
+        _offset = 0
+        while _offset < len(_data):
+            _wd, _mask, _, _length = self._EVENT.unpack_from(_data, _offset)
+            _offset += self._EVENT.size
+            _name = os.fsdecode(_data[_offset:_offset + _length].rstrip(b'\0'))
+            _offset += _length
+            if _mask & self._IN_Q_OVERFLOW:
+                # events were dropped, treat every drop folder as changed
+                _changed.update(self._folders)
+                continue
+            _folder = self._watches.get(_wd)
+            if _folder is None:
+                continue
+            _path = os.path.join(_folder, _name) if _name else _folder
+            if _mask & self._IN_ISDIR and _mask & (self._IN_CREATE | self._IN_MOVED_TO):
+                try:
+                    self._watch_tree(_path)
+                except OSError:
+                    pass
+            _changed.add(_path)
+        return _changed
+
+    def close(self):
+        os.close(self._fd)
+
+
+class DeliveryWatcher(object):
+    """
+    Watching drop folders and handing on each delivery once it is complete.
+
+    Every file or folder directly inside a drop folder is a delivery.
+    Bursts of changes are debounced, then the delivery is snapshotted until
+    the size and modified time of every file stays the same for the settle
+    time, so partly transferred deliveries are never integrated.
+    A delivery is only walked again once something changed in it, as inotify
+    sees every change, and once more to confirm it when the settle time is
+    up. When polling, which only sees the top of a delivery, it is walked
+    again less and less often until the settle time is up.
+
+    Args:
+        folders (list): The drop folders to watch.
+        on_delivery (callable): Called with the path of each complete delivery.
+        debounce (float): Seconds without changes before a delivery is checked.
+        settle (float): Seconds a delivery has to stay unchanged.
+        poll_interval (float): Seconds between listings when inotify isn't available.
+        logger (BaseLogger): The logger watching is reported to.
+    """
+    def __init__(self, folders, on_delivery, debounce=2.0, settle=30.0, poll_interval=5.0, logger=None):
+        super(DeliveryWatcher, self).__init__()
+        self._folders = [os.path.abspath(folder) for folder in folders]
+        self._on_delivery = on_delivery
+        self._debounce = debounce
+        self._settle = settle
+        self._logger = logger
+        # delivery mapped to [last change, snapshot, time of snapshot, time of next walk]
+        self._pending = {}
+        self._running = False
+        try:
+            self._backend = InotifyBackend(self._folders)
+        except OSError as error:
+            self._log('Watching by polling every {}s - {}'.format(poll_interval, error))
+            self._backend = PollingBackend(self._folders, interval=poll_interval)
+
+    @property
+    def pending(self):
+        return list(self._pending)
+
+    def _log(self, msg):
+        if self._logger:
+            self._logger.info(msg)
+
+    def delivery_for(self, path):
+        """
+        Getting the delivery a changed path belongs to.
+
+        Args:
+            path (str): The changed path.
+
+        Returns:
+            str: The delivery path, or None if the path is a drop folder itself.
+        """
+        for folder in self._folders:
+            if path != folder and path.startswith(folder + os.sep):
+                return os.path.join(folder, os.path.relpath(path, folder).split(os.sep)[0])
+        return None
+
+    def scan(self):
+        """
+        Queuing everything already in the drop folders to be checked.
+        """
+        for folder in self._folders:
+            for name in os.listdir(folder):
+                if not is_partial(name) and not is_hidden(name):
+                    self._pending[os.path.join(folder, name)] = [time.time(), None, 0, 0]
+
+    def _changed(self, paths):
+        _now = time.time()
+        for path in paths:
+            if path in self._folders:
+                self.scan()
+                continue
+            _delivery = self.delivery_for(path)
+            _name = os.path.basename(_delivery or '')
+            if _delivery is None or is_partial(_name) or is_hidden(_name):
+                continue
+            _pending = self._pending.setdefault(_delivery, [_now, None, 0, 0])
+            _pending[0] = _now
+
+    def _check(self):
+        """
+        Checking every pending delivery that has been quiet for the debounce
+        time, and handing on the ones that have settled.
+        """
+        _now = time.time()
+        for delivery, pending in list(self._pending.items()):
+            _last_change, _snapshot, _taken, _next_walk = pending
+            if _now - _last_change < self._debounce:
+                continue
+            # nothing has changed since the last walk
+            if _taken and _last_change < _taken and _now < _next_walk:
+                continue
+            if not os.path.exists(delivery):
+                del self._pending[delivery]
+                continue
+            _current = snapshot(delivery)
+            if _current is None or _current != _snapshot:
+                _wait = self._settle if self._backend.recursive else self._debounce
+                pending[1:] = [_current, _now, _now + _wait]
+                continue
+            if _now - _taken < self._settle:
+                # backing off, twice as long since the delivery last changed
+                pending[3] = min(_taken + self._settle, _now + (_now - _taken))
+                continue
+            del self._pending[delivery]
+            if not _current:
+                continue
+            self._log('Delivery complete - {} ({} files)'.format(delivery, len(_current)))
+            try:
+                self._on_delivery(delivery)
+            except Exception as error:
+                # a single bad delivery shouldn't stop the watcher
+                if self._logger:
+                    self._logger.error('Failed to integrate {} - {}'.format(delivery, error))
+
+    def run_once(self, timeout=1.0):
+        """
+        Waiting for changes once and checking the pending deliveries.
+
+        Args:
+            timeout (float): The longest to wait for changes in seconds.
+        """
+        self._changed(self._backend.changes(timeout))
+        self._check()
+
+    def run(self):
+        """
+        Watching until stopped, every existing delivery is checked first.
+        """
+        self._running = True
+        self.scan()
+        self._log('Watching {}'.format(', '.join(self._folders)))
+        try:
+            while self._running:
+                self.run_once()
+        finally:
+            self._backend.close()
+
+    def stop(self):
+        self._running = False
@@ -0,0 +1,505 @@
+################################################################################
+## Client File Manager TOOL - Ingesting client files into a production pipeline
+##  with tracking, logging and configuration overrides.
+##
+## File : launch_cli.py
+## Description : Running the tool without the UI. Client files and folders
+##      are configured and integrated with the same settings as the UI.
+##
+## Created by: Kieran Knight
+## Email: kieransknight@gmail.com
+##
+################################################################################
+
+# Python Modules
+import os
+import sys
+import time
+import argparse
+
+# Application
+from configuration.configure import IntegrateConfigure, ConfigureFiles
+from configuration.header_probe import probe_files
+from integrate.integrate_files import IntegrateFiles
+from integrate.integrate_jobs import IntegrateEntry
+from integrate.watch_folders import DeliveryWatcher
+from integrate.service_client import ServiceClient
+from integrate.integration_service import IntegrationService
+from integrate.integrity_scrub import IntegrityScrub
+from logger.application_logging import IntegrateLogger
+from logger.integration_catalog import IntegrationCatalog
+from logger.disk_usage import DiskUsage
+from logger.log_archive import LogArchive
+from ui_items.custom_tree_widget import CustomTreeItem
+from utils import format_size
+
+
+def configure_files(path):
+    """
+    Configuring a client file, folder or archive the same way the UI does.
+
+    Args:
+        path (str): The client file or folder.
+
+    Returns:
+        ConfigureFiles: The configured files.
+    """
+    if os.path.isdir(path):
+        _files = ConfigureFiles(folder=path)
+        _files.folder_files(path)
+    else:
+        _files = ConfigureFiles(folder=os.path.dirname(path))
+        _files.single_file(path)
+    return _files
+
+
+def service_client(configuration, required=False):
+    """
+    Getting the integration service client.
+
+    Args:
+        configuration (IntegrateConfigure): The configuration.
+        required (bool): Whether the service was asked for, rather than turned on in the configuration.
+
+    Returns:
+        ServiceClient: The client, or None to integrate locally.
+    """
+    if not required and not configuration.service['enabled']:
+        return None
+    _client = ServiceClient.from_configuration(configuration.service)
+    if _client.available():
+        return _client
+    if required:
+        raise SystemExit('The integration service at {} is not running'.format(_client.url))
+    configuration.logger.warning('The integration service at {} is not running, integrating locally.'.format(_client.url))
+    return None
+
+
+def integrate_path(
+    configuration, path, sequence=None, shot=None, option=None, skip_integrated=False, service=None, priority=0
+    ):
+    """
+    Integrating a client file or folder. Sequence and shot are matched
+    against the existing ones, or guessed, from each filename unless they
+    are passed in.
+
+    Args:
+        configuration (IntegrateConfigure): The configuration to integrate with.
+        path (str): The client file, folder or archive.
+        sequence (str): The sequence for every file.
+        shot (str): The shot for every file.
+        option (str): The option folder for every file, suggested from the header
+            of each file, or Plate, when None.
+        skip_integrated (bool): Skip files the catalog has already integrated unchanged.
+        service (ServiceClient): Hands the files to the integration service when passed.
+        priority (int): The priority of the plan on the integration service.
+
+    Returns:
+        int: The exit code, 1 if any file failed.
+    """
+    _files = configure_files(path)
+    if not (sequence and shot):
+        _threshold = configuration.shot_matching['threshold']
+        _unsure = [
+            (contents, match) for contents, match in zip(_files.files, configuration.match_shots(_files))
+            if (match.sequence or match.shot) and match.confidence < _threshold
+        ]
+        for contents, match in _unsure:
+            configuration.logger.info('{} matched to {}/{} with {:.0%} confidence'.format(
+                contents.filename, contents.sequence, contents.shot, match.confidence))
+        if _unsure:
+            configuration.logger.warning('{} client files were matched to existing shots with low confidence'.format(
+                len(_unsure)))
+    if configuration.duplicates['detect']:
+        _files.find_duplicates(workers=configuration.duplicates['workers'])
+    _contents = _files.files
+    if skip_integrated and configuration.catalog['enabled']:
+        with IntegrationCatalog(configuration.catalog['location']) as _catalog:
+            # only the files of a delivery integrated before can be in the catalog
+            _delivered = {
+                delivery for delivery in {contents.delivery for contents in _contents}
+                if _catalog.is_delivered(delivery)
+            }
+            _contents = [
+                contents for contents in _contents
+                if contents.delivery not in _delivered or not is_integrated(_catalog, contents)
+            ]
+        if len(_contents) < len(_files.files):
+            configuration.logger.info('Skipping {} files that have already been integrated'.format(
+                len(_files.files) - len(_contents)))
+    _options = {}
+    if option is None and configuration.header_probe['enabled'] and configuration.header_probe['suggestOption']:
+        _settings = configuration.header_probe
+        _options = {
+            file_path: info.option for file_path, info in probe_files(
+                [contents.file_path for contents in _contents if not contents.archive],
+                _settings['cache'],
+                _settings['workers']
+            )
+            if info is not None and info.option
+        }
+    entries = [
+        IntegrateEntry(
+            contents,
+            configuration.output_location,
+            sequence or contents.sequence,
+            shot or contents.shot,
+            option or _options.get(contents.file_path, 'Plate')
+        )
+        for contents in _contents
+    ]
+    if not entries:
+        configuration.logger.warning('No Client Files have been found in {}'.format(path))
+        return 1
+
+    _integrate = IntegrateFiles(
+        None,
+        0,
+        app_logging=configuration.logger,
+        save_logging=IntegrateLogger(
+            configuration.logging_location, rotation=configuration.log_rotation
+        ) if configuration.logging_option else False,
+        configuration=configuration,
+        entries=entries,
+        service=service,
+        priority=priority
+    )
+    return 1 if _integrate.failed else 0
+
+
+def is_integrated(catalog, contents):
+    """
+    Checking the catalog for a client file that has already been integrated unchanged.
+    Archive members are always integrated.
+
+    Args:
+        catalog (IntegrationCatalog): The catalog of integrated files.
+        contents (ConfigureFilesData): The client file.
+
+    Returns:
+        bool: True if the file can be skipped.
+    """
+    if contents.is_archive_member:
+        return False
+    try:
+        _stat = os.stat(contents.file_path)
+    except OSError:
+        return False
+    return catalog.is_integrated(contents.file_path, _stat.st_size, _stat.st_mtime)
+
+
+def integrate(args):
+    """
+    Integrating a client file or folder from the command line.
+
+    Returns:
+        int: The exit code, 1 if any file failed.
+    """
+    configuration = IntegrateConfigure()
+    if args.output:
+        configuration.output_location = args.output
+        # the shots matched against and the disk usage are of the new output location
+        configuration.get_seq_shot_folders()
+    if args.staged:
+        configuration.staged_publish['enabled'] = True
+    return integrate_path(
+        configuration, args.path, args.sequence, args.shot, args.option,
+        service=service_client(configuration, required=args.service),
+        priority=args.priority
+    )
+
+
+def watch(args):
+    """
+    Watching the drop folders and integrating each delivery once it
+    has finished arriving. Files the catalog has already integrated are skipped,
+    so a delivery that is added to later only integrates the new files.
+    Runs until interrupted.
+
+    Returns:
+        int: The exit code.
+    """
+    configuration = IntegrateConfigure()
+    if args.output:
+        configuration.output_location = args.output
+        # the shots matched against and the disk usage are of the new output location
+        configuration.get_seq_shot_folders()
+    _settings = configuration.watch_folders
+    _folders = args.folders or _settings['folders']
+    if not _folders:
+        configuration.logger.error('No drop folders to watch, pass them in or set watchFolders in the configuration')
+        return 1
+
+    _watcher = DeliveryWatcher(
+        _folders,
+        lambda path: integrate_path(
+            configuration, path,
+            option=args.option or _settings['option'],
+            skip_integrated=True,
+            service=service_client(configuration)
+        ),
+        debounce=_settings['debounce'],
+        settle=_settings['settle'],
+        poll_interval=_settings['pollInterval'],
+        logger=configuration.logger
+    )
+    try:
+        _watcher.run()
+    except KeyboardInterrupt:
+        configuration.logger.info('Stopped watching')
+    return 0
+
+
+def serve(args):
+    """
+    Running the integration service until interrupted.
+    Every plan submitted is integrated with this configuration.
+
+    Returns:
+        int: The exit code.
+    """
+    configuration = IntegrateConfigure()
+    try:
+        _service = IntegrationService(
+            configuration,
+            host=args.bind or configuration.service['bind'],
+            port=args.port or configuration.service['port'],
+            queue_location=configuration.service['queue'],
+            token=configuration.service['token']
+        )
+    except ValueError as error:
+        raise SystemExit(str(error))
+    try:
+        _service.serve_forever()
+    except KeyboardInterrupt:
+        configuration.logger.info('Stopped the integration service')
+    return 0
+
+
+def scrub(args):
+    """
+    Scrubbing the output location against the hashes recorded in the catalog.
+    Every file that isn't as it was integrated is printed with its status.
+    An interrupted scrub is carried on by the next one unless restarted.
+
+    Returns:
+        int: The exit code, 1 if any file is missing, modified or unexpected.
+    """
+    configuration = IntegrateConfigure()
+    _settings = configuration.scrub
+    _scrub = IntegrityScrub(
+        configuration.catalog['location'],
+        args.output or configuration.output_location,
+        rate=_settings['rate'] if args.rate is None else args.rate,
+        workers=_settings['workers'],
+        batch_size=configuration.catalog['batchSize'],
+        logger=configuration.logger
+    )
+    try:
+        _report = _scrub.run(resume=not args.restart)
+    except KeyboardInterrupt:
+        configuration.logger.info('Stopped scrubbing, run scrub again to carry on')
+        return 1
+    for status, files in _report.problems.items():
+        [print('{}\t{}'.format(status, path)) for path in files]
+    return 1 if _report.problems else 0
+
+
+def probe(args):
+    """
+    Printing what is in the header of every client file, and the option it
+    suggests, as tab separated columns. Files that are already in the
+    header cache aren't read again.
+
+    Returns:
+        int: The exit code, 1 if no file could be probed.
+    """
+    configuration = IntegrateConfigure()
+    _settings = configuration.header_probe
+    _paths = [contents.file_path for contents in configure_files(args.path).files if not contents.archive]
+    _found = 0
+    for path, info in probe_files(_paths, None if args.no_cache else _settings['cache'], _settings['workers']):
+        if info is None:
+            print('{}\t\tunknown'.format(path))
+            continue
+        _found += 1
+        print('{}\t{}\t{}'.format(path, info.option or '', info.summary))
+    return 0 if _found else 1
+
+
+def usage(args):
+    """
+    Printing the disk usage of the output location by sequence, or by shot
+    and option for a single sequence, from the counters in the catalog.
+    The output location is crawled first if the counters are due to be
+    corrected or --reconcile is passed.
+
+    Returns:
+        int: The exit code, 1 if nothing is recorded.
+    """
+    configuration = IntegrateConfigure()
+    _settings = configuration.disk_usage_settings
+    _location = args.output or configuration.output_location
+    with DiskUsage(configuration.catalog['location']) as _usage:
+        if args.reconcile or _usage.is_stale(_location, _settings['reconcileHours']):
+            configuration.logger.info('Crawling {} for its disk usage'.format(_location))
+            _totals = _usage.reconcile(_location, workers=_settings['workers'])
+        else:
+            _totals = _usage.totals(_location)
+    if args.sequence:
+        for shot in _totals.shots(args.sequence):
+            for option, (_bytes, _files) in sorted(_totals.options(args.sequence, shot).items()):
+                print('{}\t{}\t{}\t{}\t{}'.format(args.sequence, shot, option, format_size(_bytes), _files))
+        _bytes, _files = _totals.sequence(args.sequence)
+    else:
+        for sequence in _totals.sequences:
+            _bytes, _files = _totals.sequence(sequence)
+            print('{}\t{}\t{}'.format(sequence, format_size(_bytes), _files))
+        _bytes, _files = _totals.total
+    print('Total\t{}\t{}'.format(format_size(_bytes), _files))
+    return 0 if _files else 1
+
+
+def catalog(args):
+    """
+    Searching the catalog of integrated files. Every row found is printed
+    as tab separated columns.
+
+    Returns:
+        int: The exit code, 1 if nothing was found.
+    """
+    configuration = IntegrateConfigure()
+    with IntegrationCatalog(configuration.catalog['location']) as _catalog:
+        if args.source:
+            rows = _catalog.find_source(os.path.abspath(args.source))
+        elif args.destination:
+            rows = _catalog.find_destination(os.path.abspath(args.destination))
+        elif args.hash:
+            rows = _catalog.find_hash(args.hash)
+        elif args.delivery:
+            rows = _catalog.find_delivery(os.path.abspath(args.delivery))
+        elif args.run_id:
+            rows = _catalog.find_run(args.run_id)
+        else:
+            rows = _catalog.find_shot(args.sequence, args.shot)
+    for row in rows:
+        print('\t'.join(str(row[column]) for column in args.columns.split(',')))
+    return 0 if rows else 1
+
+
+def logs(args):
+    """
+    Searching the integration logs for every run that touched a file, a
+    hash or a shot, from the index kept next to the logs. Each line found
+    is printed as tab separated columns, or as it was logged with --show.
+
+    Returns:
+        int: The exit code, 1 if nothing was found.
+    """
+    configuration = IntegrateConfigure()
+    with LogArchive(args.logging or configuration.logging_location) as _archive:
+        _archive.index()
+        rows = _archive.search(
+            path=os.path.abspath(args.file) if args.file else None,
+            file_hash=args.hash,
+            sequence=args.sequence,
+            shot=args.shot
+        )
+        for row in rows:
+            _started = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(row['started']))
+            if args.show:
+                print('{}\t{}'.format(_started, _archive.read_line(row)))
+            else:
+                print('\t'.join(
+                    [_started, row['file'], row['status'], row['source'], row['destination'] or '']))
+    return 0 if rows else 1
+
+
+def build_parser():
+    """
+    Building the command line parser, each command is a sub parser
+    with the function it runs set as its default.
+
+    Returns:
+        argparse.ArgumentParser: The parser.
+    """
+    parser = argparse.ArgumentParser(description='Client File Manager - command line.')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    _integrate = commands.add_parser('integrate', help='Integrate a client file, folder or archive.')
+    _integrate.add_argument('path', help='The client file, folder or archive.')
+    _integrate.add_argument('--sequence', help='The sequence for every file, guessed from the filename by default.')
+    _integrate.add_argument('--shot', help='The shot for every file, guessed from the filename by default.')
+    _integrate.add_argument(
+        '--option', choices=CustomTreeItem._OPTIONS[:-1],
+        help='The option for every file, suggested from the header of each file by default.')
+    _integrate.add_argument('--output', help='Overrides the configured output location.')
+    _integrate.add_argument(
+        '--staged', action='store_true', help='Publish every file at once, or none if any fail, see stagedPublish.')
+    _integrate.add_argument('--service', action='store_true', help='Hand the files to the integration service.')
+    _integrate.add_argument('--priority', type=int, default=0, help='The plan priority on the integration service.')
+    _integrate.set_defaults(run=integrate)
+
+    _watch = commands.add_parser('watch', help='Integrate deliveries as they arrive in drop folders.')
+    _watch.add_argument('folders', nargs='*', help='The drop folders, watchFolders from the configuration by default.')
+    _watch.add_argument('--option', choices=CustomTreeItem._OPTIONS[:-1])
+    _watch.add_argument('--output', help='Overrides the configured output location.')
+    _watch.set_defaults(run=watch)
+
+    _serve = commands.add_parser('serve', help='Run the integration service shared by every workstation.')
+    _serve.add_argument('--bind', help='Overrides the configured address to listen on.')
+    _serve.add_argument('--port', type=int, help='Overrides the configured port.')
+    _serve.set_defaults(run=serve)
+
+    _scrub = commands.add_parser('scrub', help='Check the output location against the hashes in the catalog.')
+    _scrub.add_argument('--output', help='The folder to scrub, the configured output location by default.')
+    _scrub.add_argument('--rate', type=float, help='Overrides the configured MB read per second, 0 for no limit.')
+    _scrub.add_argument('--restart', action='store_true', help='Start again rather than carrying on the last scrub.')
+    _scrub.set_defaults(run=scrub)
+
+    _probe = commands.add_parser('probe', help='Show the headers of a client file or folder.')
+    _probe.add_argument('path', help='The client file or folder.')
+    _probe.add_argument('--no-cache', action='store_true', help='Read every header again.')
+    _probe.set_defaults(run=probe)
+
+    _usage = commands.add_parser('usage', help='Show the disk usage of the output location.')
+    _usage.add_argument('--output', help='The folder to show, the configured output location by default.')
+    _usage.add_argument('--sequence', help='Break a single sequence down by shot and option.')
+    _usage.add_argument('--reconcile', action='store_true', help='Crawl the folder to correct the usage first.')
+    _usage.set_defaults(run=usage)
+
+    _catalog = commands.add_parser('catalog', help='Search the catalog of integrated files.')
+    _search = _catalog.add_mutually_exclusive_group(required=True)
+    _search.add_argument('--source', help='Where a client file was integrated to.')
+    _search.add_argument('--destination', help='The client file an integrated file came from.')
+    _search.add_argument('--hash', help='Every integrated file with the same contents.')
+    _search.add_argument('--delivery', help='Every file integrated from a client folder.')
+    _search.add_argument('--run', dest='run_id', help='Every file integrated in a single run.')
+    _search.add_argument('--sequence', help='Every file integrated to a sequence.')
+    _catalog.add_argument('--shot', help='Narrows a --sequence search down to a single shot.')
+    _catalog.add_argument(
+        '--columns', default='integrated,source,destination,size,hash',
+        help='Comma separated columns to print.')
+    _catalog.set_defaults(run=catalog)
+
+    _logs = commands.add_parser('logs', help='Find the runs that touched a file, hash or shot in the integration logs.')
+    _search = _logs.add_mutually_exclusive_group(required=True)
+    _search.add_argument('--file', help='A client file or integrated file.')
+    _search.add_argument('--hash', help='Every file with the same contents.')
+    _search.add_argument('--sequence', help='Every file integrated to a sequence.')
+    _logs.add_argument('--shot', help='Narrows a --sequence search down to a single shot.')
+    _logs.add_argument('--logging', help='The logging location, the configured one by default.')
+    _logs.add_argument('--show', action='store_true', help='Print each line as it was logged.')
+    _logs.set_defaults(run=logs)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.run(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -13,31 +13,41 @@
 # Python Modules
 import os
 import sys
+import sqlite3
+import threading
 
 # Application - ui_items
 from configuration.configure import ConfigureFiles
+from configuration.session_files import read_session, write_session
 from third_party.Qt import QtWidgets, QtCore, QtGui
 from integrate.integrate_files import IntegrateFiles
+from integrate.service_client import ServiceClient
+from integrate.integrity_scrub import IntegrityScrub
 from ui_items.custom_tree_widget import CustomTreeWidget
+from ui_items.ui_watchdog import UIWatchdog
 from logger.application_logging import IntegrateLogger
-from paths import _USER_DOCUMENTS
+from paths import _USER_DOCUMENTS, _SESSIONS
 from ui_items.add_widgets import (
     GroupWidgets, 
     AddClientItemsButtons, 
     AddIntegrateButton, 
+    AddFilterWidgets,
     AddConfigurationWidgets,
     AddSaveConfigurationWidget
 )
 from utils import (
     open_file, 
     open_folder, 
+    save_file,
     write_json, 
     read_css, 
+    format_size,
     _DEFAULT_CONFIG
 )
 
 class ClientFileManager(QtWidgets.QMainWindow):
     _OBJ_NAME = 'Client File Manager'
+    _SESSION_FILTER = 'Client File Manager Sessions (*.cfmsession)'
     def __init__(self, parent=None):
         super(ClientFileManager, self).__init__(parent=parent)
 
@@ -55,7 +65,8 @@ class ClientFileManager(QtWidgets.QMainWindow):
         
         # Creating the tree widget
         self.tree_widget = CustomTreeWidget(parent=self.centralwidget)
-        self.tree_grp = GroupWidgets([self.tree_widget], 'Client Files')
+        self.filter_widgets = AddFilterWidgets(parent=self.centralwidget)
+        self.tree_grp = GroupWidgets([self.filter_widgets, self.tree_widget], 'Client Files')
 
         # Add Buttons to add or remove files/Folders
         self.client_buttons = AddClientItemsButtons(parent=self.centralwidget)
@@ -73,7 +84,40 @@ class ClientFileManager(QtWidgets.QMainWindow):
         
         self.setCentralWidget(self.centralwidget)
 
+        # the scrub runs in the background, its progress is checked every second
+        self._scrub = None
+        self._scrub_result = []
+        self._scrub_timer = QtCore.QTimer(self)
+        self._scrub_timer.setInterval(1000)
+        self._scrub_timer.timeout.connect(self.update_scrub_progress)
+
+        # the event loop is timed from the start, the stalls are reported when the UI is closed
+        _watchdog_settings = self.configuration_widgets.add_configuration.ui_watchdog
+        self._watchdog = UIWatchdog.from_configuration(_watchdog_settings)
+        if _watchdog_settings['enabled']:
+            self._watchdog.start()
+
         self.build_connections()
+        self.reconcile_disk_usage()
+
+    @property
+    def watchdog(self):
+        return self._watchdog
+
+    def closeEvent(self, event):
+        """
+        Writing the stalls of the UI to the logging location when it is closed,
+        if any were long enough to have their stack captured.
+        """
+        if self._watchdog.running:
+            self._watchdog.stop()
+            if self._watchdog.report()['slowest']:
+                try:
+                    _report = self._watchdog.write_report(self.configuration_widgets.add_configuration.logging_location)
+                    self.configuration_widgets.logger.info('The UI stalls were reported in {}'.format(_report))
+                except OSError as error:
+                    self.configuration_widgets.logger.warning('Failed to report the UI stalls - {}'.format(error))
+        super(ClientFileManager, self).closeEvent(event)
     
     def build_connections(self):
         """
@@ -85,7 +129,12 @@ class ClientFileManager(QtWidgets.QMainWindow):
         self.client_buttons.add_file_btn.clicked.connect(self.open_file)
         self.client_buttons.add_folder_btn.clicked.connect(self.open_folder)
         self.client_buttons.remove_btn.clicked.connect(self.remove_selected)
+        self.client_buttons.save_session_btn.clicked.connect(self.save_session)
+        self.client_buttons.load_session_btn.clicked.connect(self.load_session)
+        self.filter_widgets.filter_edit.textChanged.connect(self.filter_client_files)
+        self.filter_widgets.filter_set_btn.clicked.connect(self.set_filtered_option)
         self.integrate_buttons.integrate_btn.clicked.connect(self.integrate_client_files)
+        self.integrate_buttons.scrub_btn.clicked.connect(self.scrub_output_location)
 
     def change_integrate_location(self):
         """
@@ -110,6 +159,26 @@ class ClientFileManager(QtWidgets.QMainWindow):
         # Updating all of the sequence and shot widgets with the new top and sub
         # folders found from the new selected folder
         self.configuration_widgets.add_configuration.update_all_items(root)
+
+    def reconcile_disk_usage(self):
+        """
+        Crawling the output location in the background when its disk usage
+        is due to be corrected. Client files added once it has finished show
+        the corrected usage.
+        """
+        _configuration = self.configuration_widgets.add_configuration
+        _logger = self.configuration_widgets.logger
+
+        def _reconcile():
+            try:
+                if _configuration.reconcile_disk_usage():
+                    _logger.info('Disk usage of {} updated - {} in {} files'.format(
+                        _configuration.output_location,
+                        format_size(_configuration.disk_usage.total[0]),
+                        _configuration.disk_usage.total[1]))
+            except (OSError, sqlite3.Error) as error:
+                _logger.warning('Failed to update the disk usage - {}'.format(error))
+        threading.Thread(target=_reconcile, name='disk-usage', daemon=True).start()
         
     def change_logging_location(self):
         """
@@ -134,11 +203,13 @@ class ClientFileManager(QtWidgets.QMainWindow):
         """
         _logging_location = self.configuration_widgets.logging_location_label.text().replace('Logging Location: ', '')
         _output_location = self.configuration_widgets.integrate_location_label.text().replace('Output Location: ', '')
-        _DEFAULT_CONFIG = {
+        # keeping any settings that aren't edited through the UI
+        _DEFAULT_CONFIG = dict(self.configuration_widgets.add_configuration.configuration)
+        _DEFAULT_CONFIG.update({
             'loggingLocation': self.configuration_widgets.logging_location_label.text().replace('Logging Location: ', ''),
             'outputLocation': self.configuration_widgets.integrate_location_label.text().replace('Output Location: ', ''),
             'loggingStatus': 'True' if self.configuration_widgets.logging_status_checkBox.isChecked() else 'False'
-        }
+        })
 
         write_json(_DEFAULT_CONFIG)
 
@@ -154,8 +225,10 @@ class ClientFileManager(QtWidgets.QMainWindow):
         # Passing the selected item to the configure module to be processed
         _configure_object = ConfigureFiles(folder=os.path.dirname(selected_file))
         _configure_object.single_file(selected_file)
+        self.match_shots(_configure_object)
         # Adding the file
         self.tree_widget.add_items(_configure_object, self.configuration_widgets)
+        self.filter_client_files()
 
     def open_folder(self):
         """
@@ -166,11 +239,55 @@ class ClientFileManager(QtWidgets.QMainWindow):
             self.configuration_widgets.logger.warning('No Folder has been selected.')
             return
         self.configuration_widgets.logger.info('Processing Folder - {}'.format(selected_folder))
+        if self.configuration_widgets.add_configuration.client_tree['lazyFolders']:
+            # listed as each folder is expanded, duplicates can't be found up front
+            self.tree_widget.add_folder(selected_folder, self.configuration_widgets)
+            return
         # Passing the selected folder to the configure module to be processed
         _configure_object = ConfigureFiles(folder=selected_folder)
         _configure_object.folder_files(selected_folder) 
+        self.flag_duplicates(_configure_object)
+        self.match_shots(_configure_object)
         # Adding the folder
         self.tree_widget.add_items(_configure_object, self.configuration_widgets)
+        self.filter_client_files()
+
+    def flag_duplicates(self, configure_object):
+        """
+        Flagging the files the client has sent more than once,
+        if turned on in the configuration.
+
+        Args:
+            configure_object (ConfigureFiles): The files that have just been added.
+        """
+        _settings = self.configuration_widgets.add_configuration.duplicates
+        if not _settings['detect']:
+            return
+        _duplicates = configure_object.find_duplicates(workers=_settings['workers'])
+        if _duplicates:
+            self.configuration_widgets.logger.info('Found {} duplicate files in {} groups'.format(
+                sum(len(group) - 1 for group in _duplicates), len(_duplicates)))
+
+    def match_shots(self, configure_object):
+        """
+        Filling the sequence and shot of the files that have just been added
+        with the existing ones they match, if turned on in the configuration.
+        Matches below the threshold are highlighted in the tree.
+
+        Args:
+            configure_object (ConfigureFiles): The files that have just been added.
+        """
+        _configuration = self.configuration_widgets.add_configuration
+        _matches = _configuration.match_shots(configure_object)
+        if not _matches:
+            return
+        _matched = sum(1 for match in _matches if match.shot)
+        _unsure = sum(
+            1 for match in _matches
+            if (match.sequence or match.shot) and match.confidence < _configuration.shot_matching['threshold'])
+        self.configuration_widgets.logger.info(
+            'Matched {} of {} client files to existing shots, {} highlighted to check'.format(
+                _matched, len(_matches), _unsure))
 
     def remove_selected(self):
         """
@@ -179,9 +296,84 @@ class ClientFileManager(QtWidgets.QMainWindow):
         if not self.tree_widget.selectedItems():
             self.configuration_widgets.logger.warning('Nothing has been selected. Please select an item and try again.')
             return
-        _selected_items = self.tree_widget.selectedItems()
-        root = self.tree_widget.invisibleRootItem()
-        [(item.parent() or root).removeChild(item) for item in _selected_items]
+        _removed = self.tree_widget.remove_items(self.tree_widget.selectedItems())
+        self.configuration_widgets.logger.info('Removed {} client files, {} files left ({})'.format(
+            _removed, self.tree_widget.file_count, format_size(self.tree_widget.total_size)))
+        self.filter_client_files()
+
+    def save_session(self):
+        """
+        Saving the client files and the values set on them as a session,
+        so a prepared ingest can be picked up again without re-adding the files.
+        """
+        if not self.tree_widget.invisibleRootItem().childCount():
+            self.configuration_widgets.logger.warning('No Client Files have been added.')
+            return
+        selected_file = save_file(self, 'Save Session', _SESSIONS, self._SESSION_FILTER)
+        if not selected_file:
+            self.configuration_widgets.logger.warning('No file has been selected.')
+            return
+        try:
+            _count = write_session(str(selected_file), self.tree_widget.session_rows())
+        except (OSError, sqlite3.Error) as error:
+            self.configuration_widgets.logger.error('Failed to save the session - {}'.format(error))
+            return
+        self.configuration_widgets.logger.info('Saved {} rows to {}'.format(_count, selected_file))
+
+    def load_session(self):
+        """
+        Loading a saved session into the client files. The files are checked
+        in the background once the tree is built, changed files are flagged.
+        """
+        selected_file = open_file(self, 'Load Session', _SESSIONS, self._SESSION_FILTER)
+        if not selected_file:
+            self.configuration_widgets.logger.warning('No file has been selected.')
+            return
+        try:
+            _rows = read_session(str(selected_file))
+        except (ValueError, sqlite3.Error) as error:
+            self.configuration_widgets.logger.error('Failed to load {} - {}'.format(selected_file, error))
+            return
+        self.tree_widget.restore_session(_rows, self.configuration_widgets, on_validated=self.session_validated)
+        self.configuration_widgets.logger.info('Loaded {} rows from {}, {} files ({})'.format(
+            len(_rows), selected_file, self.tree_widget.file_count, format_size(self.tree_widget.total_size)))
+        self.filter_client_files()
+
+    def session_validated(self, changed):
+        """
+        Reporting the files of a loaded session that have changed on disk.
+
+        Args:
+            changed (list): The file items that are missing or have been modified.
+        """
+        if not changed:
+            self.configuration_widgets.logger.info('Every file in the session is unchanged.')
+            return
+        self.configuration_widgets.logger.warning(
+            '{} files have changed since the session was saved:'.format(len(changed)))
+        [self.configuration_widgets.logger.warning(item.item_contents.file_path) for item in changed[:20]]
+
+    def filter_client_files(self):
+        """
+        Filtering the client files by the text in the filter bar.
+        """
+        _matches = self.tree_widget.filter_items(self.filter_widgets.filter_edit.text())
+        self.filter_widgets.set_matches(_matches, self.tree_widget.file_count)
+
+    def set_filtered_option(self):
+        """
+        Setting the option of every file matching the filter.
+        """
+        _option = self.filter_widgets.filter_option.currentText()
+        _items = self.tree_widget.filtered_items
+        self.tree_widget.setUpdatesEnabled(False)
+        try:
+            [item.option.setCurrentText(_option) for item in _items]
+        finally:
+            self.tree_widget.setUpdatesEnabled(True)
+        self.configuration_widgets.logger.info('Set {} files to {}'.format(len(_items), _option))
+        # the files may no longer match, ie. when filtering by option
+        self.filter_client_files()
 
     def integrate_client_files(self):
         """
@@ -192,7 +384,8 @@ class ClientFileManager(QtWidgets.QMainWindow):
         self.configuration_widgets.logger.info('Starting to integrate client files...')
         if self.configuration_widgets.logging_status_checkBox.isChecked:
             save_integrate_logging = IntegrateLogger(
-                self.configuration_widgets.logging_location_label.text().replace('Logging Location: ', '')
+                self.configuration_widgets.logging_location_label.text().replace('Logging Location: ', ''),
+                rotation=self.configuration_widgets.add_configuration.log_rotation
             )
         else:
             save_integrate_logging = False
@@ -203,12 +396,122 @@ class ClientFileManager(QtWidgets.QMainWindow):
             self.configuration_widgets.logger.warning('No Client Files have been added.')
             return
         # Starting to process files inside the Tree Widget
-        _integrate = IntegrateFiles(
-            root, 
-            child_count, 
-            ui_main=self,
-            app_logging=self.configuration_widgets.logger,
-            save_logging=save_integrate_logging)
+        # everything that changes the tree or settings is locked while the files are copied,
+        # as the UI is kept responsive
+        self.set_controls_enabled(False)
+        try:
+            _integrate = IntegrateFiles(
+                root, 
+                child_count, 
+                ui_main=self,
+                app_logging=self.configuration_widgets.logger,
+                save_logging=save_integrate_logging,
+                configuration=self.configuration_widgets.add_configuration,
+                service=self.integration_service())
+        finally:
+            self.set_controls_enabled(True)
+        self.update_integrate_progress(_integrate.progress, _integrate.headers)
+        self.configuration_widgets.add_configuration.load_disk_usage()
+
+    def set_controls_enabled(self, enabled):
+        """
+        Turning every control that changes the client files or the settings
+        on or off, ie. while files are integrated.
+
+        Args:
+            enabled (bool): Whether the controls can be used.
+        """
+        [
+            widget.setEnabled(enabled) for widget in (
+                self.configuration_widgets_grp,
+                self.save_configuration_grp,
+                self.tree_grp,
+                self.client_buttons_grp,
+                self.integrate_buttons.integrate_btn
+            )
+        ]
+
+    def integration_service(self):
+        """
+        Getting the integration service, if it is turned on in the configuration.
+        Files are integrated locally when the service isn't running.
+
+        Returns:
+            ServiceClient: The service client, or None to integrate locally.
+        """
+        _settings = self.configuration_widgets.add_configuration.service
+        if not _settings['enabled']:
+            return None
+        _client = ServiceClient.from_configuration(_settings)
+        if not _client.available():
+            self.configuration_widgets.logger.warning(
+                'The integration service at {} is not running, integrating locally.'.format(_client.url))
+            return None
+        return _client
+
+    def scrub_output_location(self):
+        """
+        Scrubbing the output location against the catalog in the background,
+        so the tool can still be used while it runs. Clicking again stops the
+        scrub, it carries on from where it stopped next time.
+        """
+        if self._scrub is not None:
+            self._scrub.stop()
+            self.configuration_widgets.logger.info('Stopping the scrub once the files being checked are done.')
+            return
+        _configuration = self.configuration_widgets.add_configuration
+        self._scrub = IntegrityScrub(
+            _configuration.catalog['location'],
+            _configuration.output_location,
+            rate=_configuration.scrub['rate'],
+            workers=_configuration.scrub['workers'],
+            batch_size=_configuration.catalog['batchSize']
+        )
+        self._scrub_result = []
+        threading.Thread(target=self._run_scrub, name='integrity-scrub', daemon=True).start()
+        self.configuration_widgets.logger.info('Scrubbing {}'.format(_configuration.output_location))
+        self.integrate_buttons.scrub_btn.setText('Stop Scrub')
+        self._scrub_timer.start()
+
+    def _run_scrub(self):
+        # nothing here touches the UI, the result is picked up by update_scrub_progress
+        try:
+            self._scrub_result.append(self._scrub.run())
+        except (OSError, sqlite3.Error) as error:
+            self._scrub_result.append(error)
+
+    def update_scrub_progress(self):
+        """
+        Showing how far the scrub has got, and reporting the files
+        that aren't as they were integrated once it has finished.
+        """
+        if not self._scrub_result:
+            self.integrate_buttons.scrub_btn.setText('Stop Scrub ({} of {} files)'.format(
+                self._scrub.checked, self._scrub.total))
+            return
+        self._scrub_timer.stop()
+        self._scrub = None
+        self.integrate_buttons.scrub_btn.setText('Scrub Output Location')
+        _report = self._scrub_result.pop()
+        if isinstance(_report, Exception):
+            self.configuration_widgets.logger.error('Failed to scrub the output location - {}'.format(_report))
+            return
+        self.configuration_widgets.logger.info('Scrub {} - {}'.format(_report.run_id, _report.summary()))
+        for status, files in _report.problems.items():
+            [self.configuration_widgets.logger.warning('{} - {}'.format(status.capitalize(), path)) for path in files]
+
+    def update_integrate_progress(self, progress, headers):
+        """
+        Updating the progress bar and header folders while files are integrated.
+        Events are processed here so the UI keeps drawing during long integrations.
+
+        Args:
+            progress (IntegrateProgress): The progress of the running integration.
+            headers (list): The header items being integrated.
+        """
+        self.integrate_buttons.set_progress(progress)
+        [header.set_progress(progress.group_percent(header)) for header in headers]
+        QtWidgets.QApplication.processEvents()
 
 def launchUI():
     """
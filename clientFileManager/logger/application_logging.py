@@ -16,6 +16,10 @@ import os
 import time
 import logging
 
+# Application
+from utils import normalise_path
+from logger.log_archive import LogArchive, COMPLETED, FAILED, IGNORED
+
 class BaseLogger(object):
     """
     Simple base logging system.
@@ -27,6 +31,7 @@ class BaseLogger(object):
 
         stream_handler = logging.StreamHandler()
         self.logger.addHandler(stream_handler)
+        self._stream_handler = stream_handler
 
         formatter = logging.Formatter('%(asctime)s :: %(name)s :: %(levelname)s >> %(message)s')
         stream_handler.setFormatter(formatter)
@@ -61,18 +66,53 @@ class IntegrateLogger(BaseLogger):
     The integration logger. This class
     will be where the logging to the saved files run
 
+    Where each file is written in the log is kept as it is written, and
+    the log is indexed and the logging location rotated once it is closed.
+
     Args:
         BaseLogger (Class): Base logger that instantiates the logging setup
+        rotation (dict): The logRotation configuration, the log isn't indexed if None.
     """
-    def __init__(self, location, name='Integrate Logging'):
+    def __init__(self, location, name='Integrate Logging', rotation=None):
         super(IntegrateLogger, self).__init__(name)
 
-        timestr = time.strftime("%Y%m%d_%H%M%S")  # time stamp format
+        self._started = time.time()
+        timestr = time.strftime("%Y%m%d_%H%M%S", time.localtime(self._started))  # time stamp format
+        self._location = location
+        self._path = '{location}/integrateFiles_{date}.txt'.format(location=location, date=timestr)
+        self._rotation = rotation
+        self._rows = []
 
         # adding the filehandler to the logger on where the file will be placed
-        file_handler = logging.FileHandler(
-            '{location}/integrateFiles_{date}.txt'.format(location=location, date=timestr), 'w')
+        file_handler = logging.FileHandler(self._path, 'w')
         self.logger.addHandler(file_handler) 
+        self._file_handler = file_handler
+
+    @property
+    def path(self):
+        return self._path
+
+    def close(self):
+        """
+        Closing the log, then indexing it and rotating the logging location.
+        The handlers are removed so the next run doesn't write to this log too.
+
+        Returns:
+            tuple: (logs compressed, logs removed) by the rotation.
+        """
+        for handler in (self._file_handler, self._stream_handler):
+            self.logger.removeHandler(handler)
+            handler.close()
+        if not self._rotation or not self._rotation['index']:
+            return 0, 0
+        with LogArchive(self._location) as archive:
+            archive.add_log(self._path, self._started, self._rows)
+            return archive.rotate(
+                compression=self._rotation['compression'],
+                compress_after=self._rotation['compressAfterDays'],
+                delete_after=self._rotation['deleteAfterDays'],
+                max_bytes=self._rotation['maxMB'] * 1024 * 1024
+            )
 
     def completed_files(self, completed):
         """
@@ -110,25 +150,28 @@ class IntegrateLogger(BaseLogger):
         output location.
 
         Args:
-            items (list): A list of items that have either been completed, failed or ignored.
+            items (list): A list of entries that have either been completed, failed or ignored.
             method_instance (bound method): The method the processed list is coming from.
         """
         for item in items:
-            _from = item.item_contents.file_path
-            _to = os.path.join(
-                str(item.location.currentText()),
-                str(item.sequence.currentText()),
-                str(item.shot.currentText()),
-                str(item.option.currentText()),
-                str(item.filename.text())
-            )
-            if isinstance(method_instance, type(self.completed_files)):
+            _from = item.contents.file_path
+            _to = item.dst
+            # every line is flushed as it is written, so this is where the next one starts
+            _offset = self._file_handler.stream.tell()
+            if method_instance == self.completed_files:
                 self.logger.info('{start} >> Copied To >> {end}'.format(start=_from, end=_to))
+                _status = COMPLETED
             
-            elif isinstance(method_instance, type(self.failed_files)):
-                self.error.info('{start} >> Failed To Copy To >> {end}'.format(start=_from, end=_to))
+            elif method_instance == self.failed_files:
+                self.logger.error('{start} >> Failed To Copy To >> {end}'.format(start=_from, end=_to))
+                _status = FAILED
             
-            elif isinstance(method_instance, type(self.ignored_files)):
-                self.warning.info('{start} >> Was Set To Ignore and was not processed'.format(start=_from))
-        
-
+            elif method_instance == self.ignored_files:
+                self.logger.warning('{start} >> Was Set To Ignore and was not processed'.format(start=_from))
+                _status = IGNORED
+                _to = None
+            # indexed absolute, so a search finds runs made with relative paths
+            self._rows.append((
+                _status, normalise_path(_from), normalise_path(_to),
+                item.sequence, item.shot, item.contents.file_hash, _offset
+            ))
@@ -0,0 +1,352 @@
+################################################################################
+## Client File Manager TOOL - Ingesting client files into a production pipeline
+##  with tracking, logging and configuration overrides.
+##
+## File : disk_usage.py
+## Description : Bytes and files used by every sequence, shot and option of an
+##      output location. The counters are kept up to date by the integrator
+##      and reconciled now and then with a parallel crawl of the output
+##      location, so asking for the usage never walks the storage.
+##
+## Created by: Kieran Knight
+## Email: kieransknight@gmail.com
+##
+################################################################################
+
+# Python Modules
+import os
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS usage (
+    location TEXT NOT NULL,
+    sequence TEXT NOT NULL,
+    shot TEXT NOT NULL,
+    option TEXT NOT NULL,
+    bytes INTEGER NOT NULL,
+    files INTEGER NOT NULL,
+    PRIMARY KEY (location, sequence, shot, option)
+);
+CREATE TABLE IF NOT EXISTS usage_reconciled (
+    location TEXT PRIMARY KEY,
+    reconciled REAL NOT NULL,
+    seconds REAL NOT NULL
+);
+"""
+# counters are only changed while this is held, and the database write lock
+# with it, so a reconcile never runs between an integration's reads and writes
+_WRITE_LOCK = threading.Lock()
+
+
+def _is_hidden(name):
+    # hidden folders and files aren't integrated yet, ie. the staging folder
+    # of a staged run or the temporary file of a delta transfer
+    return name.startswith('.')
+
+
+def _folder_usage(folder):
+    """
+    Adding up every file below a folder with scandir, which gets the
+    sizes from the directory listing on most filesystems.
+
+    Returns:
+        tuple: (bytes, files)
+    """
+    _bytes = _files = 0
+    _folders = [folder]
+    while _folders:
+        try:
+            _entries = os.scandir(_folders.pop())
+        except OSError:
+            continue
+        with _entries:
+            for entry in _entries:
+                if _is_hidden(entry.name):
+                    continue
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        _folders.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        _bytes += entry.stat(follow_symlinks=False).st_size
+                        _files += 1
+                except OSError:
+                    continue
+    return _bytes, _files
+
+
+def _list(folder):
+    """
+    Splitting a folder into its subfolders and the usage of its own files.
+
+    Returns:
+        tuple: ([(name, path)] of the subfolders, bytes, files)
+    """
+    _folders = []
+    _bytes = _files = 0
+    try:
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if _is_hidden(entry.name):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    _folders.append((entry.name, entry.path))
+                elif entry.is_file(follow_symlinks=False):
+                    _bytes += entry.stat(follow_symlinks=False).st_size
+                    _files += 1
+    except OSError:
+        pass
+    return _folders, _bytes, _files
+
+
+def _key_usage(location, key):
+    """
+    Measuring a single counter the same way crawl_usage does, the whole
+    folder of an option and only the loose files of a shot or sequence.
+
+    Args:
+        location (str): The output location.
+        key (tuple): (sequence, shot, option)
+
+    Returns:
+        tuple: (bytes, files)
+    """
+    _path = os.path.join(location, *[name for name in key if name])
+    if all(key):
+        return _folder_usage(_path)
+    return _list(_path)[1:]
+
+
+def crawl_usage(location, workers=8):
+    """
+    Crawling an output location laid out as {sequence}/{shot}/{option}.
+    Each option folder is crawled on its own thread, as listing a filer is
+    mostly waiting on the network. Files that aren't in an option folder
+    count towards an empty option, or an empty shot. Hidden folders and
+    files are skipped.
+
+    Args:
+        location (str): The output location.
+        workers (int): Folders crawled at once.
+
+    Returns:
+        dict: (sequence, shot, option) mapped to [bytes, files].
+    """
+    _usage = {}
+
+    def _add(key, usage):
+        if usage[1]:
+            _total = _usage.setdefault(key, [0, 0])
+            _total[0] += usage[0]
+            _total[1] += usage[1]
+
+    _options = []
+    _sequences, _bytes, _files = _list(location)
+    _add(('', '', ''), (_bytes, _files))
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        _shots = {sequence: executor.submit(_list, path) for sequence, path in _sequences}
+        _option_lists = {}
+        for sequence, future in _shots.items():
+            _shot_folders, _bytes, _files = future.result()
+            _add((sequence, '', ''), (_bytes, _files))
+            for shot, path in _shot_folders:
+                _option_lists[(sequence, shot)] = executor.submit(_list, path)
+        for (sequence, shot), future in _option_lists.items():
+            _option_folders, _bytes, _files = future.result()
+            _add((sequence, shot, ''), (_bytes, _files))
+            _options.extend(
+                ((sequence, shot, option), executor.submit(_folder_usage, path)) for option, path in _option_folders)
+        for key, future in _options:
+            _add(key, future.result())
+    return _usage
+
+
+class UsageTotals(object):
+    """
+    The usage of an output location, added up by sequence and by shot
+    once so every lookup is a dictionary get.
+
+    Args:
+        rows (dict): (sequence, shot, option) mapped to (bytes, files).
+    """
+    def __init__(self, rows=None):
+        super(UsageTotals, self).__init__()
+        self._options = {}
+        self._shots = {}
+        self._sequences = {}
+        self._total = [0, 0]
+        for (sequence, shot, option), (_bytes, _files) in (rows or {}).items():
+            self._options[(sequence, shot, option)] = (_bytes, _files)
+            for _totals, _key in ((self._shots, (sequence, shot)), (self._sequences, sequence)):
+                _current = _totals.setdefault(_key, [0, 0])
+                _current[0] += _bytes
+                _current[1] += _files
+            self._total[0] += _bytes
+            self._total[1] += _files
+
+    @property
+    def total(self):
+        return tuple(self._total)
+
+    @property
+    def sequences(self):
+        return sorted(self._sequences)
+
+    def shots(self, sequence):
+        return sorted(shot for (_sequence, shot) in self._shots if _sequence == sequence)
+
+    def sequence(self, sequence):
+        """
+        Returns:
+            tuple: (bytes, files) used by a sequence.
+        """
+        return tuple(self._sequences.get(sequence, (0, 0)))
+
+    def shot(self, sequence, shot):
+        return tuple(self._shots.get((sequence, shot), (0, 0)))
+
+    def option(self, sequence, shot, option):
+        return tuple(self._options.get((sequence, shot, option), (0, 0)))
+
+    def options(self, sequence, shot):
+        return {
+            _option: usage for (_sequence, _shot, _option), usage in self._options.items()
+            if (_sequence, _shot) == (sequence, shot)
+        }
+
+
+class DiskUsage(object):
+    """
+    The usage counters of every output location, kept in the catalog database.
+
+    Args:
+        location (str): The database file, the catalog by default.
+    """
+    def __init__(self, location):
+        super(DiskUsage, self).__init__()
+        _folder = os.path.dirname(location)
+        if _folder and not os.path.isdir(_folder):
+            os.makedirs(_folder)
+        self._connection = sqlite3.connect(location)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.executescript(_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self._connection.close()
+
+    @contextmanager
+    def _write(self):
+        """
+        Changing the counters in a transaction that holds the write lock from
+        the start, so nothing else changes them in between.
+        """
+        with _WRITE_LOCK, self._connection:
+            self._connection.execute('BEGIN IMMEDIATE')
+            yield self._connection
+
+    def add(self, location, changes):
+        """
+        Adding the bytes and files written by an integration.
+
+        Args:
+            location (str): The output location.
+            changes (dict): (sequence, shot, option) mapped to the (bytes, files) added,
+                negative where files were replaced by smaller ones.
+        """
+        with self._write() as connection:
+            connection.executemany(
+                'INSERT INTO usage VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (location, sequence, shot, option) '
+                'DO UPDATE SET bytes = bytes + excluded.bytes, files = files + excluded.files',
+                [(str(location),) + key + tuple(change) for key, change in changes.items()]
+            )
+
+    def totals(self, location):
+        """
+        Getting the usage of an output location.
+
+        Args:
+            location (str): The output location.
+
+        Returns:
+            UsageTotals: The usage by sequence, shot and option.
+        """
+        return UsageTotals({
+            (sequence, shot, option): (_bytes, _files)
+            for sequence, shot, option, _bytes, _files in self._connection.execute(
+                'SELECT sequence, shot, option, bytes, files FROM usage WHERE location = ?', (str(location),))
+        })
+
+    def reconciled(self, location):
+        """
+        Returns:
+            float: When the output location was last crawled, or None if never.
+        """
+        _row = self._connection.execute(
+            'SELECT reconciled FROM usage_reconciled WHERE location = ?', (str(location),)).fetchone()
+        return _row[0] if _row else None
+
+    def is_stale(self, location, interval):
+        """
+        Checking whether an output location is due to be crawled again.
+
+        Args:
+            location (str): The output location.
+            interval (float): Hours between crawls.
+        """
+        _reconciled = self.reconciled(location)
+        return _reconciled is None or time.time() - _reconciled >= interval * 3600
+
+    def reconcile(self, location, workers=8):
+        """
+        Crawling an output location and replacing its counters with what is
+        actually on disk, ie. after files were removed outside of the tool.
+        Each counter crawled is replaced on its own, under the same lock as
+        an integration adding to them, and counters that weren't crawled are
+        measured again under the lock, so the usage of a folder an integration
+        created while the location was crawled isn't wiped out.
+
+        Args:
+            location (str): The output location.
+            workers (int): Folders crawled at once.
+
+        Returns:
+            UsageTotals: The usage found.
+        """
+        _start = time.time()
+        _location = str(location)
+        _usage = crawl_usage(_location, workers=workers)
+        with self._write() as connection:
+            connection.executemany(
+                'INSERT INTO usage VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (location, sequence, shot, option) '
+                'DO UPDATE SET bytes = excluded.bytes, files = excluded.files',
+                [(_location,) + key + tuple(usage) for key, usage in _usage.items()]
+            )
+            _missed = {
+                key: _key_usage(_location, key) for key in connection.execute(
+                    'SELECT sequence, shot, option FROM usage WHERE location = ?', (_location,))
+                if key not in _usage
+            }
+            connection.executemany(
+                'UPDATE usage SET bytes = ?, files = ? WHERE location = ? AND sequence = ? AND shot = ? AND option = ?',
+                [tuple(usage) + (_location,) + key for key, usage in _missed.items() if usage[1]]
+            )
+            connection.executemany(
+                'DELETE FROM usage WHERE location = ? AND sequence = ? AND shot = ? AND option = ?',
+                [(_location,) + key for key, usage in _missed.items() if not usage[1]]
+            )
+            _usage.update({key: usage for key, usage in _missed.items() if usage[1]})
+            connection.execute(
+                'INSERT OR REPLACE INTO usage_reconciled VALUES (?, ?, ?)',
+                (_location, time.time(), time.time() - _start)
+            )
+        return UsageTotals(_usage)
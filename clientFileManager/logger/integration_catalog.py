@@ -0,0 +1,259 @@
+################################################################################
+## Client File Manager TOOL - Ingesting client files into a production pipeline
+##  with tracking, logging and configuration overrides.
+##
+## File : integration_catalog.py
+## Description : A SQLite catalog of every file that has been integrated.
+##      The catalog runs in WAL mode and rows are inserted in batches, so
+##      recording a run costs a handful of transactions rather than one per file.
+##
+## Created by: Kieran Knight
+## Email: kieransknight@gmail.com
+##
+################################################################################
+
+# Python Modules
+import os
+import time
+import uuid
+import sqlite3
+
+# Application
+from utils import normalise_path
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    run_id TEXT NOT NULL,
+    delivery_id TEXT,
+    source TEXT NOT NULL,
+    destination TEXT NOT NULL,
+    size INTEGER,
+    mtime REAL,
+    hash TEXT,
+    sequence TEXT,
+    shot TEXT,
+    option TEXT,
+    integrated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_source ON files (source);
+CREATE INDEX IF NOT EXISTS files_destination ON files (destination);
+CREATE INDEX IF NOT EXISTS files_hash ON files (hash);
+CREATE INDEX IF NOT EXISTS files_shot ON files (sequence, shot);
+CREATE INDEX IF NOT EXISTS files_delivery ON files (delivery_id);
+CREATE INDEX IF NOT EXISTS files_run ON files (run_id);
+"""
+
+_COLUMNS = (
+    'run_id', 'delivery_id', 'source', 'destination', 'size',
+    'mtime', 'hash', 'sequence', 'shot', 'option', 'integrated'
+)
+
+
+class IntegrationCatalog(object):
+    """
+    The catalog of integrated files.
+
+    Rows are held in memory and written once the batch is full, or when the
+    catalog is flushed or closed. Lookups are by indexed columns only, so
+    checking whether a file has already been integrated doesn't get slower
+    as the catalog grows. Every path is stored and looked up absolute and
+    normalised, however it was passed in.
+
+    Args:
+        location (str): The catalog database file.
+        batch_size (int): The number of rows written per transaction.
+    """
+    def __init__(self, location, batch_size=500):
+        super(IntegrationCatalog, self).__init__()
+        _folder = os.path.dirname(location)
+        if _folder and not os.path.isdir(_folder):
+            os.makedirs(_folder)
+        self._connection = sqlite3.connect(location)
+        self._connection.row_factory = sqlite3.Row
+        # readers, ie. the command line, never block the integrator writing
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.executescript(_SCHEMA)
+        self._batch_size = max(1, batch_size)
+        self._pending = []
+        self._run_id = uuid.uuid4().hex
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def run_id(self):
+        return self._run_id
+
+    @property
+    def pending(self):
+        return len(self._pending)
+
+    def add(self, entry, delivery_id=None, file_hash=None):
+        """
+        Adding an integrated entry to the catalog.
+
+        Args:
+            entry (IntegrateEntry): The integrated file.
+            delivery_id (str): The delivery the file came in, ie. the client folder.
+            file_hash (str): The hash of the file contents, if known.
+        """
+        try:
+            _stat = os.stat(entry.src)
+            _mtime = _stat.st_mtime
+            _size = entry.contents.file_size if entry.contents.is_archive_member else _stat.st_size
+        except OSError:
+            _mtime = _size = None
+        self._pending.append((
+            self._run_id,
+            normalise_path(delivery_id),
+            normalise_path(entry.contents.file_path),
+            normalise_path(entry.dst),
+            _size,
+            _mtime,
+            file_hash,
+            entry.sequence,
+            entry.shot,
+            entry.option,
+            time.time()
+        ))
+        if len(self._pending) >= self._batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Writing every pending row in a single transaction.
+        """
+        if not self._pending:
+            return
+        with self._connection:
+            self._connection.executemany(
+                'INSERT INTO files ({}) VALUES ({})'.format(
+                    ', '.join(_COLUMNS), ', '.join('?' * len(_COLUMNS))),
+                self._pending
+            )
+        self._pending = []
+
+    def close(self):
+        self.flush()
+        self._connection.close()
+
+    def _select(self, where, values, limit=None):
+        _query = 'SELECT * FROM files WHERE {} ORDER BY integrated DESC'.format(where)
+        if limit:
+            _query += ' LIMIT {:d}'.format(limit)
+        return [dict(row) for row in self._connection.execute(_query, values)]
+
+    def find_source(self, source):
+        """
+        Finding where a client file was integrated to.
+
+        Args:
+            source (str): The client file path.
+
+        Returns:
+            list: The matching rows as dictionaries, newest first.
+        """
+        return self._select('source = ?', (normalise_path(source),))
+
+    def find_destination(self, destination):
+        """
+        Finding the client file an integrated file came from.
+
+        Args:
+            destination (str): The integrated file path.
+
+        Returns:
+            list: The matching rows as dictionaries, newest first.
+        """
+        return self._select('destination = ?', (normalise_path(destination),))
+
+    def find_hash(self, file_hash):
+        """
+        Finding every integrated file with the same contents.
+
+        Args:
+            file_hash (str): The hash of the file contents.
+
+        Returns:
+            list: The matching rows as dictionaries, newest first.
+        """
+        return self._select('hash = ?', (file_hash,))
+
+    def find_shot(self, sequence, shot=None):
+        """
+        Finding every file integrated to a sequence, or a single shot.
+
+        Args:
+            sequence (str): The sequence name.
+            shot (str): The shot name, every shot of the sequence if not passed.
+
+        Returns:
+            list: The matching rows as dictionaries, newest first.
+        """
+        if shot is None:
+            return self._select('sequence = ?', (sequence,))
+        return self._select('sequence = ? AND shot = ?', (sequence, shot))
+
+    def find_location(self, location):
+        """
+        Finding the latest file integrated to every destination below a folder,
+        ie. the output location. The destination index is searched as a range
+        rather than with LIKE so it is still used.
+
+        Args:
+            location (str): The folder.
+
+        Returns:
+            dict: Destination paths mapped to their latest row.
+        """
+        _prefix = os.path.join(normalise_path(location), '')
+        _end = _prefix[:-1] + chr(ord(_prefix[-1]) + 1)
+        _rows = {}
+        for row in self._connection.execute(
+                'SELECT * FROM files WHERE destination >= ? AND destination < ? ORDER BY id',
+                (_prefix, _end)):
+            _rows[row['destination']] = dict(row)
+        return _rows
+
+    def find_delivery(self, delivery_id):
+        return self._select('delivery_id = ?', (normalise_path(delivery_id),))
+
+    def find_run(self, run_id):
+        return self._select('run_id = ?', (run_id,))
+
+    def is_integrated(self, source, size, mtime):
+        """
+        Checking whether a client file has already been integrated unchanged.
+
+        Args:
+            source (str): The client file path.
+            size (int): The current size of the file.
+            mtime (float): The current modified time of the file.
+
+        Returns:
+            bool: True if the same file has been integrated before.
+        """
+        _row = self._connection.execute(
+            'SELECT 1 FROM files WHERE source = ? AND size = ? AND mtime = ? LIMIT 1',
+            (normalise_path(source), size, mtime)
+        ).fetchone()
+        return _row is not None
+
+    def is_delivered(self, delivery_id):
+        """
+        Checking whether a delivery has already been integrated.
+
+        Args:
+            delivery_id (str): The delivery, ie. the client folder.
+
+        Returns:
+            bool: True if any file of the delivery is in the catalog.
+        """
+        _row = self._connection.execute(
+            'SELECT 1 FROM files WHERE delivery_id = ? LIMIT 1', (normalise_path(delivery_id),)).fetchone()
+        return _row is not None
@@ -0,0 +1,315 @@
+################################################################################
+## Client File Manager TOOL - Ingesting client files into a production pipeline
+##  with tracking, logging and configuration overrides.
+##
+## File : log_archive.py
+## Description : Rotating the integration logs and indexing what each one
+##      holds. Old logs are compressed and the oldest removed once the
+##      logging location is over its size, while a small index of the files,
+##      hashes and shots of every log finds the runs that touched them
+##      without reading the logs themselves.
+##
+## Created by: Kieran Knight
+## Email: kieransknight@gmail.com
+##
+################################################################################
+
+# Python Modules
+import os
+import re
+import gzip
+import lzma
+import time
+import shutil
+import sqlite3
+
+# Application
+from utils import normalise_path
+
+INDEX_NAME = 'log_index.db'
+COMPLETED = 'completed'
+FAILED = 'failed'
+IGNORED = 'ignored'
+
+_COMPRESSORS = {
+    'gzip': ('.gz', gzip.open),
+    'xz': ('.xz', lzma.open),
+}
+_OPENERS = {'.gz': gzip.open, '.xz': lzma.open}
+# seconds since a log was written before it can be rotated
+_SETTLE = 60
+_LOG_NAME = re.compile(r'^integrateFiles_(\d{8}_\d{6})\.txt(\.gz|\.xz)?$')
+# the lines IntegrateLogger writes for each file
+_LOG_LINES = [
+    (re.compile(r'^(.*) >> Copied To >> (.*)$'), COMPLETED),
+    (re.compile(r'^(.*) >> Failed To Copy To >> (.*)$'), FAILED),
+    (re.compile(r'^(.*) >> Was Set To Ignore and was not processed()$'), IGNORED),
+]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS logs (
+    id INTEGER PRIMARY KEY,
+    name TEXT UNIQUE NOT NULL,
+    file TEXT NOT NULL,
+    started REAL NOT NULL,
+    bytes INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    log INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    source TEXT NOT NULL,
+    destination TEXT,
+    sequence TEXT,
+    shot TEXT,
+    hash TEXT,
+    offset INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_log ON entries (log);
+CREATE INDEX IF NOT EXISTS entries_source ON entries (source);
+CREATE INDEX IF NOT EXISTS entries_destination ON entries (destination);
+CREATE INDEX IF NOT EXISTS entries_hash ON entries (hash);
+CREATE INDEX IF NOT EXISTS entries_shot ON entries (sequence, shot);
+"""
+
+
+def open_log(path):
+    """
+    Opening a log for reading in binary, compressed or not.
+
+    Args:
+        path (str): The log file.
+    """
+    return _OPENERS.get(os.path.splitext(path)[1], open)(path, 'rb')
+
+
+def read_entries(path):
+    """
+    Reading the file lines of a log that was written without an index,
+    ie. before the logs were indexed.
+
+    Args:
+        path (str): The log file.
+
+    Returns:
+        list: (status, source, destination, None, None, None, offset) of each file line.
+    """
+    _rows = []
+    _offset = 0
+    with open_log(path) as handle:
+        for line in handle:
+            _text = line.decode('utf-8', 'replace').rstrip('\r\n')
+            for pattern, status in _LOG_LINES:
+                _match = pattern.match(_text)
+                if _match:
+                    _rows.append((status, _match.group(1), _match.group(2) or None, None, None, None, _offset))
+                    break
+            _offset += len(line)
+    return _rows
+
+
+class LogArchive(object):
+    """
+    The index of every integration log in a logging location, kept next to
+    the logs themselves so it moves with them. Each file line is indexed by
+    its source, destination, hash and shot along with where it is in its
+    log, so finding the runs that touched a file is a lookup and showing a
+    line only reads the one log it is in.
+
+    Args:
+        location (str): The logging location.
+    """
+    def __init__(self, location):
+        super(LogArchive, self).__init__()
+        self._location = location
+        self._connection = sqlite3.connect(os.path.join(location, INDEX_NAME))
+        self._connection.row_factory = sqlite3.Row
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.executescript(_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self._connection.close()
+
+    def add_log(self, path, started, rows):
+        """
+        Indexing a log once it has been written. Paths are normalised the
+        same way as in the catalog, so a search finds them however they
+        were written.
+
+        Args:
+            path (str): The log file.
+            started (float): When the run started.
+            rows (list): (status, source, destination, sequence, shot, hash, offset) of each file line.
+        """
+        _file = os.path.basename(path)
+        # a compressed log is indexed under the name it was written with
+        _name = _file[:-3] if os.path.splitext(_file)[1] in _OPENERS else _file
+        with self._connection:
+            self._connection.execute('DELETE FROM entries WHERE log IN (SELECT id FROM logs WHERE name = ?)', (_name,))
+            _log = self._connection.execute(
+                'INSERT OR REPLACE INTO logs (name, file, started, bytes) VALUES (?, ?, ?, ?)',
+                (_name, _file, started, os.path.getsize(path))
+            ).lastrowid
+            self._connection.executemany(
+                'INSERT INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                [(_log, row[0], normalise_path(row[1]), normalise_path(row[2])) + tuple(row[3:]) for row in rows]
+            )
+
+    def _stale_logs(self):
+        """
+        Listing the plain logs that were compressed, but not removed, ie. a
+        rotation stopped between the two. The compressed log is whole, as it
+        is only renamed into place once written, so it is kept.
+
+        Returns:
+            set: The file names of the stale plain logs.
+        """
+        _files = set(os.listdir(self._location))
+        return {
+            name for name in _files
+            if _LOG_NAME.match(name) and not _LOG_NAME.match(name).group(2)
+            and any(name + extension in _files for extension in _OPENERS)
+        }
+
+    def index(self):
+        """
+        Listing the logs in the logging location, indexing any that weren't,
+        ie. logs written before they were indexed or by another workstation.
+        A plain log that has a compressed copy is left to rotate to remove.
+
+        Returns:
+            list: (name, file, modified time, bytes) of each log, oldest first.
+        """
+        _indexed = {row['name']: row['file'] for row in self._connection.execute('SELECT name, file FROM logs')}
+        _stale = self._stale_logs()
+        _logs = []
+        with os.scandir(self._location) as entries:
+            for entry in entries:
+                _match = _LOG_NAME.match(entry.name)
+                if not _match or entry.name in _stale or not entry.is_file():
+                    continue
+                _name = entry.name[:-len(_match.group(2))] if _match.group(2) else entry.name
+                _stat = entry.stat()
+                if _indexed.get(_name) != entry.name:
+                    _started = time.mktime(time.strptime(_match.group(1), '%Y%m%d_%H%M%S'))
+                    self.add_log(entry.path, _started, read_entries(entry.path))
+                _logs.append((_name, entry.name, _stat.st_mtime, _stat.st_size))
+        return sorted(_logs, key=lambda log: log[2])
+
+    def rotate(self, compression='gzip', compress_after=1, delete_after=0, max_bytes=0):
+        """
+        Compressing the logs older than compress_after days, then removing
+        the logs older than delete_after days and the oldest logs while the
+        logs take up more than max_bytes. Logs written in the last minute are
+        left alone, another run may still be writing them. Logs are compressed
+        to a temporary file first, so a rotation that is stopped never loses
+        a log, and a plain log left beside its compressed copy by a stopped
+        rotation is removed.
+
+        Args:
+            compression (str): gzip, xz or none.
+            compress_after (float): Days before a log is compressed, 0 for straight away.
+            delete_after (float): Days before a log is removed, 0 to keep every log.
+            max_bytes (int): The most the logs take up, 0 for no limit.
+
+        Returns:
+            tuple: (logs compressed, logs removed)
+        """
+        _now = time.time()
+        for filename in self._stale_logs():
+            try:
+                os.remove(os.path.join(self._location, filename))
+            except OSError:
+                pass
+        _logs = self.index()
+        _compressed = 0
+        if compression in _COMPRESSORS:
+            _extension, _open = _COMPRESSORS[compression]
+            for position, (name, filename, mtime, _bytes) in enumerate(_logs):
+                if filename != name or _now - mtime < max(compress_after * 86400, _SETTLE):
+                    continue
+                _path = os.path.join(self._location, filename)
+                _temporary = '{}{}.tmp'.format(_path, _extension)
+                with open(_path, 'rb') as source, _open(_temporary, 'wb') as target:
+                    shutil.copyfileobj(source, target, 1024 * 1024)
+                # the log keeps its age once compressed
+                os.utime(_temporary, (mtime, mtime))
+                os.replace(_temporary, _path + _extension)
+                os.remove(_path)
+                _size = os.path.getsize(_path + _extension)
+                with self._connection:
+                    self._connection.execute(
+                        'UPDATE logs SET file = ?, bytes = ? WHERE name = ?', (filename + _extension, _size, name))
+                _logs[position] = (name, filename + _extension, mtime, _size)
+                _compressed += 1
+
+        _total = sum(log[3] for log in _logs)
+        _removed = []
+        for name, filename, mtime, _bytes in _logs:
+            if _now - mtime < _SETTLE:
+                break
+            if not (delete_after and _now - mtime >= delete_after * 86400) and not (max_bytes and _total > max_bytes):
+                break
+            try:
+                os.remove(os.path.join(self._location, filename))
+            except OSError:
+                continue
+            _total -= _bytes
+            _removed.append(name)
+        if _removed:
+            with self._connection:
+                self._connection.executemany(
+                    'DELETE FROM entries WHERE log IN (SELECT id FROM logs WHERE name = ?)', [(name,) for name in _removed])
+                self._connection.executemany('DELETE FROM logs WHERE name = ?', [(name,) for name in _removed])
+        return _compressed, len(_removed)
+
+    def search(self, path=None, file_hash=None, sequence=None, shot=None):
+        """
+        Finding every file line of the logs that touched a file, a hash or a shot.
+
+        Args:
+            path (str): A client file or integrated file.
+            file_hash (str): The hash of the file.
+            sequence (str): The sequence.
+            shot (str): Narrows a sequence search down to a single shot.
+
+        Returns:
+            list: sqlite3.Row of each file line, with the log file and when
+                its run started, oldest first.
+        """
+        _query = 'SELECT logs.file, logs.started, entries.* FROM entries JOIN logs ON logs.id = entries.log WHERE '
+        if path:
+            path = normalise_path(path)
+            _rows = self._connection.execute(
+                _query + 'entries.source = ? UNION ALL ' + _query + 'entries.destination = ? AND entries.source != ?',
+                (path, path, path)
+            ).fetchall()
+        elif file_hash:
+            _rows = self._connection.execute(_query + 'entries.hash = ?', (file_hash,)).fetchall()
+        elif shot:
+            _rows = self._connection.execute(
+                _query + 'entries.sequence = ? AND entries.shot = ?', (sequence, shot)).fetchall()
+        else:
+            _rows = self._connection.execute(_query + 'entries.sequence = ?', (sequence,)).fetchall()
+        return sorted(_rows, key=lambda row: (row['started'], row['offset']))
+
+    def read_line(self, row):
+        """
+        Reading the line of a search result from its log, only the log
+        holding the line is read, up to the line.
+
+        Args:
+            row (sqlite3.Row): The search result.
+
+        Returns:
+            str: The line as it was logged.
+        """
+        with open_log(os.path.join(self._location, row['file'])) as handle:
+            handle.seek(row['offset'])
+            return handle.readline().decode('utf-8', 'replace').rstrip('\r\n')
@@ -14,6 +14,12 @@ from .application_paths import (
     _UI_CONFIGURATION,
     _LOGGING_LOCATION,
     _INTEGRATE_LOCATION,
+    _AUTO_TUNE,
+    _CATALOG,
+    _SERVICE_QUEUE,
+    _SESSIONS,
+    _HEADER_CACHE,
+    _THUMBNAILS,
 )
 
 # applications ui location and items
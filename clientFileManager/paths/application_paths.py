@@ -30,6 +30,12 @@ _UI_CONFIG_FOLDER = str(Path(_APP_LOCATION, 'ui_configuration'))
 _UI_CONFIGURATION = str(Path(_UI_CONFIG_FOLDER, 'configuration.json'))
 _LOGGING_LOCATION = str(Path(_APP_LOCATION, 'logging'))
 _INTEGRATE_LOCATION = str(Path(_APP_LOCATION, 'integrate'))
+_AUTO_TUNE = str(Path(_UI_CONFIG_FOLDER, 'auto_tune.json'))
+_CATALOG = str(Path(_APP_LOCATION, 'catalog.db'))
+_SERVICE_QUEUE = str(Path(_APP_LOCATION, 'service_queue.db'))
+_SESSIONS = str(Path(_APP_LOCATION, 'sessions'))
+_HEADER_CACHE = str(Path(_APP_LOCATION, 'header_cache.db'))
+_THUMBNAILS = str(Path(_APP_LOCATION, 'thumbnails'))
 
 # applications ui location and items
 _UI_LOCATION = str(Path(_ROOT, 'ui_items'))
@@ -0,0 +1,152 @@
+################################################################################
+## Client File Manager TOOL - Ingesting client files into a production pipeline
+##  with tracking, logging and configuration overrides.
+##
+## File : test_integration_service.py
+## Description : Running the integration service as a local stand-in server,
+##      checking the token, where plans can read and write, and that the
+##      queue carries on after a restart.
+##
+## Created by: Kieran Knight
+## Email: kieransknight@gmail.com
+##
+################################################################################
+
+# Python Modules
+import os
+import sys
+import time
+import shutil
+import tempfile
+import unittest
+import urllib.error
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_TOKEN = 'stand-in-token'
+
+
+def setUpModule():
+    """
+    Pointing the application folders at a temporary home before anything
+    reads them, so the tests never touch the real configuration.
+    """
+    global _HOME, IntegrateConfigure, IntegrationService, IntegrationQueue, IntegrateEntry, ConfigureFilesData
+    global ServiceClient, entry_to_dict
+    _HOME = tempfile.mkdtemp()
+    os.environ['HOME'] = os.environ['USERPROFILE'] = _HOME
+    sys.path.insert(0, _ROOT)
+    try:
+        from paths import _UI_CONFIG_FOLDER
+        from utils import _DEFAULT_CONFIG, write_json
+        from configuration.configure import IntegrateConfigure, ConfigureFilesData
+        from integrate.integration_service import IntegrationService, IntegrationQueue
+        from integrate.integrate_jobs import IntegrateEntry
+        from integrate.service_client import ServiceClient, entry_to_dict
+    except ImportError as error:
+        raise unittest.SkipTest('The application can\'t be imported - {}'.format(error))
+    os.makedirs(_UI_CONFIG_FOLDER)
+    write_json(_DEFAULT_CONFIG)
+
+
+def tearDownModule():
+    shutil.rmtree(_HOME, ignore_errors=True)
+
+
+class IntegrationServiceTest(unittest.TestCase):
+
+    def setUp(self):
+        self._folder = tempfile.mkdtemp(dir=_HOME)
+        self._sources = os.path.join(self._folder, 'client')
+        self._output = os.path.join(self._folder, 'output')
+        os.makedirs(self._sources)
+        with open(os.path.join(self._sources, 'ABC_010_plate.exr'), 'wb') as file:
+            file.write(os.urandom(64 * 1024))
+        self._configuration = IntegrateConfigure()
+        self._configuration.output_location = self._output
+        self._configuration.service['sources'] = [self._sources]
+        self._queue = os.path.join(self._folder, 'queue.db')
+        self._service = None
+
+    def tearDown(self):
+        if self._service:
+            self._service.stop()
+        shutil.rmtree(self._folder, ignore_errors=True)
+
+    def _start(self, token=_TOKEN):
+        self._service = IntegrationService(
+            self._configuration, port=0, queue_location=self._queue, token=token)
+        self._service.start()
+        return ServiceClient(*self._service.address, token=token)
+
+    def _entry(self, folder=None, shot='010', location=None):
+        return entry_to_dict(IntegrateEntry(
+            ConfigureFilesData('ABC_010_plate.exr', folder or self._sources),
+            location or self._output, 'ABC', shot, 'Plate'
+        ))
+
+    def _wait(self, client, plan_id, timeout=30.0):
+        _end = time.time() + timeout
+        while time.time() < _end:
+            _plan = client.plan(plan_id)
+            if _plan['status'] in ('done', 'failed'):
+                return _plan
+            time.sleep(0.1)
+        self.fail('Plan {} didn\'t finish'.format(plan_id))
+
+    def test_needs_a_token_to_listen_beyond_localhost(self):
+        with self.assertRaises(ValueError):
+            IntegrationService(self._configuration, host='0.0.0.0', port=0, queue_location=self._queue)
+
+    def test_refuses_requests_without_the_token(self):
+        _client = self._start()
+        _address = self._service.address
+        for token in (None, 'wrong'):
+            with self.assertRaises(urllib.error.HTTPError) as raised:
+                ServiceClient(*_address, token=token).status()
+            self.assertEqual(raised.exception.code, 401)
+        self.assertEqual(_client.status()['running'], None)
+
+    def test_refuses_destinations_outside_the_output_location(self):
+        _client = self._start()
+        for entry in (self._entry(shot=os.path.join('..', '..', '..')), self._entry(location=self._folder)):
+            with self.assertRaises(urllib.error.HTTPError) as raised:
+                _client.submit([entry])
+            self.assertEqual(raised.exception.code, 400)
+        self.assertEqual(_client.plans(), [])
+
+    def test_refuses_sources_outside_the_source_folders(self):
+        _client = self._start()
+        _outside = os.path.join(self._folder, 'elsewhere')
+        os.makedirs(_outside)
+        shutil.copy(os.path.join(self._sources, 'ABC_010_plate.exr'), _outside)
+        for folder in (_outside, os.path.join(self._sources, '..', 'elsewhere')):
+            with self.assertRaises(urllib.error.HTTPError) as raised:
+                _client.submit([self._entry(folder=folder)])
+            self.assertEqual(raised.exception.code, 400)
+        self.assertEqual(_client.plans(), [])
+
+    def test_integrates_a_plan(self):
+        _client = self._start()
+        _plan = self._wait(_client, _client.submit([self._entry()]))
+        _dst = os.path.join(self._output, 'ABC', '010', 'Plate', 'ABC_010_plate.exr')
+        self.assertEqual(_plan['status'], 'done')
+        self.assertEqual(_plan['result']['complete'], [_dst])
+        with open(_dst, 'rb') as written, open(os.path.join(self._sources, 'ABC_010_plate.exr'), 'rb') as source:
+            self.assertEqual(written.read(), source.read())
+
+    def test_queue_survives_a_restart(self):
+        _queue = IntegrationQueue(self._queue)
+        _running = _queue.add([self._entry()], priority=1)
+        _queued = _queue.add([self._entry(shot='020')])
+        # the service stopped while the first plan was running
+        self.assertEqual(_queue.next()['id'], _running)
+        _queue.close()
+
+        _client = self._start()
+        self.assertEqual(self._wait(_client, _running)['status'], 'done')
+        self.assertEqual(self._wait(_client, _queued)['status'], 'done')
+        self.assertTrue(os.path.isfile(os.path.join(self._output, 'ABC', '020', 'Plate', 'ABC_010_plate.exr')))
+
+
+if __name__ == '__main__':
+    unittest.main()
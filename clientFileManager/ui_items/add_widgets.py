@@ -12,6 +12,7 @@
 
 # Application
 from configuration.configure import IntegrateConfigure
+from ui_items.custom_tree_widget import CustomTreeItem
 from third_party.Qt import QtWidgets, QtCore, QtGui
 
 
@@ -85,7 +86,8 @@ class BaseAddItems(QtWidgets.QWidget):
 class AddClientItemsButtons(BaseAddItems):
     """
     Class that adds Client item buttons to the main UI.
-    This class is for the add file, add folder and remove items.
+    This class is for the add file, add folder and remove items,
+    and saving or loading a prepared ingest as a session.
     """
     def __init__(self, parent=None):
         super(AddClientItemsButtons, self).__init__(parent)
@@ -102,6 +104,14 @@ class AddClientItemsButtons(BaseAddItems):
     def remove_btn(self):
         return self._remove_btn
 
+    @property
+    def load_session_btn(self):
+        return self._load_session_btn
+
+    @property
+    def save_session_btn(self):
+        return self._save_session_btn
+
     def build_widget(self):
         """
         Building the widgets for client items.
@@ -115,10 +125,58 @@ class AddClientItemsButtons(BaseAddItems):
         self._remove_btn = QtWidgets.QPushButton()
         self._remove_btn.setText('Remove Client File/Folder')
 
+        self._load_session_btn = QtWidgets.QPushButton()
+        self._load_session_btn.setText('Load Session')
+
+        self._save_session_btn = QtWidgets.QPushButton()
+        self._save_session_btn.setText('Save Session')
+
+
+class AddFilterWidgets(BaseAddItems):
+    """
+    Class that adds the filter bar above the client files.
+    The option can be set for every file matching the filter at once.
+    """
+    def __init__(self, parent=None):
+        super(AddFilterWidgets, self).__init__(parent)
+
+    @property
+    def filter_edit(self):
+        return self._filter_edit
+
+    @property
+    def filter_matches(self):
+        return self._filter_matches
+
+    @property
+    def filter_option(self):
+        return self._filter_option
+
+    @property
+    def filter_set_btn(self):
+        return self._filter_set_btn
+
+    def set_matches(self, matches, total):
+        self._filter_matches.setText('{} of {} files'.format(matches, total))
+
+    def build_widget(self):
+        self._filter_edit = QtWidgets.QLineEdit()
+        self._filter_edit.setPlaceholderText('Filter, ie. .exr shot:040 option:plate')
+        self._filter_edit.setClearButtonEnabled(True)
+
+        self._filter_matches = QtWidgets.QLabel()
+
+        self._filter_option = QtWidgets.QComboBox()
+        [self._filter_option.addItem(option) for option in CustomTreeItem._OPTIONS]
+
+        self._filter_set_btn = QtWidgets.QPushButton()
+        self._filter_set_btn.setText('Set Option For Filtered Files')
+
 
 class AddIntegrateButton(BaseAddItems):
     """
-    Class that adds the Integrate button to the main UI
+    Class that adds the Integrate button to the main UI,
+    and the button scrubbing the output location.
     """
     def __init__(self, parent=None):
         super(AddIntegrateButton, self).__init__(parent)
@@ -127,10 +185,37 @@ class AddIntegrateButton(BaseAddItems):
     def integrate_btn(self):
         return self._integrate_btn
 
+    @property
+    def integrate_progress(self):
+        return self._integrate_progress
+
+    @property
+    def scrub_btn(self):
+        return self._scrub_btn
+
     def build_widget(self):
         self._integrate_btn = QtWidgets.QPushButton()
         self._integrate_btn.setText('Integrate Client Files')
 
+        self._integrate_progress = QtWidgets.QProgressBar()
+        self._integrate_progress.setRange(0, 1000)
+        self._integrate_progress.setValue(0)
+        self._integrate_progress.setTextVisible(True)
+        self._integrate_progress.setFormat('')
+
+        self._scrub_btn = QtWidgets.QPushButton()
+        self._scrub_btn.setText('Scrub Output Location')
+
+    def set_progress(self, progress):
+        """
+        Setting the progress bar from the integration progress.
+
+        Args:
+            progress (IntegrateProgress): The progress of the running integration.
+        """
+        self._integrate_progress.setValue(int(progress.percent * 10))
+        self._integrate_progress.setFormat(progress.summary())
+
 
 class AddSaveConfigurationWidget(BaseAddItems):
     """
@@ -14,9 +14,20 @@
 
 # Python Modules
 import os
+import html
+import queue
+import sqlite3
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 # Application
-from utils import read_css
+from utils import read_css, format_size
+from configuration.configure import ConfigureFiles, ConfigureFilesData
+from configuration.session_files import FILE_ROW, HEADER_ROW, FOLDER_ROW
+from configuration.header_probe import probe_files
+from ui_items.tree_filter_index import TreeFilterIndex
+from ui_items.thumbnail_cache import ThumbnailCache
 from third_party.Qt import QtWidgets, QtCore, QtGui
 from paths import (
     _BRANCH_CLOSED_PNG,
@@ -38,7 +49,14 @@ class CustomTreeWidget(QtWidgets.QTreeWidget):
     Returns:
         CustomTreeWidget -- Object linking to the widget and items created.
     """
-    _HEADERS = ['Folder', 'filename', 'Sequence', 'Shot', 'Location', 'Option']
+    _HEADERS = ['Folder', 'filename', 'Sequence', 'Shot', 'Location', 'Option', 'Details']
+    # files checked against the storage between each redraw of a restored session
+    _VALIDATE_CHUNK = 2000
+    # milliseconds between showing the headers probed in the background
+    _PROBE_POLL = 200
+    # milliseconds the tree has to stop scrolling before thumbnails are made for the rows showing
+    _THUMBNAIL_DELAY = 150
+    _THUMBNAIL_POLL = 100
     _OVERRIDE_STYLE = "QTreeView::branch:has-siblings:!adjoins-item " \
         "{border-image: url('%s') 0;}" \
         "QTreeView::branch:has-siblings:adjoins-item " \
@@ -71,7 +89,28 @@ class CustomTreeWidget(QtWidgets.QTreeWidget):
 
         self._data = None
         self._widgets = []
+        self._total_size = 0
+        self._index = TreeFilterIndex()
+        self._items_by_key = {}
+        self._hidden = set()
+        self._visible_children = {}
         self._parent = parent
+        self._app_config = None
+        self._unvalidated = iter(())
+        self._changed = []
+        self._on_validated = None
+        self._unprobed = []
+        self._probing = {}
+        self._probed = queue.Queue()
+        self._probe_running = 0
+        self._thumbnails = None
+        self._thumbnail_pool = None
+        self._thumbnail_requests = {}
+        self._thumbnailed = set()
+        self._thumbnail_timer = QtCore.QTimer(self)
+        self._thumbnail_timer.setSingleShot(True)
+        self._thumbnail_timer.setInterval(self._THUMBNAIL_DELAY)
+        self._thumbnail_timer.timeout.connect(self._request_thumbnails)
         self.setColumnCount(len(self.headers))
         self.setHeaderLabels(self.headers)  
 
@@ -82,6 +121,7 @@ class CustomTreeWidget(QtWidgets.QTreeWidget):
         self.setColumnWidth(3, 100)
         self.setColumnWidth(4, 350)
         self.setColumnWidth(5, 100)
+        self.setColumnWidth(6, 250)
 
         # Setting the alignment of the header files
         self.headerItem().setTextAlignment(0, QtCore.Qt.AlignCenter)
@@ -90,6 +130,15 @@ class CustomTreeWidget(QtWidgets.QTreeWidget):
         self.headerItem().setTextAlignment(3, QtCore.Qt.AlignCenter)
         self.headerItem().setTextAlignment(4, QtCore.Qt.AlignCenter)
         self.headerItem().setTextAlignment(5, QtCore.Qt.AlignCenter)
+        self.headerItem().setTextAlignment(6, QtCore.Qt.AlignCenter)
+
+        # lazy folders are only listed once they are expanded
+        self.itemExpanded.connect(self.expand_folder)
+
+        # thumbnails are only made for the rows showing once scrolling stops
+        self.verticalScrollBar().valueChanged.connect(self.schedule_thumbnails)
+        self.itemExpanded.connect(self.schedule_thumbnails)
+        self.itemCollapsed.connect(self.schedule_thumbnails)
         
     @property
     def headers(self):
@@ -99,6 +148,21 @@ class CustomTreeWidget(QtWidgets.QTreeWidget):
     def widgets(self):
         return self._widgets
 
+    @property
+    def file_count(self):
+        return len(self._widgets)
+
+    @property
+    def total_size(self):
+        return self._total_size
+
+    @property
+    def filtered_items(self):
+        """
+        The file items matching the current filter, every file item if there isn't one.
+        """
+        return [item for item in self._widgets if id(item) not in self._hidden]
+
     def check_items(self, files, app_config):
         """
         Checking the files that have been passed.
@@ -137,6 +201,7 @@ class CustomTreeWidget(QtWidgets.QTreeWidget):
             items (ConfigureFiles Object): The configure files object class.
             app_config (Configuration Object): The tools configuration object
         """
+        self._app_config = app_config
         _header = self.check_items(items.files, app_config)
 
         if not _header:
@@ -150,8 +215,521 @@ class CustomTreeWidget(QtWidgets.QTreeWidget):
             _item.build_subitem_values(items.files[item], single, app_config)
             _item.build_widget_items(self)
             _item.setTextAlignment(5, QtCore.Qt.AlignCenter)
-            self._widgets.append(_item)
-    
+            self._register_item(_item)
+
+    def add_folder(self, folder, app_config):
+        """
+        Adding a folder without listing it. Each folder is a node of its own
+        and is only listed when it is expanded, so adding a huge delivery
+        is instant and only the expanded folders are held in memory.
+
+        Args:
+            folder (str): The client folder or archive.
+            app_config (Configuration Object): The tools configuration object
+
+        Returns:
+            CustomTreeFolderItem: The folder item.
+        """
+        self._app_config = app_config
+        _folder = CustomTreeFolderItem(self, str(folder), str(folder))
+        _folder.build_folder_values(app_config)
+        _folder.build_widget_items(self)
+        return _folder
+
+    def expand_folder(self, item):
+        """
+        Listing a lazy folder the first time it is expanded.
+
+        Args:
+            item (CustomTreeItem): The expanded item.
+        """
+        if not item.is_lazy or item.populated:
+            return
+        self.setUpdatesEnabled(False)
+        try:
+            _files = item.populate(self, self._app_config)
+        finally:
+            self.setUpdatesEnabled(True)
+        [self._register_item(_item) for _item in _files]
+
+    def _register_item(self, item):
+        """
+        Tracking a new file item, its size and its filter values.
+
+        Args:
+            item (CustomTreeItem): The file item.
+        """
+        self._widgets.append(item)
+        self._total_size += item.file_size
+        self._index_item(item)
+        self.schedule_thumbnails()
+        # members are read from their archive, so only files on disk are probed
+        if self._app_config is not None and self._app_config.add_configuration.header_probe['enabled'] \
+                and not item.item_contents.archive:
+            if not self._unprobed:
+                QtCore.QTimer.singleShot(0, self._start_probe)
+            self._unprobed.append(item)
+
+    def _start_probe(self):
+        """
+        Probing the headers of the files registered since the last probe on
+        a background thread, so a large delivery is shown straight away and
+        its details filled in as they are read.
+        """
+        _items, self._unprobed = self._unprobed, []
+        _paths = []
+        for item in _items:
+            _path = item.item_contents.file_path
+            if _path not in self._probing:
+                _paths.append(_path)
+            self._probing.setdefault(_path, []).append(item)
+        if not _paths:
+            return
+        _thread = threading.Thread(
+            target=self._probe_paths,
+            args=(_paths, dict(self._app_config.add_configuration.header_probe)),
+            name='header-probe',
+            daemon=True
+        )
+        self._probe_running += 1
+        _thread.start()
+        if self._probe_running == 1:
+            QtCore.QTimer.singleShot(self._PROBE_POLL, self._apply_probed)
+
+    def _probe_paths(self, paths, settings):
+        """
+        Reading the headers of the passed files, run on the probe thread.
+        Nothing is touched on the tree from here, the results are queued
+        for _apply_probed and the thread finishes with None.
+        """
+        try:
+            for path, info in probe_files(paths, settings['cache'], settings['workers']):
+                if info is not None:
+                    self._probed.put((path, info))
+        except (OSError, sqlite3.Error) as error:
+            # the rows are left as they are, only without their headers
+            self._app_config.logger.warning(
+                'Unable to probe the file headers, no header details or options are shown - {}'.format(error))
+        finally:
+            self._probed.put(None)
+
+    def _apply_probed(self):
+        """
+        Showing the headers probed since the last poll, and polling again
+        until every probe thread has finished. Items removed in the meantime
+        are skipped.
+        """
+        _suggest = self._app_config.add_configuration.header_probe['suggestOption']
+        self.setUpdatesEnabled(False)
+        try:
+            while True:
+                try:
+                    _result = self._probed.get_nowait()
+                except queue.Empty:
+                    break
+                if _result is None:
+                    self._probe_running -= 1
+                    continue
+                path, info = _result
+                for item in self._probing.pop(path, ()):
+                    if self._items_by_key.get(id(item)) is item:
+                        item.set_header_info(info, _suggest)
+        finally:
+            self.setUpdatesEnabled(True)
+        if self._probe_running:
+            QtCore.QTimer.singleShot(self._PROBE_POLL, self._apply_probed)
+        else:
+            # files that couldn't be read are never queued
+            self._probing.clear()
+
+    def session_rows(self):
+        """
+        Getting every row of the tree with the values set on it, to save the
+        prepared ingest as a session. The size and modified time of each file
+        are taken now, so the files can be checked when the session is loaded.
+
+        Returns:
+            list: Tuples of SESSION_COLUMNS values, parents before their children.
+        """
+        _rows = []
+        _row_ids = {}
+        _duplicates = []
+
+        def _add(item, parent_id):
+            _contents = item.item_contents
+            _row_id = len(_rows) + 1
+            if item.is_lazy:
+                _kind = FOLDER_ROW
+            elif item.is_header:
+                _kind = HEADER_ROW
+            else:
+                _kind = FILE_ROW
+            _size = _mtime = None
+            if _kind == FILE_ROW:
+                _row_ids[id(_contents)] = _row_id
+                if _contents.duplicate_of is not None:
+                    _duplicates.append((_row_id - 1, _contents.duplicate_of))
+                _size = item.file_size
+                try:
+                    _mtime = os.stat(_contents.archive or _contents.file_path).st_mtime
+                except OSError:
+                    pass
+            _rows.append([
+                _row_id,
+                parent_id,
+                _kind,
+                item.path if item.is_lazy else _contents.file_path,
+                _contents.folder,
+                _contents.delivery,
+                _contents.archive,
+                _contents.member,
+                _size,
+                _mtime,
+                _contents.file_hash,
+                None,
+                item.sequence.currentText(),
+                item.shot.currentText(),
+                item.location.currentText(),
+                item.option.currentText(),
+                int(item.is_lazy and item.populated)
+            ])
+            for index in range(item.childCount()):
+                _add(item.child(index), _row_id)
+
+        _root = self.invisibleRootItem()
+        for index in range(_root.childCount()):
+            _add(_root.child(index), None)
+        for row, original in _duplicates:
+            _rows[row][11] = _row_ids.get(id(original))
+        return [tuple(row) for row in _rows]
+
+    def restore_session(self, rows, app_config, on_validated=None):
+        """
+        Rebuilding the tree from the rows of a saved session. Nothing is read
+        from the client files while the tree is built, each file is checked
+        against the size and modified time it was saved with afterwards,
+        a chunk at a time between redraws, and only the files that have
+        changed are flagged.
+
+        Args:
+            rows (list): Tuples of SESSION_COLUMNS values, see read_session.
+            app_config (Configuration Object): The tools configuration object
+            on_validated (callable): Called with the changed items once every file is checked.
+        """
+        self._app_config = app_config
+        _contents = {}
+        for row in rows:
+            _row_id, _, _kind, _file, _folder, _delivery, _archive, _member, _size = row[:9]
+            _data = _contents[_row_id] = ConfigureFilesData(
+                _file, _folder, parent_folder=_delivery, archive=_archive, member=_member, size=_size)
+            _data.file_hash = row[10]
+        for row in rows:
+            if row[11] is not None:
+                _contents[row[0]].duplicate_of = _contents.get(row[11])
+
+        _items = {}
+        _unvalidated = []
+        self.setUpdatesEnabled(False)
+        try:
+            for row in rows:
+                _row_id, _parent_id, _kind = row[:3]
+                _parent = _items.get(_parent_id, self)
+                if _kind == FOLDER_ROW:
+                    _item = CustomTreeFolderItem(_parent, row[3], row[5])
+                    _item.build_folder_values(app_config)
+                    _item.build_widget_items(self)
+                    if row[16]:
+                        _item.mark_populated()
+                elif _kind == HEADER_ROW:
+                    _item = CustomTreeItem(_parent)
+                    _item.build_top_level_values(_contents[_row_id], app_config)
+                    _item.build_widget_items(self)
+                else:
+                    _item = CustomTreeItem(_parent)
+                    _item.build_subitem_values(_contents[_row_id], _parent_id is None, app_config)
+                    _item.build_widget_items(self)
+                    _item.setTextAlignment(5, QtCore.Qt.AlignCenter)
+                # parents are set before their children exist, so nothing is overridden
+                _item.restore_values(*row[12:16])
+                _items[_row_id] = _item
+                if _kind == FILE_ROW:
+                    self._register_item(_item)
+                    # only the archive is on disk for a member, its size is the member's
+                    _unvalidated.append(
+                        (_item, row[6] or row[3], None if row[6] else row[8], row[9]))
+        finally:
+            self.setUpdatesEnabled(True)
+
+        self._unvalidated = iter(_unvalidated)
+        self._changed = []
+        self._on_validated = on_validated
+        QtCore.QTimer.singleShot(0, self._validate_chunk)
+
+    def _validate_chunk(self):
+        """
+        Checking the next chunk of restored files against the storage,
+        and scheduling the next chunk until every file is checked.
+        """
+        _chunk = list(itertools.islice(self._unvalidated, self._VALIDATE_CHUNK))
+        for item, path, size, mtime in _chunk:
+            try:
+                _stat = os.stat(path)
+            except OSError:
+                item.flag_changed('missing')
+                self._changed.append(item)
+                continue
+            if _stat.st_mtime != mtime or (size is not None and _stat.st_size != size):
+                item.flag_changed('changed')
+                self._changed.append(item)
+        if _chunk:
+            QtCore.QTimer.singleShot(0, self._validate_chunk)
+        elif self._on_validated is not None:
+            self._on_validated(self._changed)
+            self._on_validated = None
+
+    def schedule_thumbnails(self, *args):
+        """
+        Restarting the wait before thumbnails are made for the rows showing,
+        so nothing is decoded for rows that are only scrolled past.
+        """
+        self._thumbnail_timer.start()
+
+    def _visible_items(self):
+        """
+        Getting the items of the rows showing in the tree.
+        """
+        _item = self.itemAt(QtCore.QPoint(0, 0))
+        _height = self.viewport().height()
+        while _item is not None and self.visualItemRect(_item).top() < _height:
+            yield _item
+            _item = self.itemBelow(_item)
+
+    def _request_thumbnails(self):
+        """
+        Queuing a thumbnail for every image showing that doesn't have one.
+        Requests for rows that have been scrolled away from and haven't
+        started are dropped. Each thumbnail is made on a worker, or read
+        from the thumbnail cache, and shown by _apply_thumbnails.
+        """
+        if self._app_config is None:
+            return
+        _settings = self._app_config.add_configuration.thumbnails
+        if not _settings['enabled']:
+            return
+        if self._thumbnails is None:
+            try:
+                self._thumbnails = ThumbnailCache(
+                    _settings['cache'], _settings['cacheMB'] * 1024 * 1024, _settings['size'])
+            except OSError as error:
+                self._app_config.logger.warning(
+                    'Unable to open the thumbnail cache, thumbnails are disabled - {}'.format(error))
+                _settings['enabled'] = False
+                return
+            self._thumbnail_pool = ThreadPoolExecutor(
+                max_workers=max(1, _settings['workers']), thread_name_prefix='thumbnail')
+
+        _visible = {}
+        for item in self._visible_items():
+            # header and folder items are never registered
+            if id(item) in self._thumbnailed or self._items_by_key.get(id(item)) is not item:
+                continue
+            _contents = item.item_contents
+            if _contents.archive or not self._thumbnails.supports(_contents.file_path):
+                continue
+            _visible.setdefault(_contents.file_path, []).append(item)
+
+        for path, (future, _) in list(self._thumbnail_requests.items()):
+            if path not in _visible and future.cancel():
+                del self._thumbnail_requests[path]
+        _polling = bool(self._thumbnail_requests)
+        for path, items in _visible.items():
+            if path in self._thumbnail_requests:
+                _items = self._thumbnail_requests[path][1]
+                _requested = {id(item) for item in _items}
+                _items.extend(item for item in items if id(item) not in _requested)
+            else:
+                self._thumbnail_requests[path] = (self._thumbnail_pool.submit(self._thumbnails.thumbnail, path), items)
+        if self._thumbnail_requests and not _polling:
+            QtCore.QTimer.singleShot(self._THUMBNAIL_POLL, self._apply_thumbnails)
+
+    def _apply_thumbnails(self):
+        """
+        Showing the thumbnails finished since the last poll, and polling
+        again while any are still being made. Items removed in the meantime
+        are skipped.
+        """
+        for path, (future, items) in list(self._thumbnail_requests.items()):
+            if not future.done():
+                continue
+            del self._thumbnail_requests[path]
+            try:
+                _thumbnail = future.result()
+            except OSError:
+                _thumbnail = None
+            for item in items:
+                if self._items_by_key.get(id(item)) is item:
+                    self._thumbnailed.add(id(item))
+                    if _thumbnail:
+                        item.set_thumbnail(_thumbnail)
+        if self._thumbnail_requests:
+            QtCore.QTimer.singleShot(self._THUMBNAIL_POLL, self._apply_thumbnails)
+
+    def _index_item(self, item):
+        """
+        Adding an item to the filter index, and keeping it up to date
+        as the sequence, shot and option widgets are changed.
+
+        Args:
+            item (CustomTreeItem): The file item.
+        """
+        _key = id(item)
+        self._items_by_key[_key] = item
+        self._index.add(
+            _key,
+            name=item.item_contents.filename,
+            folder=item.item_contents.folder,
+            sequence=item.sequence.currentText(),
+            shot=item.shot.currentText(),
+            option=item.option.currentText()
+        )
+        _parent = item.parent()
+        if _parent is not None:
+            self._visible_children[id(_parent)] = self._visible_children.get(id(_parent), 0) + 1
+        item.sequence.currentTextChanged.connect(lambda text, key=_key: self._index.update(key, sequence=text))
+        item.shot.currentTextChanged.connect(lambda text, key=_key: self._index.update(key, shot=text))
+        item.option.currentTextChanged.connect(lambda text, key=_key: self._index.update(key, option=text))
+
+    def filter_items(self, query):
+        """
+        Hiding every file item that doesn't match the query.
+        Only the rows whose visibility changes are touched, so typing
+        a query doesn't walk the whole tree. Header items are hidden
+        once none of their children are showing.
+
+        Args:
+            query (str): The filter query, see TreeFilterIndex.
+
+        Returns:
+            int: The number of matching file items.
+        """
+        _matches = self._index.search(query)
+        _hidden = set() if _matches is None else set(self._index.keys) - _matches
+        _changed = _hidden ^ self._hidden
+        self.setUpdatesEnabled(False)
+        try:
+            for key in _changed:
+                _item = self._items_by_key[key]
+                _hide = key in _hidden
+                _item.setHidden(_hide)
+                _parent = _item.parent()
+                if _parent is None:
+                    continue
+                _visible = self._visible_children[id(_parent)] + (-1 if _hide else 1)
+                self._visible_children[id(_parent)] = _visible
+                _parent.setHidden(not _visible)
+        finally:
+            self.setUpdatesEnabled(True)
+        self._hidden = _hidden
+        self.schedule_thumbnails()
+        return len(self._widgets) - len(_hidden)
+
+    def remove_items(self, items):
+        """
+        Removing items from the tree in bulk.
+        Removing rows one at a time shifts every sibling after it, so the items
+        are grouped by parent and each contiguous range of rows is removed in a
+        single operation, with the drawing suspended until they are all gone.
+        Header items left without any children are removed as well.
+
+        Args:
+            items (list): The CustomTreeItems to remove, ie. the selected items.
+
+        Returns:
+            int: The number of files removed.
+        """
+        _root = self.invisibleRootItem()
+        _selected = {id(item) for item in items}
+        # children of a removed header go with it
+        _by_parent = {}
+        for item in items:
+            if any(id(parent) in _selected for parent in self._ancestors(item)):
+                continue
+            _parent = item.parent() or _root
+            _by_parent.setdefault(id(_parent), (_parent, []))[1].append(item)
+
+        _removed = []
+        self.setUpdatesEnabled(False)
+        self.blockSignals(True)
+        try:
+            for parent, children in _by_parent.values():
+                [_removed.extend(self._descendants(child)) for child in children]
+                self._remove_rows(parent, children)
+                if parent is _root:
+                    continue
+                if not parent.childCount():
+                    self._visible_children.pop(id(parent), None)
+                    self._remove_rows(parent.parent() or _root, [parent])
+                    continue
+                _visible = sum(
+                    1 for row in range(parent.childCount()) if id(parent.child(row)) not in self._hidden)
+                self._visible_children[id(parent)] = _visible
+                parent.setHidden(not _visible)
+        finally:
+            self.blockSignals(False)
+            self.setUpdatesEnabled(True)
+
+        _removed_ids = {id(item) for item in _removed}
+        _files = [item for item in self._widgets if id(item) in _removed_ids]
+        self._widgets = [item for item in self._widgets if id(item) not in _removed_ids]
+        for key in _removed_ids:
+            self._index.remove(key)
+            self._items_by_key.pop(key, None)
+            self._visible_children.pop(key, None)
+        self._hidden -= _removed_ids
+        self._thumbnailed -= _removed_ids
+        self._total_size -= sum(item.file_size for item in _files)
+        return len(_files)
+
+    @staticmethod
+    def _ancestors(item):
+        _parent = item.parent()
+        while _parent is not None:
+            yield _parent
+            _parent = _parent.parent()
+
+    @classmethod
+    def _descendants(cls, item):
+        """
+        Getting an item and every item below it.
+        """
+        _items = [item]
+        for index in range(item.childCount()):
+            _items.extend(cls._descendants(item.child(index)))
+        return _items
+
+    def _remove_rows(self, parent, children):
+        """
+        Removing the passed children of a parent, a contiguous range of rows at a time.
+        Ranges are removed from the bottom up so the rows above keep their index.
+
+        Args:
+            parent (QTreeWidgetItem): The parent item, the invisible root for top level items.
+            children (list): The children to remove.
+        """
+        _wanted = {id(child) for child in children}
+        _rows = [row for row in range(parent.childCount()) if id(parent.child(row)) in _wanted]
+        _ranges = []
+        for row in _rows:
+            if _ranges and _ranges[-1][1] == row:
+                _ranges[-1][1] = row + 1
+            else:
+                _ranges.append([row, row + 1])
+
+        _parent_index = QtCore.QModelIndex() if parent is self.invisibleRootItem() else self.indexFromItem(parent)
+        for start, end in reversed(_ranges):
+            # the widgets set on each row are deleted with it
+            self.model().removeRows(start, end - start, _parent_index)
+
 
 class CustomTreeItem(QtWidgets.QTreeWidgetItem):
     """
@@ -163,6 +741,7 @@ class CustomTreeItem(QtWidgets.QTreeWidgetItem):
     _OPTIONS = ['Plate', 'Texture', 'Model', 'Mocap', 'Reference', 'Ignore']
     _IGNORE_STYLE = 'background-color: #885007;  border: 1.5px solid #32414B'
     _REGULAR_STYLE = 'background-color: #0B1C2D; border: 1.5px solid #32414B'
+    _CHECK_STYLE = 'background-color: #5C4F0A; border: 1.5px solid #32414B'
 
     def __init__(self, parent=None):
         """
@@ -176,6 +755,9 @@ class CustomTreeItem(QtWidgets.QTreeWidgetItem):
         
         self._item_contents = None
         self._header = False
+        self._unsure = False
+        self._restored = False
+        self._file_size = 0
         self._folder = None
         self._filename = None
         self._sequence = None
@@ -212,6 +794,18 @@ class CustomTreeItem(QtWidgets.QTreeWidgetItem):
     def item_contents(self):
         return self._item_contents
 
+    @property
+    def is_header(self):
+        return self._header
+
+    @property
+    def is_lazy(self):
+        return False
+
+    @property
+    def file_size(self):
+        return self._file_size
+
     @property
     def items(self):
         return [
@@ -270,6 +864,10 @@ class CustomTreeItem(QtWidgets.QTreeWidgetItem):
             _folder_display = '...\{}'.format(item.folder.strip(_parent_dir))
 
         self._item_contents = item
+        try:
+            self._file_size = item.file_size
+        except OSError:
+            self._file_size = 0
         self._folder = _folder_display
         self._filename = self._item_contents.filename
         self._sequence = self._item_contents.sequence
@@ -297,6 +895,10 @@ class CustomTreeItem(QtWidgets.QTreeWidgetItem):
         self._filename_widget.setText(self._filename)
         self._filename_widget.setAlignment(QtCore.Qt.AlignCenter)
         top_item.setItemWidget(self, 1, self._filename_widget)
+        if not self._header and self._item_contents.duplicate_of:
+            self._filename_widget.setText('{} (duplicate)'.format(self._filename))
+            self._filename_widget.setToolTip(
+                'Duplicate of {}'.format(self._item_contents.duplicate_of.file_path))
  
         ## Column 1 - Sequence:
         self._sequence_widget = QtWidgets.QComboBox()
@@ -307,6 +909,7 @@ class CustomTreeItem(QtWidgets.QTreeWidgetItem):
             self._sequence_widget.addItem(os.path.basename(key)) 
             for (key, value) in self._app_config.add_configuration.output_subfolders.items()
         }
+        self.set_usage_tips(self._sequence_widget, lambda usage, name: usage.sequence(name))
         self._sequence_widget.currentIndexChanged.connect(self.update_shot_wdgs)
  
         ## Column 2 - Shot:
@@ -326,6 +929,8 @@ class CustomTreeItem(QtWidgets.QTreeWidgetItem):
         [self._option_widget.addItem(option) for option in self._OPTIONS]
         top_item.setItemWidget(self, 5, self._option_widget)
 
+        if not self._header and self._item_contents.match_confidence is not None:
+            self.flag_match(self._item_contents.match_confidence)
         self.option_override()
         self._option_widget.currentIndexChanged.connect(self.option_override)
 
@@ -337,6 +942,109 @@ class CustomTreeItem(QtWidgets.QTreeWidgetItem):
             self._sequence_widget.currentTextChanged.connect(self.header_sequence_override)
             self._shot_widget.currentTextChanged.connect(self.header_shot_override)
 
+    def set_progress(self, percent):
+        """
+        Showing how much of a header folder has been integrated.
+
+        Args:
+            percent (float): The percentage of the folder's bytes integrated.
+        """
+        self._filename_widget.setText('{:.0f}% integrated'.format(percent))
+
+    def restore_values(self, sequence, shot, location, option):
+        """
+        Setting the values saved with a session.
+        The sequence is set first as changing it refills the shots.
+        """
+        self._sequence_widget.setCurrentText(sequence)
+        self._shot_widget.setCurrentText(shot)
+        self._location_widget.setCurrentText(location)
+        self._option_widget.setCurrentText(option)
+        self._restored = True
+
+    def flag_changed(self, reason):
+        """
+        Flagging a restored file that has changed since the session was saved.
+
+        Args:
+            reason (str): What has changed, ie. 'missing'.
+        """
+        self._filename_widget.setText('{} ({})'.format(self._filename, reason))
+        self._filename_widget.setToolTip(
+            'The file was {} after the session was saved, check it before integrating'.format(
+                'removed' if reason == 'missing' else 'modified'))
+
+    def set_header_info(self, info, suggest=True):
+        """
+        Showing what was read from the header of the file, and setting the
+        option it suggests while the option is still the default. The
+        options of a restored session were chosen, so are never changed.
+
+        Args:
+            info (HeaderInfo): The probed header.
+            suggest (bool): Whether the suggested option is set.
+        """
+        self.setText(6, info.summary)
+        self.setToolTip(6, 'Looks like a {} file'.format(info.option) if info.option else info.summary)
+        if suggest and not self._restored and info.option in self._OPTIONS and not self.option.currentIndex():
+            self.option.setCurrentText(info.option)
+
+    def set_thumbnail(self, thumbnail):
+        """
+        Showing the thumbnail of the image when hovering over its filename,
+        below anything already shown there.
+
+        Args:
+            thumbnail (str): The thumbnail file.
+        """
+        _tip = self._filename_widget.toolTip()
+        self._filename_widget.setToolTip('{}<img src="{}">'.format(
+            '{}<br>'.format(html.escape(_tip)) if _tip else '', html.escape(thumbnail)))
+
+    def flag_match(self, confidence):
+        """
+        Showing how sure the match against the existing shots is. Matches
+        below the threshold are highlighted until the sequence or shot is
+        changed, by hand or from the header.
+
+        Args:
+            confidence (float): The confidence of the match between 0 and 1.
+        """
+        _tip = 'Matched to an existing sequence and shot with {:.0%} confidence'.format(confidence)
+        self._sequence_widget.setToolTip(_tip)
+        self._shot_widget.setToolTip(_tip)
+        if confidence >= self._app_config.add_configuration.shot_matching['threshold']:
+            return
+        self._unsure = True
+        self._sequence_widget.currentTextChanged.connect(self.clear_match_flag)
+        self._shot_widget.currentTextChanged.connect(self.clear_match_flag)
+
+    def clear_match_flag(self):
+        """
+        Removing the highlight of a low confidence match once it has been checked.
+        """
+        if not self._unsure:
+            return
+        self._unsure = False
+        self._sequence_widget.setToolTip('')
+        self._shot_widget.setToolTip('')
+        self.option_override()
+
+    def set_usage_tips(self, widget, get_usage):
+        """
+        Showing the space used by each sequence or shot next to its choice.
+
+        Args:
+            widget (QComboBox): The sequence or shot widget.
+            get_usage (callable): Gets the (bytes, files) of a choice from the UsageTotals.
+        """
+        _usage = self._app_config.add_configuration.disk_usage
+        for index in range(widget.count()):
+            _bytes, _files = get_usage(_usage, widget.itemText(index))
+            if _files:
+                widget.setItemData(
+                    index, '{} in {} files'.format(format_size(_bytes), _files), QtCore.Qt.ToolTipRole)
+
     def update_shot_wdgs(self):
         """
         Updating teh shot widgets.
@@ -350,18 +1058,22 @@ class CustomTreeItem(QtWidgets.QTreeWidgetItem):
                 ][0]
             self.shot.clear()
             [self.shot.addItem(os.path.basename(widget)) for widget in _shots]
+            _sequence = self.sequence.currentText()
+            self.set_usage_tips(self.shot, lambda usage, name: usage.shot(_sequence, name))
         except:
             pass
 
     def option_override(self):
         """
         Overriding the style sheet based on whether the widget option is
-        set to either ignore or other.
+        set to either ignore or other. The sequence and shot of a low
+        confidence match stay highlighted.
         """
         [
             wdg.setStyleSheet(self._IGNORE_STYLE) 
             if self.option.currentText() == 'Ignore' else 
-            wdg.setStyleSheet(self._REGULAR_STYLE) 
+            wdg.setStyleSheet(
+                self._CHECK_STYLE if self._unsure and wdg in (self.sequence, self.shot) else self._REGULAR_STYLE)
             for wdg in self.items
         ]
 
@@ -380,11 +1092,7 @@ class CustomTreeItem(QtWidgets.QTreeWidgetItem):
 
         for child in range(self.childCount()):
             self.child(child).option.setCurrentIndex(self._option_widget.currentIndex())
-            for wdg in self.child(child).items:
-                if self.option.currentText() == 'Ignore':
-                    wdg.setStyleSheet(self._IGNORE_STYLE)
-                else:
-                    wdg.setStyleSheet(self._REGULAR_STYLE)
+            self.child(child).option_override()
 
     def header_location_override(self):
         """
@@ -418,3 +1126,114 @@ class CustomTreeItem(QtWidgets.QTreeWidgetItem):
             self.child(child).shot.setCurrentText(self._shot_widget.currentText())
             for child in range(self.childCount())
         ]
+
+
+class CustomTreeFolderItem(CustomTreeItem):
+    """
+    A client folder, or archive, that is only listed once it is expanded.
+    The expand arrow is shown before anything is listed. Changing the
+    options of an unlisted folder applies to everything below it, and
+    the files are only found when the folder is integrated.
+
+    Arguments:
+        CustomTreeItem {CustomTreeItem} -- Inheriting the custom tree item
+    """
+    def __init__(self, parent=None, path=None, root=None):
+        super(CustomTreeFolderItem, self).__init__(parent)
+        self._path = path
+        self._root = root
+        self._populated = False
+        self.setChildIndicatorPolicy(QtWidgets.QTreeWidgetItem.ShowIndicator)
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def populated(self):
+        return self._populated
+
+    @property
+    def is_lazy(self):
+        return True
+
+    def build_folder_values(self, app_config):
+        """
+        Building the variables for the folder item, the same way
+        as a top level item but from the folder itself.
+
+        Args:
+            app_config (Cofiguration Object): The tools configuration
+        """
+        self._item_contents = ConfigureFilesData(self._path, os.path.dirname(self._path), parent_folder=self._root)
+        self._header = True
+        self._folder = self._path if self._path == self._root else '...\\{}'.format(
+            os.path.relpath(self._path, self._root))
+        self._filename = ''
+        self._sequence = ''
+        self._shot = ''
+        self._app_config = app_config
+        self._location = app_config.add_configuration.output_location
+
+    def mark_populated(self):
+        """
+        Marking a restored folder as listed, its items are restored with it.
+        """
+        self._populated = True
+        self.setChildIndicatorPolicy(QtWidgets.QTreeWidgetItem.DontShowIndicatorWhenChildless)
+
+    def list_files(self):
+        """
+        Finding every file below the folder without building any items,
+        used when the folder is integrated before it has been expanded.
+
+        Returns:
+            list: The ConfigureFilesData objects of every file.
+        """
+        _files = ConfigureFiles(folder=self._root)
+        if os.path.isdir(self._path):
+            _files.folder_files(self._path)
+        else:
+            _files.single_file(self._path)
+        self._app_config.add_configuration.match_shots(_files)
+        return _files.files
+
+    def populate(self, tree, app_config):
+        """
+        Listing the folder and building an item for each file and subfolder.
+        Subfolders are lazy folders of their own. Anything already changed
+        on the folder is passed down to the new items.
+
+        Args:
+            tree (CustomTreeWidget): The tree the widgets are set on.
+            app_config (Cofiguration Object): The tools configuration
+
+        Returns:
+            list: The file items built.
+        """
+        self._populated = True
+        _files = ConfigureFiles(folder=self._root)
+        for folder in _files.list_folder(self._path):
+            _folder = CustomTreeFolderItem(self, folder, self._root)
+            _folder.build_folder_values(app_config)
+            _folder.build_widget_items(tree)
+        app_config.add_configuration.match_shots(_files)
+
+        _items = []
+        for contents in _files.files:
+            _item = CustomTreeItem(self)
+            _item.build_subitem_values(contents, False, app_config)
+            _item.build_widget_items(tree)
+            _item.setTextAlignment(5, QtCore.Qt.AlignCenter)
+            _items.append(_item)
+        self.setChildIndicatorPolicy(QtWidgets.QTreeWidgetItem.DontShowIndicatorWhenChildless)
+
+        if self.option.currentIndex():
+            self.header_option_override()
+        self.header_location_override()
+        if self.sequence.currentText():
+            self.header_sequence_override()
+        if self.shot.currentText():
+            self.header_shot_override()
+        return _items
+
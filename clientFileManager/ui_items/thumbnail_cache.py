@@ -0,0 +1,174 @@
+################################################################################
+## Client File Manager TOOL - Ingesting client files into a production pipeline
+##  with tracking, logging and configuration overrides.
+##
+## File : thumbnail_cache.py
+## Description : Thumbnails of the client images shown when hovering over a
+##      file in the client files tree. Each image is decoded at the size of
+##      its thumbnail and kept on disk, the least recently used thumbnails
+##      are removed once the cache is full.
+##
+## Created by: Kieran Knight
+## Email: kieransknight@gmail.com
+##
+################################################################################
+
+# Python Modules
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Application
+from third_party.Qt import QtCore, QtGui
+
+
+class ThumbnailCache(object):
+    """
+    A folder of thumbnails, each named after the path and modified time of
+    its image, so an image that changes gets a new thumbnail and the old one
+    ages out. The thumbnails are listed once, oldest first, and every
+    thumbnail used is touched so the order carries over to the next session.
+    Safe to use from several threads at once.
+
+    Args:
+        folder (str): The cache folder.
+        max_bytes (int): The most the thumbnails take up on disk.
+        size (int): The longest side of a thumbnail in pixels.
+    """
+    def __init__(self, folder, max_bytes, size=256):
+        super(ThumbnailCache, self).__init__()
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+        self._folder = folder
+        self._max_bytes = max_bytes
+        self._size = size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+        # only images Qt has a plugin for can be decoded, ie. not EXR or DPX
+        self._extensions = {
+            '.{}'.format(bytes(fmt.data()).decode('ascii').lower())
+            for fmt in QtGui.QImageReader.supportedImageFormats()
+        }
+
+        _found = []
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if entry.name.endswith('.png') and entry.is_file():
+                    _stat = entry.stat()
+                    _found.append((_stat.st_mtime, entry.name, _stat.st_size))
+        for _, name, _size in sorted(_found):
+            self._entries[name] = _size
+            self._bytes += _size
+
+    @property
+    def used(self):
+        """
+        The bytes taken up by the thumbnails.
+        """
+        return self._bytes
+
+    def supports(self, path):
+        """
+        Checking whether a thumbnail can be made of a file.
+
+        Args:
+            path (str): The client file.
+        """
+        return os.path.splitext(path)[1].lower() in self._extensions
+
+    @staticmethod
+    def _name(path, mtime):
+        return '{}.png'.format(hashlib.sha1('{}|{}'.format(path, mtime).encode('utf-8')).hexdigest())
+
+    def get(self, path, mtime):
+        """
+        Getting the cached thumbnail of an image.
+
+        Args:
+            path (str): The client file.
+            mtime (float): The modified time of the file.
+
+        Returns:
+            str: The thumbnail file, or None if it isn't cached.
+        """
+        _name = self._name(path, mtime)
+        with self._lock:
+            if _name not in self._entries:
+                return None
+            self._entries.move_to_end(_name)
+        _thumbnail = os.path.join(self._folder, _name)
+        try:
+            os.utime(_thumbnail)
+        except OSError:
+            with self._lock:
+                self._bytes -= self._entries.pop(_name, 0)
+            return None
+        return _thumbnail
+
+    def put(self, path, mtime, image):
+        """
+        Saving the thumbnail of an image, and removing the least recently
+        used thumbnails while the cache is over its size.
+
+        Args:
+            path (str): The client file.
+            mtime (float): The modified time of the file.
+            image (QImage): The thumbnail.
+
+        Returns:
+            str: The thumbnail file, or None if it couldn't be saved.
+        """
+        _name = self._name(path, mtime)
+        _thumbnail = os.path.join(self._folder, _name)
+        _temporary = '{}.{}.tmp'.format(_thumbnail, threading.get_ident())
+        if not image.save(_temporary, 'PNG'):
+            return None
+        os.replace(_temporary, _thumbnail)
+        _size = os.path.getsize(_thumbnail)
+
+        _evicted = []
+        with self._lock:
+            self._bytes += _size - self._entries.pop(_name, 0)
+            self._entries[_name] = _size
+            while self._bytes > self._max_bytes and len(self._entries) > 1:
+                _old, _old_size = self._entries.popitem(last=False)
+                self._bytes -= _old_size
+                _evicted.append(_old)
+        for name in _evicted:
+            try:
+                os.remove(os.path.join(self._folder, name))
+            except OSError:
+                pass
+        return _thumbnail
+
+    def thumbnail(self, path):
+        """
+        Getting the thumbnail of an image, decoding it if it isn't cached.
+        Only the pixels of the thumbnail are decoded where the format allows
+        it, ie. JPEG, so large images are quick. Run on a worker thread.
+
+        Args:
+            path (str): The client file.
+
+        Returns:
+            str: The thumbnail file, or None if the image couldn't be read.
+        """
+        _mtime = os.stat(path).st_mtime
+        _cached = self.get(path, _mtime)
+        if _cached:
+            return _cached
+        _reader = QtGui.QImageReader(path)
+        _reader.setAutoTransform(True)
+        _source = _reader.size()
+        if _source.isValid() and max(_source.width(), _source.height()) > self._size:
+            _reader.setScaledSize(_source.scaled(self._size, self._size, QtCore.Qt.KeepAspectRatio))
+        _image = _reader.read()
+        if _image.isNull():
+            return None
+        if max(_image.width(), _image.height()) > self._size:
+            # formats that can't be read scaled are decoded in full and scaled after
+            _image = _image.scaled(
+                self._size, self._size, QtCore.Qt.KeepAspectRatio, QtCore.Qt.SmoothTransformation)
+        return self.put(path, _mtime, _image)
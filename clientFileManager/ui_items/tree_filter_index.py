@@ -0,0 +1,175 @@
+################################################################################
+## Client File Manager TOOL - Ingesting client files into a production pipeline
+##  with tracking, logging and configuration overrides.
+##
+## File : tree_filter_index.py
+## Description : A trigram index over the client files tree, so the tree can
+##      be filtered as the user types without reading every widget again.
+##
+## Created by: Kieran Knight
+## Email: kieransknight@gmail.com
+##
+################################################################################
+
+
+def trigrams(value):
+    """
+    Getting every three character run of a value.
+
+    Args:
+        value (str): The lower case value.
+
+    Returns:
+        set: The trigrams, empty if the value is shorter than three characters.
+    """
+    return {value[index:index + 3] for index in range(len(value) - 2)}
+
+
+class TreeFilterIndex(object):
+    """
+    Indexing the filename, folder, sequence, shot and option of every
+    tree item by trigram.
+
+    A query is a list of terms that all have to match. A term matches
+    anywhere in an item, or in a single field when written as field:value,
+    ie. 'shot:040 .exr'. Terms of three characters or more are looked up in
+    the postings and only the items found are checked, shorter terms are
+    checked against the items the other terms have narrowed down.
+    When a query only refines the last one, ie. while typing, the search
+    starts from the last matches rather than the whole index.
+    """
+    FIELDS = ('name', 'folder', 'sequence', 'shot', 'option')
+    _ALIASES = {'filename': 'name', 'file': 'name', 'seq': 'sequence'}
+
+    def __init__(self):
+        super(TreeFilterIndex, self).__init__()
+        self._values = {}
+        self._joined = {}
+        self._postings = {}
+        self._last_terms = None
+        self._last_matches = None
+
+    def __len__(self):
+        return len(self._values)
+
+    @property
+    def keys(self):
+        return self._values.keys()
+
+    def _index(self, key, values):
+        # fields are joined by a character no query contains, so no trigram spans two fields
+        _joined = self._joined[key] = '\0'.join(values)
+        _postings = self._postings
+        for trigram in trigrams(_joined):
+            _posting = _postings.get(trigram)
+            if _posting is None:
+                _postings[trigram] = {key}
+            else:
+                _posting.add(key)
+
+    def add(self, key, **fields):
+        """
+        Adding an item to the index.
+
+        Args:
+            key (object): The key the item is found by, ie. its id.
+            fields (str): The value of each field, see FIELDS.
+        """
+        _values = tuple(str(fields.get(field) or '').lower() for field in self.FIELDS)
+        self._values[key] = _values
+        self._index(key, _values)
+        self._last_terms = None
+
+    def remove(self, key):
+        if self._values.pop(key, None) is None:
+            return
+        for trigram in trigrams(self._joined.pop(key)):
+            _posting = self._postings.get(trigram)
+            if _posting is None:
+                continue
+            _posting.discard(key)
+            if not _posting:
+                del self._postings[trigram]
+        self._last_terms = None
+
+    def update(self, key, **fields):
+        """
+        Updating the fields of an item that has changed, ie. a new shot.
+        Fields that aren't passed keep their value.
+        """
+        _current = dict(zip(self.FIELDS, self._values.get(key, ())))
+        _current.update(fields)
+        self.remove(key)
+        self.add(key, **_current)
+
+    def parse(self, query):
+        """
+        Splitting a query into its terms.
+
+        Args:
+            query (str): The query, ie. 'shot:040 .exr'.
+
+        Returns:
+            list: (field index or None, value) for every term.
+        """
+        _terms = []
+        for term in query.lower().split():
+            _field, _, _value = term.partition(':')
+            _field = self._ALIASES.get(_field, _field)
+            if _value and _field in self.FIELDS:
+                _terms.append((self.FIELDS.index(_field), _value))
+            elif not _value and _field in self.FIELDS:
+                # a field that is still being typed matches everything
+                continue
+            else:
+                _terms.append((None, term))
+        return _terms
+
+    def _refines(self, terms):
+        if self._last_terms is None or len(terms) < len(self._last_terms):
+            return False
+        return all(
+            field == _last_field and _last_value in value
+            for (field, value), (_last_field, _last_value) in zip(terms, self._last_terms)
+        )
+
+    def search(self, query):
+        """
+        Finding the items matching a query.
+
+        Args:
+            query (str): The query.
+
+        Returns:
+            set: The matching keys, or None if the query is empty and everything matches.
+        """
+        _terms = self.parse(query)
+        if not _terms:
+            self._last_terms = self._last_matches = None
+            return None
+        _candidates = self._last_matches if self._refines(_terms) else None
+
+        # the rarest postings first, so the candidates shrink as fast as possible
+        _postings = [
+            self._postings.get(trigram, set())
+            for _, value in _terms for trigram in trigrams(value)
+        ]
+        for posting in sorted(_postings, key=len):
+            _candidates = posting.copy() if _candidates is None else _candidates & posting
+            if not _candidates:
+                break
+        if _candidates is None:
+            _candidates = set(self._values)
+
+        # a trigram posting is already an exact match for a three character term
+        for field, value in _terms:
+            if field is not None:
+                _values = self._values
+                _candidates = {key for key in _candidates if value in _values[key][field]}
+            elif len(value) != 3:
+                _joined = self._joined
+                _candidates = {key for key in _candidates if value in _joined[key]}
+        _matches = _candidates
+        self._last_terms = _terms
+        self._last_matches = _matches
+        return _matches
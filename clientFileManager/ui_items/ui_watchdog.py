@@ -0,0 +1,315 @@
+################################################################################
+## Client File Manager TOOL - Ingesting client files into a production pipeline
+##  with tracking, logging and configuration overrides.
+##
+## File : ui_watchdog.py
+## Description : Measuring how long the UI stops responding. A heartbeat timer
+##      on the Qt event loop times the gap between its beats, and a monitor
+##      thread captures what the UI thread is doing whenever a beat is late
+##      by more than the threshold. Run as a module to benchmark adding a
+##      client folder to the UI offscreen.
+##
+## Created by: Kieran Knight
+## Email: kieransknight@gmail.com
+##
+################################################################################
+
+# Python Modules
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import traceback
+
+# Application
+from third_party.Qt import QtCore, QtWidgets
+
+# upper bounds of the stall histogram in seconds, stalls shorter than the first aren't counted
+_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+
+def _format_seconds(seconds):
+    return '{:g}ms'.format(seconds * 1000) if seconds < 1 else '{:g}s'.format(seconds)
+
+
+def _bucket_name(index):
+    if index + 1 < len(_BUCKETS):
+        return '{}-{}'.format(_format_seconds(_BUCKETS[index]), _format_seconds(_BUCKETS[index + 1]))
+    return '{}+'.format(_format_seconds(_BUCKETS[index]))
+
+
+class StallHistogram(object):
+    """
+    The number of stalls of each length, and the time lost to them.
+    """
+    def __init__(self):
+        super(StallHistogram, self).__init__()
+        self._counts = [0] * len(_BUCKETS)
+        self._total = 0.0
+        self._longest = 0.0
+
+    @property
+    def count(self):
+        return sum(self._counts)
+
+    @property
+    def total(self):
+        return self._total
+
+    @property
+    def longest(self):
+        return self._longest
+
+    def add(self, seconds):
+        """
+        Adding a stall, stalls shorter than the first bucket are ignored.
+
+        Args:
+            seconds (float): How long the UI didn't respond.
+        """
+        if seconds < _BUCKETS[0]:
+            return
+        _index = max(index for index, bound in enumerate(_BUCKETS) if seconds >= bound)
+        self._counts[_index] += 1
+        self._total += seconds
+        self._longest = max(self._longest, seconds)
+
+    def as_dict(self):
+        return {_bucket_name(index): count for index, count in enumerate(self._counts)}
+
+
+class UIWatchdog(object):
+    """
+    Timing every stall of the Qt event loop. The heartbeat is a timer on the
+    UI thread, the gap between two beats less the interval is how long the
+    UI didn't respond. The monitor thread checks the last beat as often as
+    the timer should fire, and captures the Python stack of the UI thread
+    the first time a stall passes the threshold, so the slowest stalls are
+    reported with the code that caused them.
+
+    Has to be started from the UI thread, and only measures while the Qt
+    event loop is running, ie. app.exec_() or processEvents().
+
+    Args:
+        interval (float): Seconds between heartbeats.
+        threshold (float): Seconds a stall has to last before its stack is captured.
+        stacks (int): The most stacks kept, the slowest stalls are kept.
+    """
+    def __init__(self, interval=0.05, threshold=0.5, stacks=20):
+        super(UIWatchdog, self).__init__()
+        self._interval = interval
+        self._threshold = threshold
+        self._max_stacks = stacks
+        self._timer = None
+        self._monitor = None
+        self._stopped = threading.Event()
+        self._ui_thread = None
+        self.reset()
+
+    @classmethod
+    def from_configuration(cls, settings):
+        """
+        Args:
+            settings (dict): The uiWatchdog configuration.
+        """
+        return cls(settings['interval'] / 1000.0, settings['threshold'] / 1000.0, settings['stacks'])
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    @property
+    def running(self):
+        return self._timer is not None
+
+    @property
+    def histogram(self):
+        return self._histogram
+
+    def reset(self):
+        """
+        Clearing what has been measured, ie. between the steps of a benchmark.
+        """
+        self._histogram = StallHistogram()
+        self._slowest = []
+        self._captured = None
+        self._started = time.time()
+        self._last = time.monotonic()
+
+    def start(self):
+        """
+        Starting the heartbeat and the monitor thread.
+        """
+        if self.running:
+            return
+        self._ui_thread = threading.get_ident()
+        self._last = time.monotonic()
+        self._stopped.clear()
+        self._timer = QtCore.QTimer()
+        self._timer.setInterval(int(self._interval * 1000))
+        self._timer.timeout.connect(self._beat)
+        self._timer.start()
+        self._monitor = threading.Thread(target=self._watch, name='ui-watchdog', daemon=True)
+        self._monitor.start()
+
+    def stop(self):
+        if not self.running:
+            return
+        self._timer.stop()
+        self._timer = None
+        self._stopped.set()
+        self._monitor.join()
+        self._monitor = None
+
+    def _beat(self):
+        """
+        The heartbeat, run on the UI thread. A late beat is a stall, which
+        gets the stack the monitor captured for it if it passed the threshold.
+        """
+        _now = time.monotonic()
+        _stall = _now - self._last - self._interval
+        _captured = self._captured
+        if _stall >= _BUCKETS[0]:
+            self._histogram.add(_stall)
+            if _captured is not None and _captured[0] == self._last:
+                self._slowest.append({
+                    'seconds': round(_stall, 3),
+                    'at': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(time.time() - _stall)),
+                    'stack': _captured[1]
+                })
+                self._slowest.sort(key=lambda stall: -stall['seconds'])
+                del self._slowest[self._max_stacks:]
+        self._last = _now
+
+    def _watch(self):
+        """
+        The monitor thread, capturing the stack of the UI thread once per
+        stall that passes the threshold.
+        """
+        while not self._stopped.wait(self._interval):
+            _last = self._last
+            if time.monotonic() - _last - self._interval < self._threshold:
+                continue
+            if self._captured is not None and self._captured[0] == _last:
+                continue
+            _frame = sys._current_frames().get(self._ui_thread)
+            if _frame is not None:
+                self._captured = (_last, ''.join(traceback.format_stack(_frame)))
+
+    def report(self):
+        """
+        Returns:
+            dict: What has been measured since the watchdog was started or reset.
+        """
+        return {
+            'started': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self._started)),
+            'seconds': round(time.time() - self._started, 3),
+            'interval': self._interval,
+            'threshold': self._threshold,
+            'stalls': self._histogram.count,
+            'stalled': round(self._histogram.total, 3),
+            'longest': round(self._histogram.longest, 3),
+            'histogram': self._histogram.as_dict(),
+            'slowest': list(self._slowest)
+        }
+
+    def write_report(self, location):
+        """
+        Writing the report to the logging location.
+
+        Args:
+            location (str): The logging location.
+
+        Returns:
+            str: The report file.
+        """
+        _path = os.path.join(location, 'uiWatchdog_{}.json'.format(
+            time.strftime('%Y%m%d_%H%M%S', time.localtime(self._started))))
+        with open(_path, 'w') as handle:
+            json.dump(self.report(), handle, indent=4)
+        return _path
+
+
+def _wait(seconds):
+    """
+    Running the event loop for a while, so background work queued by a
+    step, ie. probing headers, is measured with it.
+    """
+    _loop = QtCore.QEventLoop()
+    QtCore.QTimer.singleShot(int(seconds * 1000), _loop.quit)
+    _loop.exec_()
+
+
+def benchmark(folder, settle=2.0, watchdog=None):
+    """
+    Adding a client folder to the UI, then filtering and scrolling through
+    it, and measuring the stalls of each step. Works offscreen, ie. with
+    QT_QPA_PLATFORM=offscreen, so it can run without a display.
+
+    Args:
+        folder (str): The client folder.
+        settle (float): Seconds the event loop runs after each step.
+        watchdog (UIWatchdog): The watchdog to measure with, the UI's own by default.
+
+    Returns:
+        dict: Each step mapped to its report.
+    """
+    # the UI imports this module, so it is only imported when benchmarking
+    from launch_manager import ClientFileManager
+    from configuration.configure import ConfigureFiles
+
+    _app = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv)
+    _ui = ClientFileManager()
+    _ui.resize(1200, 650)
+    _ui.show()
+    _watchdog = watchdog or _ui.watchdog
+    _watchdog.start()
+    _tree = _ui.tree_widget
+    _scroll = _tree.verticalScrollBar()
+
+    def _add():
+        _files = ConfigureFiles(folder=folder)
+        _files.folder_files(folder)
+        _ui.match_shots(_files)
+        _tree.add_items(_files, _ui.configuration_widgets)
+
+    def _scroll_through():
+        for value in range(_scroll.minimum(), _scroll.maximum() + 1, max(1, _scroll.pageStep())):
+            _scroll.setValue(value)
+            _app.processEvents()
+
+    _results = {}
+    for name, step in (
+            ('add', _add),
+            ('filter', lambda: _ui.filter_widgets.filter_edit.setText('exr')),
+            ('clear filter', lambda: _ui.filter_widgets.filter_edit.setText('')),
+            ('scroll', _scroll_through)):
+        _watchdog.reset()
+        step()
+        _wait(settle)
+        _results[name] = _watchdog.report()
+    _watchdog.stop()
+    _ui.close()
+    return _results
+
+
+if __name__ == '__main__':
+    _parser = argparse.ArgumentParser(description='Benchmark how responsive the UI is while adding a client folder.')
+    _parser.add_argument('folder', help='The client folder to add.')
+    _parser.add_argument('--settle', type=float, default=2.0, help='Seconds to wait after each step.')
+    _parser.add_argument('--report', help='Writes every report to this JSON file.')
+    _args = _parser.parse_args()
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+    _results = benchmark(_args.folder, settle=_args.settle)
+    for (name, report) in _results.items():
+        print('{:<16}{:>6} stalls {:>8.2f}s stalled {:>8.2f}s longest'.format(
+            name, report['stalls'], report['stalled'], report['longest']))
+    if _args.report:
+        with open(_args.report, 'w') as handle:
+            json.dump(_results, handle, indent=4)
@@ -15,10 +15,20 @@ import os
 import sys
 import json
 import getpass
+import hashlib
 from pathlib import Path
 
 # Application
-from paths import _CSS, _INTEGRATE_LOCATION, _LOGGING_LOCATION, _UI_CONFIGURATION
+from paths import (
+    _CSS,
+    _CATALOG,
+    _HEADER_CACHE,
+    _INTEGRATE_LOCATION,
+    _LOGGING_LOCATION,
+    _SERVICE_QUEUE,
+    _THUMBNAILS,
+    _UI_CONFIGURATION
+)
 from third_party.Qt import _loadUi
 from third_party.Qt import QtWidgets
 
@@ -35,7 +45,117 @@ _INGEST_FOLDERS = [
 _DEFAULT_CONFIG = {
     'loggingLocation': _LOGGING_LOCATION,
     'outputLocation': _INTEGRATE_LOCATION,
-    'loggingStatus': 'True'
+    'loggingStatus': 'True',
+    'ioScheduler': {
+        'defaultLimit': 4,
+        'largeFileLimit': 2,
+        'largeFileSize': 64 * 1024 * 1024,
+        'deviceLimits': {},
+        'priorityShots': []
+    },
+    'retries': {
+        'enabled': True,
+        'attempts': 5,
+        'initialDelay': 2.0,
+        'maxDelay': 60.0
+    },
+    'autoTune': {
+        'enabled': True,
+        'minWorkers': 1,
+        'maxWorkers': 32,
+        'interval': 2.0
+    },
+    'duplicates': {
+        'detect': True,
+        'action': 'copy',
+        'workers': 4
+    },
+    'catalog': {
+        'enabled': True,
+        'location': _CATALOG,
+        'batchSize': 500,
+        'hashFiles': False
+    },
+    'watchFolders': {
+        'folders': [],
+        'option': 'Plate',
+        'debounce': 2.0,
+        'settle': 30.0,
+        'pollInterval': 5.0
+    },
+    'service': {
+        'enabled': False,
+        'host': '127.0.0.1',
+        'bind': '127.0.0.1',
+        'port': 8765,
+        'token': '',
+        'sources': [],
+        'queue': _SERVICE_QUEUE
+    },
+    'clientTree': {
+        'lazyFolders': False
+    },
+    'conflicts': {
+        'Plate': 'overwrite',
+        'Texture': 'overwrite',
+        'Model': 'overwrite',
+        'Mocap': 'overwrite',
+        'Reference': 'overwrite'
+    },
+    'shotMatching': {
+        'enabled': True,
+        'threshold': 0.75
+    },
+    'headerProbe': {
+        'enabled': True,
+        'workers': 8,
+        'suggestOption': True,
+        'cache': _HEADER_CACHE
+    },
+    'logRotation': {
+        'index': True,
+        'compression': 'gzip',
+        'compressAfterDays': 1,
+        'deleteAfterDays': 0,
+        'maxMB': 1024
+    },
+    'uiWatchdog': {
+        'enabled': True,
+        'interval': 50,
+        'threshold': 500,
+        'stacks': 20
+    },
+    'thumbnails': {
+        'enabled': True,
+        'size': 256,
+        'workers': 4,
+        'cacheMB': 512,
+        'cache': _THUMBNAILS
+    },
+    'diskUsage': {
+        'enabled': True,
+        'reconcileHours': 24,
+        'workers': 8
+    },
+    'scrub': {
+        'rate': 50,
+        'workers': 2
+    },
+    'deltaTransfer': {
+        'enabled': False,
+        'minSize': 64 * 1024 * 1024,
+        'blockSize': 128 * 1024
+    },
+    'stagedPublish': {
+        'enabled': False,
+        'staleHours': 24
+    },
+    'copyFile': {
+        'bufferSize': 8 * 1024 * 1024,
+        'flushWindow': 256 * 1024 * 1024,
+        'directIO': False,
+        'directThreshold': 1024 * 1024 * 1024
+    }
 }
 
 
@@ -58,6 +178,25 @@ def open_file(instance, title, location, filter):
     return Path(file_dialog)
 
 
+def save_file(instance, title, location, filter):
+    """
+    Opening a file dialog to choose where a file is saved.
+
+    Arguments:
+        instance {MainClassInstance} -- The main ingest window instance.
+        title {str} -- The title of the dialog window.
+        location {str} -- The location on where the file dialog will open up to.
+        filter {str} -- The filter to be used on what files can be saved.
+
+    Returns:
+        path -- A path object of the file to save, False if cancelled.
+    """
+    file_dialog = QtWidgets.QFileDialog.getSaveFileName(instance, title, location, filter)[0]
+    if file_dialog == '':
+        return False
+    return Path(file_dialog)
+
+
 def open_folder(instance, title, location, filter):
     """
     Opening a file dialog to select a folder to items to be ingested.
@@ -105,16 +244,114 @@ def read_json(json_file):
     return data
 
 
-def write_json(data):
+def write_json(data, json_file=_UI_CONFIGURATION):
     """
     Writing dictionary contents to a json file.
 
     Args:
         data (dict) -- The dictionary that will be placed 
             into the json file.
+        json_file (str) -- The json file to write, the configuration by default.
 
     Returns:
         JsonPath -- The path to the json file. 
     """
-    with open(_UI_CONFIGURATION, 'w') as json_file:
+    with open(json_file, 'w') as json_file:
         json.dump(data, json_file)
+
+
+def format_size(size):
+    """
+    Formatting a byte count into a readable string.
+
+    Args:
+        size (int): The number of bytes.
+
+    Returns:
+        str: The size with the largest fitting unit, ie. '1.5 GB'
+    """
+    for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
+        if abs(size) < 1024.0 or unit == 'TB':
+            break
+        size /= 1024.0
+    return '{:.1f} {}'.format(size, unit)
+
+
+def normalise_path(path):
+    """
+    Making a path absolute and normalised, so a file recorded from a run
+    with a relative path is found by a lookup with an absolute one.
+
+    Args:
+        path (str): The file or folder path.
+
+    Returns:
+        str: The path, or None if no path was passed.
+    """
+    if path is None:
+        return None
+    return os.path.normpath(os.path.abspath(str(path)))
+
+
+class StreamHash(object):
+    """
+    Hashing a file as it is streamed, giving the same digest as hash_file,
+    so a file can be hashed while it is copied rather than read again.
+    """
+    def __init__(self):
+        super(StreamHash, self).__init__()
+        self.reset()
+
+    def reset(self):
+        """
+        Starting again, ie. when the file is written again from the start.
+        """
+        self._hash = hashlib.blake2b(digest_size=20)
+
+    def update(self, data):
+        self._hash.update(data)
+
+    def hexdigest(self):
+        return self._hash.hexdigest()
+
+
+def hash_file(path, block_size=1024 * 1024):
+    """
+    Hashing the full contents of a file.
+    The same hash is used wherever file contents are compared or recorded.
+
+    Args:
+        path (str): The file path.
+        block_size (int): The bytes read at a time.
+
+    Returns:
+        str: The hex digest of the file.
+    """
+    _hash = StreamHash()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(block_size), b''):
+            _hash.update(block)
+    return _hash.hexdigest()
+
+
+def hash_file_ends(path, size, block_size=64 * 1024):
+    """
+    Hashing only the first and last block of a file.
+    Cheap enough to run on every candidate, and rules out most files
+    that happen to share a size.
+
+    Args:
+        path (str): The file path.
+        size (int): The file size in bytes.
+        block_size (int): The size of each block.
+
+    Returns:
+        str: The hex digest of both blocks.
+    """
+    _hash = hashlib.blake2b(digest_size=20)
+    with open(path, 'rb') as file:
+        _hash.update(file.read(block_size))
+        if size > block_size:
+            file.seek(max(block_size, size - block_size))
+            _hash.update(file.read(block_size))
+    return _hash.hexdigest()